@@ -0,0 +1 @@
+# Benchmark scripts, run from the project root with `python -m benchmarks.<name>`
@@ -0,0 +1,88 @@
+"""
+Measures cross-CV candidate ranking latency as the number of CVs in the
+shared collection grows. Each step adds synthetic CVs, then times
+rank_cv_ids (one grouped ANN search plus per-CV score aggregation) for
+random queries. Uses a throwaway test database (needs Postgres), which
+holds no pgvector CVs, so only the shared collection is searched.
+
+Runs against Qdrant local mode (exact search, so latency grows linearly)
+unless Qdrant_client_url is set, which benchmarks a real server and its
+HNSW index.
+
+Usage: python -m benchmarks.candidate_ranking --steps 1000 5000 10000 --chunks 10 --queries 100
+"""
+import argparse
+import os
+import uuid
+
+import numpy as np
+
+from .common import Timer, percentile
+from .django_setup import setup_django, test_database
+
+DIMENSION = 384
+
+
+def random_vectors(rng, count):
+    vectors = rng.standard_normal((count, DIMENSION)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def load_cvs(client, collection, rng, first, stop, chunks, qdrant_models):
+    vectors = random_vectors(rng, (stop - first) * chunks)
+    client.upsert(collection_name=collection, points=[
+        qdrant_models.PointStruct(
+            id=str(uuid.uuid4()),
+            vector=vectors[i * chunks + j].tolist(),
+            payload={"text": "", "chunk_index": j, "cv_id": cv_id}
+        )
+        for i, cv_id in enumerate(range(first, stop))
+        for j in range(chunks)
+    ])
+
+
+def run(args):
+    if not os.getenv('Qdrant_client_url'):
+        os.environ.setdefault('QDRANT_PATH', ':memory:')
+    setup_django(QDRANT_SHARED_COLLECTION=f"bench_ranking_{uuid.uuid4().hex}")
+    from qdrant_client.http import models as qdrant_models
+    from cv_chatbot_app.services.candidate_ranking import rank_cv_ids
+    from cv_chatbot_app.services.qdrant_service import (
+        get_qdrant_client, ensure_shared_collection, delete_collection,
+    )
+
+    client = get_qdrant_client()
+    collection = ensure_shared_collection()
+    rng = np.random.default_rng(args.seed)
+    loaded = 0
+    with test_database():
+        try:
+            for target in sorted(args.steps):
+                while loaded < target:
+                    stop = min(target, loaded + args.upload_batch)
+                    load_cvs(client, collection, rng, loaded, stop, args.chunks, qdrant_models)
+                    loaded = stop
+
+                for aggregation in args.aggregations:
+                    latencies = []
+                    for query in random_vectors(rng, args.queries):
+                        with Timer() as timer:
+                            rank_cv_ids(query.tolist(), aggregation=aggregation, limit=args.limit)
+                        latencies.append(timer.elapsed * 1000)
+                    print(f"{loaded:>7d} CVs ({loaded * args.chunks} chunks) {aggregation:6s} "
+                          f"p50 {percentile(latencies, 50):8.2f}ms  p95 {percentile(latencies, 95):8.2f}ms")
+        finally:
+            delete_collection(collection)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--steps', type=int, nargs='+', default=[1000, 5000, 10000],
+                        help='CV counts to measure at')
+    parser.add_argument('--chunks', type=int, default=10, help='chunks per CV')
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--limit', type=int, default=20, help='candidates per query')
+    parser.add_argument('--aggregations', nargs='+', default=['max', 'top_n'])
+    parser.add_argument('--upload-batch', type=int, default=200, help='CVs upserted per request')
+    parser.add_argument('--seed', type=int, default=0)
+    run(parser.parse_args())
@@ -0,0 +1,133 @@
+"""
+Load test comparing the blocking chat endpoint (/api/chat/) with the async one
+(/api/chat/async/) against local fake backends: Qdrant in-memory mode and the
+FakeGroqClient with configurable latency. Needs a reachable Postgres server to
+create a throwaway test database.
+
+Usage: python -m benchmarks.chat_load --requests 200 --concurrency 1 10 50 --llm-latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+from .common import Timer, percentile, synthetic_chunks
+from .django_setup import setup_django, test_database
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=200, help='requests per run')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--llm-latency', type=float, default=0.2,
+                        help='seconds the fake LLM takes to answer')
+    parser.add_argument('--chunks', type=int, default=40)
+    return parser.parse_args()
+
+
+def create_cv(chunks):
+    from cv_chatbot_app.models import CV
+    from cv_chatbot_app.services.embedding import generate_embeddings
+    from cv_chatbot_app.services.qdrant_service import generate_collection_name
+
+    cv = CV.objects.create(name='Load Test', qdrant_collection_name=generate_collection_name())
+    return cv, generate_embeddings(chunks)
+
+
+def points_for(cv, chunks, embeddings):
+    from qdrant_client.http import models as qdrant_models
+    return [
+        qdrant_models.PointStruct(id=i, vector=vector.tolist(),
+                                  payload={"text": text, "chunk_index": i, "cv_id": cv.id})
+        for i, (text, vector) in enumerate(zip(chunks, embeddings))
+    ]
+
+
+def question(i):
+    return f"What did they build in project {i}?"
+
+
+def report(label, concurrency, latencies, elapsed):
+    print(f"{label:5s} c={concurrency:<4d} {len(latencies) / elapsed:8.1f} req/s  "
+          f"p50 {percentile(latencies, 50) * 1000:8.1f}ms  p99 {percentile(latencies, 99) * 1000:8.1f}ms")
+
+
+def run_sync(cv, requests, concurrency):
+    from django.db import connection
+    from django.test import Client
+
+    def call(i):
+        client = Client()
+        with Timer() as timer:
+            response = client.post('/api/chat/', data=json.dumps({"cv_id": cv.id, "question": question(i)}),
+                                   content_type='application/json')
+        connection.close()
+        assert response.status_code == 200, response.content
+        return timer.elapsed
+
+    with Timer() as total:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(call, range(requests)))
+    report('sync', concurrency, latencies, total.elapsed)
+
+
+async def run_async(cv, chunks, embeddings, requests, concurrencies):
+    from django.test import AsyncClient
+    from cv_chatbot_app.services.qdrant_service import get_async_qdrant_client
+    from qdrant_client.http import models as qdrant_models
+
+    # The async in-memory client is a separate instance: load the same points into it
+    client = get_async_qdrant_client()
+    await client.create_collection(
+        collection_name=cv.qdrant_collection_name,
+        vectors_config=qdrant_models.VectorParams(size=embeddings.shape[1],
+                                                  distance=qdrant_models.Distance.COSINE),
+    )
+    await client.upsert(collection_name=cv.qdrant_collection_name,
+                        points=points_for(cv, chunks, embeddings))
+
+    http = AsyncClient()
+    for concurrency in concurrencies:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call(i):
+            async with semaphore:
+                with Timer() as timer:
+                    response = await http.post(
+                        '/api/chat/async/', data=json.dumps({"cv_id": cv.id, "question": question(i)}),
+                        content_type='application/json')
+                assert response.status_code == 200, response.content
+                return timer.elapsed
+
+        with Timer() as total:
+            latencies = await asyncio.gather(*(call(i) for i in range(requests)))
+        report('async', concurrency, latencies, total.elapsed)
+
+
+def main():
+    args = parse_args()
+    setup_django(
+        QDRANT_PATH=':memory:',
+        LLM_BACKEND='fake',
+        FAKE_LLM_FIRST_TOKEN_DELAY=args.llm_latency,
+        FAKE_LLM_TOKEN_DELAY=0,
+        ANSWER_CACHE_ENABLED='false',
+    )
+    from cv_chatbot_app.services.qdrant_service import create_collection, upsert_points
+
+    with test_database():
+        chunks = synthetic_chunks(args.chunks)
+        cv, embeddings = create_cv(chunks)
+        create_collection(cv.qdrant_collection_name, vector_size=embeddings.shape[1])
+        upsert_points(cv.qdrant_collection_name, points_for(cv, chunks, embeddings))
+
+        for concurrency in args.concurrency:
+            run_sync(cv, args.requests, concurrency)
+        asyncio.run(run_async(cv, chunks, embeddings, args.requests, args.concurrency))
+
+
+if __name__ == '__main__':
+    main()
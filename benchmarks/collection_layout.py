@@ -0,0 +1,141 @@
+"""
+Compares memory use and search p95 latency of the per-CV collection layout
+against the shared collection filtered on an indexed cv_id payload field.
+
+Each layout is loaded and searched in a fresh process. Runs against Qdrant
+local mode by default (memory is the RSS growth of that process while
+loading); pass --url to benchmark a Qdrant server (memory is then reported
+as the server's segment count, check the server's /metrics for RSS).
+
+Usage: python -m benchmarks.collection_layout --cvs 200 --chunks 40 --queries 500
+"""
+import argparse
+import json
+import subprocess
+import sys
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as qdrant_models
+
+from .common import Timer, current_rss_mb, percentile
+
+DIMENSION = 384
+LAYOUTS = ('per_cv', 'shared')
+
+
+def random_vectors(rng, count):
+    vectors = rng.standard_normal((count, DIMENSION)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def vector_params():
+    return qdrant_models.VectorParams(size=DIMENSION, distance=qdrant_models.Distance.COSINE)
+
+
+def load_per_cv(client, rng, cvs, chunks):
+    names = []
+    for cv_id in range(cvs):
+        name = f"bench_cv_{uuid.uuid4().hex}"
+        client.create_collection(collection_name=name, vectors_config=vector_params())
+        vectors = random_vectors(rng, chunks)
+        client.upsert(collection_name=name, points=[
+            qdrant_models.PointStruct(id=str(uuid.uuid4()), vector=vector.tolist(),
+                                      payload={"chunk_index": i, "cv_id": cv_id})
+            for i, vector in enumerate(vectors)
+        ])
+        names.append(name)
+    return names
+
+
+def load_shared(client, rng, cvs, chunks):
+    name = f"bench_shared_{uuid.uuid4().hex}"
+    client.create_collection(collection_name=name, vectors_config=vector_params())
+    client.create_payload_index(collection_name=name, field_name="cv_id",
+                                field_schema=qdrant_models.PayloadSchemaType.INTEGER)
+    for cv_id in range(cvs):
+        vectors = random_vectors(rng, chunks)
+        client.upsert(collection_name=name, points=[
+            qdrant_models.PointStruct(id=str(uuid.uuid4()), vector=vector.tolist(),
+                                      payload={"chunk_index": i, "cv_id": cv_id})
+            for i, vector in enumerate(vectors)
+        ])
+    return name
+
+
+def search_latencies(search, rng, cvs, queries):
+    latencies = []
+    for _ in range(queries):
+        cv_id = rng.integers(cvs)
+        query = random_vectors(rng, 1)[0].tolist()
+        with Timer() as timer:
+            search(int(cv_id), query)
+        latencies.append(timer.elapsed * 1000)
+    return latencies
+
+
+def measure(layout, args):
+    """Runs in a child process; loads and searches one layout, prints one JSON line"""
+    local = args.url is None
+    rng = np.random.default_rng(args.seed)
+    client = QdrantClient(location=':memory:') if local else QdrantClient(url=args.url, api_key=args.api_key)
+
+    rss_before = current_rss_mb()
+    with Timer() as load:
+        if layout == 'per_cv':
+            names = load_per_cv(client, rng, args.cvs, args.chunks)
+        else:
+            names = [load_shared(client, rng, args.cvs, args.chunks)]
+    if local:
+        memory = f"{current_rss_mb() - rss_before:.1f} MiB RSS"
+    else:
+        memory = f"{sum(client.get_collection(name).segments_count for name in names)} segments"
+
+    if layout == 'per_cv':
+        def search(cv_id, query):
+            return client.search(collection_name=names[cv_id], query_vector=query, limit=3)
+    else:
+        def search(cv_id, query):
+            return client.search(
+                collection_name=names[0], query_vector=query, limit=3,
+                query_filter=qdrant_models.Filter(must=[
+                    qdrant_models.FieldCondition(key="cv_id", match=qdrant_models.MatchValue(value=cv_id))
+                ]),
+            )
+
+    latencies = search_latencies(search, rng, args.cvs, args.queries)
+    for name in names:
+        client.delete_collection(collection_name=name)
+    client.close()
+    print(json.dumps({"load_seconds": load.elapsed, "memory": memory,
+                      "p50_ms": percentile(latencies, 50), "p95_ms": percentile(latencies, 95)}))
+
+
+def run(args):
+    for layout in LAYOUTS:
+        command = [sys.executable, '-m', 'benchmarks.collection_layout', '--measure', layout,
+                   '--cvs', str(args.cvs), '--chunks', str(args.chunks), '--queries', str(args.queries),
+                   '--seed', str(args.seed)]
+        if args.url:
+            command += ['--url', args.url] + (['--api-key', args.api_key] if args.api_key else [])
+        output = subprocess.check_output(command)
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        print(f"{layout}: load {result['load_seconds']:.2f}s, memory {result['memory']}, "
+              f"p50 {result['p50_ms']:.2f}ms, p95 {result['p95_ms']:.2f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cvs', type=int, default=200)
+    parser.add_argument('--chunks', type=int, default=40, help='chunks per CV')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--url', help='Qdrant server URL (default: local in-memory mode)')
+    parser.add_argument('--api-key')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--measure', choices=LAYOUTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure(args.measure, args)
+    else:
+        run(args)
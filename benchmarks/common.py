@@ -0,0 +1,73 @@
+import math
+import random
+import resource
+import time
+
+# Vocabulary used to build synthetic CV text
+_SKILLS = [
+    "Python", "Django", "PostgreSQL", "Kubernetes", "PyTorch", "React", "Docker",
+    "AWS", "Terraform", "Go", "TypeScript", "Redis", "Kafka", "Airflow", "Spark",
+]
+_VERBS = ["Built", "Designed", "Led", "Maintained", "Migrated", "Optimized", "Shipped", "Scaled"]
+_OBJECTS = [
+    "a payments service", "the data pipeline", "an internal search engine",
+    "the customer onboarding flow", "a recommendation system", "the CI/CD platform",
+    "a document processing API", "the analytics dashboard",
+]
+
+def synthetic_sentence(rng):
+    """Returns one CV-like sentence"""
+    skills = rng.sample(_SKILLS, 2)
+    return (
+        f"{rng.choice(_VERBS)} {rng.choice(_OBJECTS)} using {skills[0]} and {skills[1]} "
+        f"for {rng.randint(1, 9)} years with a team of {rng.randint(2, 20)} engineers."
+    )
+
+def synthetic_cv_text(sentences=120, seed=0):
+    """Returns the text of a synthetic CV"""
+    rng = random.Random(seed)
+    return " ".join(synthetic_sentence(rng) for _ in range(sentences))
+
+def synthetic_chunks(count, seed=0):
+    """Returns `count` chunk-sized texts of roughly 500 characters"""
+    rng = random.Random(seed)
+    chunks = []
+    for _ in range(count):
+        chunk = ""
+        while len(chunk) < 450:
+            chunk += synthetic_sentence(rng) + " "
+        chunks.append(chunk.strip())
+    return chunks
+
+def percentile(values, pct):
+    """Returns the pct-th percentile of values (nearest-rank)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # Nearest rank: the smallest value with at least pct% of values at or below it
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+class Timer:
+    """Context manager measuring wall-clock seconds"""
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+
+def current_rss_mb():
+    """Returns the resident set size of this process in MiB (Linux)"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process in MiB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,208 @@
+"""
+Compares the default Qdrant storage (float32 vectors, chunk text in the
+payload) with the compact ones (QDRANT_QUANTIZATION=int8 or binary with
+QDRANT_PAYLOAD_MODE=ids): memory per 10k CVs and recall@k of per-CV
+searches against exact float32 search.
+
+Memory is computed from the bytes each layout keeps in RAM and on disk
+(vectors, payload JSON, HNSW links at m=16); the chunk texts in Postgres are
+the same for every layout. Recall is measured on a Qdrant server with
+--url. Local mode does not quantize, so without --url quantized search is
+simulated in numpy the way Qdrant scores it: int8 with quantile clipping,
+binary by sign agreement, both rescored with the float32 vectors after
+oversampling.
+
+Usage: python -m benchmarks.compact_storage --cvs 200 --chunks 40 --queries 300 [--url http://localhost:6333]
+"""
+import argparse
+import json
+import math
+import random
+import uuid
+
+import numpy as np
+
+from .common import Timer, synthetic_chunks, synthetic_sentence
+
+DIMENSION = 384
+HNSW_M = 16
+LAYOUTS = ('full', 'int8', 'binary')
+
+
+def build_corpus(cvs, chunks, seed):
+    """Returns the chunk texts of every CV"""
+    return [synthetic_chunks(chunks, seed=seed * 100003 + cv_index) for cv_index in range(cvs)]
+
+
+def embed(texts, random_vectors, rng):
+    if random_vectors:
+        vectors = rng.standard_normal((len(texts), DIMENSION)).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    from cv_chatbot_app.services.embedding import generate_embeddings
+    return np.asarray(generate_embeddings(texts), dtype=np.float32)
+
+
+def payload(layout, cv_id, chunk_index, text):
+    if layout == 'full':
+        return {"text": text, "chunk_index": chunk_index, "cv_id": cv_id}
+    return {"cv_id": cv_id}
+
+
+def memory(layout, corpus, chunks_per_cv):
+    """Returns (RAM MiB, disk MiB) of the vectors, payloads and graph for 10k CVs"""
+    payload_bytes = np.mean([
+        len(json.dumps(payload(layout, cv_id, i, text)))
+        for cv_id, texts in enumerate(corpus) for i, text in enumerate(texts)
+    ])
+    graph_bytes = 2 * HNSW_M * 4
+    float_bytes = DIMENSION * 4
+    if layout == 'full':
+        ram, disk = float_bytes + payload_bytes + graph_bytes, 0
+    elif layout == 'int8':
+        ram, disk = DIMENSION + payload_bytes + graph_bytes, float_bytes
+    else:
+        ram, disk = DIMENSION // 8 + payload_bytes + graph_bytes, float_bytes
+    points = 10000 * chunks_per_cv
+    return ram * points / 2 ** 20, disk * points / 2 ** 20
+
+
+def exact_top(vectors, query, k):
+    return list(np.argsort(-(vectors @ query))[:k])
+
+
+class SimulatedQuantization:
+    """Quantized scoring of one collection, mirroring Qdrant's int8 and binary modes"""
+    def __init__(self, layout, vectors, quantile=0.99):
+        self.layout = layout
+        if layout == 'int8':
+            values = np.sort(vectors.ravel())
+            tail = int(len(values) * (1 - quantile) / 2)
+            self.low, self.high = values[tail], values[-tail - 1]
+            self.codes = self.encode(vectors)
+        else:
+            self.codes = vectors > 0
+
+    def encode(self, vectors):
+        scaled = (np.clip(vectors, self.low, self.high) - self.low) / (self.high - self.low)
+        return np.round(scaled * 255).astype(np.int32) - 128
+
+    def scores(self, rows, query):
+        if self.layout == 'int8':
+            return self.codes[rows] @ self.encode(query[None, :])[0]
+        return (self.codes[rows] == (query > 0)).sum(axis=1)
+
+    def search(self, vectors, rows, query, k, oversampling, rescore=True):
+        candidates = rows[np.argsort(-self.scores(rows, query))[:int(math.ceil(k * oversampling))]]
+        if not rescore:
+            return list(candidates[:k])
+        return list(candidates[np.argsort(-(vectors[candidates] @ query))[:k]])
+
+
+def simulated_recall(layout, vectors, cv_rows, queries, k, oversampling):
+    quantization = SimulatedQuantization(layout, vectors)
+    hits = plain_hits = 0
+    for cv_id, query in queries:
+        rows = cv_rows[cv_id]
+        truth = set(rows[exact_top(vectors[rows], query, k)])
+        hits += len(truth & set(quantization.search(vectors, rows, query, k, oversampling)))
+        plain_hits += len(truth & set(quantization.search(vectors, rows, query, k, oversampling, rescore=False)))
+    total = k * len(queries)
+    return hits / total, plain_hits / total
+
+
+def server_recall(client, layout, corpus, vectors, cv_rows, queries, k, oversampling):
+    from qdrant_client.http import models as qdrant_models
+
+    quantization = None
+    if layout == 'int8':
+        quantization = qdrant_models.ScalarQuantization(scalar=qdrant_models.ScalarQuantizationConfig(
+            type=qdrant_models.ScalarType.INT8, quantile=0.99, always_ram=True))
+    elif layout == 'binary':
+        quantization = qdrant_models.BinaryQuantization(
+            binary=qdrant_models.BinaryQuantizationConfig(always_ram=True))
+    name = f"bench_compact_{layout}_{uuid.uuid4().hex}"
+    client.create_collection(
+        collection_name=name,
+        vectors_config=qdrant_models.VectorParams(size=DIMENSION, distance=qdrant_models.Distance.COSINE,
+                                                  on_disk=True if quantization else None),
+        quantization_config=quantization,
+    )
+    client.create_payload_index(collection_name=name, field_name="cv_id",
+                                field_schema=qdrant_models.PayloadSchemaType.INTEGER)
+    try:
+        point_ids = []
+        for cv_id, texts in enumerate(corpus):
+            points = []
+            for i, text in enumerate(texts):
+                point_id = str(uuid.uuid4())
+                point_ids.append(point_id)
+                points.append(qdrant_models.PointStruct(
+                    id=point_id, vector=vectors[cv_rows[cv_id][i]].tolist(),
+                    payload=payload(layout, cv_id, i, text)))
+            client.upsert(collection_name=name, points=points)
+
+        params = qdrant_models.SearchParams(quantization=qdrant_models.QuantizationSearchParams(
+            rescore=True, oversampling=oversampling)) if quantization else None
+        position = {point_id: row for row, point_id in enumerate(point_ids)}
+        hits = 0
+        with Timer() as timer:
+            for cv_id, query in queries:
+                rows = cv_rows[cv_id]
+                truth = set(rows[exact_top(vectors[rows], query, k)])
+                results = client.search(
+                    collection_name=name, query_vector=query.tolist(), limit=k, search_params=params,
+                    query_filter=qdrant_models.Filter(must=[qdrant_models.FieldCondition(
+                        key="cv_id", match=qdrant_models.MatchValue(value=cv_id))]),
+                )
+                hits += len(truth & {position[str(result.id)] for result in results})
+        return hits / (k * len(queries)), timer.elapsed / len(queries) * 1000
+    finally:
+        client.delete_collection(collection_name=name)
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    corpus = build_corpus(args.cvs, args.chunks, args.seed)
+    with Timer() as timer:
+        vectors = embed([text for texts in corpus for text in texts], args.random_vectors, rng)
+    print(f"Embedded {len(vectors)} chunks in {timer.elapsed:.1f}s")
+    cv_rows = [np.arange(cv_id * args.chunks, (cv_id + 1) * args.chunks) for cv_id in range(args.cvs)]
+
+    sentence_rng = random.Random(args.seed + 1)
+    question_texts = [synthetic_sentence(sentence_rng) for _ in range(args.queries)]
+    question_vectors = embed(question_texts, args.random_vectors, rng)
+    queries = [(int(rng.integers(args.cvs)), vector) for vector in question_vectors]
+
+    client = None
+    if args.url:
+        from qdrant_client import QdrantClient
+        client = QdrantClient(url=args.url, api_key=args.api_key, timeout=60)
+
+    for layout in LAYOUTS:
+        ram, disk = memory(layout, corpus, args.chunks)
+        line = f"{layout:>6}: RAM {ram:9.1f} MiB, disk {disk:9.1f} MiB per 10k CVs"
+        if client is not None:
+            recall, latency = server_recall(client, layout, corpus, vectors, cv_rows, queries,
+                                            args.k, args.oversampling)
+            line += f", recall@{args.k} {recall:.3f}, {latency:.2f}ms/query"
+        elif layout == 'full':
+            line += f", recall@{args.k} 1.000 (exact)"
+        else:
+            recall, plain = simulated_recall(layout, vectors, cv_rows, queries, args.k, args.oversampling)
+            line += f", recall@{args.k} {recall:.3f} rescored, {plain:.3f} without rescoring (simulated)"
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cvs', type=int, default=200)
+    parser.add_argument('--chunks', type=int, default=40, help='chunks per CV')
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--oversampling', type=float, default=2.0)
+    parser.add_argument('--random-vectors', action='store_true',
+                        help='use random unit vectors instead of the embedding model')
+    parser.add_argument('--url', help='Qdrant server URL (default: simulate quantized search)')
+    parser.add_argument('--api-key')
+    parser.add_argument('--seed', type=int, default=0)
+    run(parser.parse_args())
@@ -0,0 +1,115 @@
+"""
+Synthetic CV documents (multi-page PDF and DOCX) for the extraction and
+ingestion benchmarks.
+
+Usage: python -m benchmarks.corpus --out /tmp/cv_corpus --pages 1 10 50 200
+"""
+import argparse
+import os
+import random
+
+from .common import synthetic_sentence
+
+LINES_PER_PAGE = 45
+CHARS_PER_LINE = 90
+
+
+def _wrap(text, width=CHARS_PER_LINE):
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def page_lines(rng, pages):
+    """Returns `pages` lists of text lines"""
+    text = " ".join(synthetic_sentence(rng) for _ in range(pages * LINES_PER_PAGE))
+    lines = _wrap(text)
+    return [lines[i:i + LINES_PER_PAGE] for i in range(0, LINES_PER_PAGE * pages, LINES_PER_PAGE)]
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_pdf(path, pages, seed=0):
+    """Writes a text PDF with the given number of pages (no external dependency)"""
+    rng = random.Random(seed)
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(None)
+    pages_obj = add(None)
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids = []
+    for lines in page_lines(rng, pages):
+        content = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(
+            f"({_escape(line)}) Tj T*" for line in lines
+        ) + " ET"
+        data = content.encode('latin-1')
+        stream = add(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_obj, font, stream)
+        ))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_obj
+    objects[pages_obj - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page_id for page_id in page_ids), len(page_ids)
+    )
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog, xref
+    )
+    with open(path, 'wb') as handle:
+        handle.write(output)
+    return path
+
+
+def write_docx(path, pages, seed=0):
+    """Writes a DOCX with roughly `pages` pages worth of paragraphs"""
+    import docx
+
+    rng = random.Random(seed)
+    document = docx.Document()
+    for lines in page_lines(rng, pages):
+        for i in range(0, len(lines), 5):
+            document.add_paragraph(" ".join(lines[i:i + 5]))
+    document.save(path)
+    return path
+
+
+def build_corpus(directory, page_counts, seed=0):
+    """Writes one PDF and one DOCX per page count; returns their paths"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for pages in page_counts:
+        paths.append(write_pdf(os.path.join(directory, f"cv_{pages}p.pdf"), pages, seed))
+        paths.append(write_docx(os.path.join(directory, f"cv_{pages}p.docx"), pages, seed))
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--out', required=True)
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 50, 200])
+    args = parser.parse_args()
+    for path in build_corpus(args.out, args.pages):
+        print(path)
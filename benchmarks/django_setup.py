@@ -0,0 +1,29 @@
+import os
+from contextlib import contextmanager
+
+def setup_django(**environ):
+    """
+    Configures Django for a benchmark script. Keyword arguments are set as
+    environment defaults first, since the services read them at import time.
+    """
+    for key, value in environ.items():
+        os.environ.setdefault(key, str(value))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chatbot_project.settings')
+
+    import django
+    django.setup()
+
+@contextmanager
+def test_database():
+    """Runs the block against a throwaway test database"""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
@@ -0,0 +1,80 @@
+"""
+Compares the CPU embedding runtimes (EMBEDDING_BACKEND): model load time,
+first-call (cold) latency, single-query latency p50/p95, batch throughput
+and cosine similarity to the PyTorch vectors. Backends whose packages are
+not installed are reported and skipped.
+
+Usage: python -m benchmarks.embedding_runtimes --backends torch torch-int8 onnx onnx-int8 --threads 4
+"""
+import argparse
+import os
+import random
+
+# Force CPU before torch is imported
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+import numpy as np
+
+from cv_chatbot_app.services.embedding import EMBEDDING_BACKENDS, load_embedding_model
+from .common import Timer, percentile, synthetic_chunks, synthetic_sentence
+
+
+def measure(backend, threads, queries, chunks, batch_size):
+    with Timer() as load:
+        model = load_embedding_model(backend, threads=threads)
+    with Timer() as cold:
+        model.encode(queries[0])
+
+    latencies = []
+    for query in queries:
+        with Timer() as timer:
+            model.encode(query)
+        latencies.append(timer.elapsed * 1000)
+
+    with Timer() as batch:
+        vectors = model.encode(chunks, batch_size=batch_size, normalize_embeddings=True)
+    return {
+        "load": load.elapsed,
+        "cold_ms": cold.elapsed * 1000,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "chunks_per_second": len(chunks) / batch.elapsed,
+        "vectors": vectors,
+    }
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    queries = [synthetic_sentence(rng) for _ in range(args.queries)]
+    chunks = synthetic_chunks(args.chunks, seed=args.seed)
+    print(f"threads: {args.threads or 'default'}, queries: {args.queries}, "
+          f"chunks: {args.chunks}, batch size: {args.batch_size}")
+
+    reference = None
+    for backend in args.backends:
+        try:
+            result = measure(backend, args.threads, queries, chunks, args.batch_size)
+        except Exception as e:
+            print(f"{backend:>10}: skipped ({str(e).splitlines()[0]})")
+            continue
+        if reference is None and backend == 'torch':
+            reference = result["vectors"]
+        parity = ""
+        if reference is not None:
+            cosine = np.sum(result["vectors"] * reference, axis=1)
+            parity = f", cosine vs torch min {cosine.min():.4f} mean {cosine.mean():.4f}"
+        print(f"{backend:>10}: load {result['load']:.2f}s, cold {result['cold_ms']:.1f}ms, "
+              f"query p50 {result['p50_ms']:.2f}ms p95 {result['p95_ms']:.2f}ms, "
+              f"batch {result['chunks_per_second']:.1f} chunks/sec{parity}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--backends', nargs='+', default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS,
+                        help='torch first, so the others are compared against it')
+    parser.add_argument('--threads', type=int, default=0, help='intra-op threads (0: library default)')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--chunks', type=int, default=256)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=0)
+    run(parser.parse_args())
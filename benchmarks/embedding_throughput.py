@@ -0,0 +1,48 @@
+"""
+Measures CV ingestion embedding throughput (chunks/sec) on CPU for one-by-one
+`generate_embedding` calls versus batched `generate_embeddings`.
+
+Usage: python -m benchmarks.embedding_throughput --chunks 40 --cvs 5 --batch-size 32
+"""
+import argparse
+import os
+
+# Force CPU before torch is imported
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+from cv_chatbot_app.services.embedding import (
+    generate_embedding, generate_embeddings, get_embedding_model,
+)
+from .common import Timer, synthetic_chunks
+
+
+def run(chunks_per_cv, cvs, batch_size):
+    cv_chunks = [synthetic_chunks(chunks_per_cv, seed=i) for i in range(cvs)]
+    total = chunks_per_cv * cvs
+
+    # Load the model and warm up outside the measured region
+    get_embedding_model()
+    generate_embeddings(cv_chunks[0][:2], batch_size=batch_size)
+
+    with Timer() as single:
+        for chunks in cv_chunks:
+            for chunk in chunks:
+                generate_embedding(chunk)
+
+    with Timer() as batched:
+        for chunks in cv_chunks:
+            generate_embeddings(chunks, batch_size=batch_size)
+
+    print(f"CVs: {cvs}, chunks per CV: {chunks_per_cv}, batch size: {batch_size}")
+    print(f"one-by-one: {total / single.elapsed:8.1f} chunks/sec ({single.elapsed:.2f}s)")
+    print(f"batched:    {total / batched.elapsed:8.1f} chunks/sec ({batched.elapsed:.2f}s)")
+    print(f"speedup:    {single.elapsed / batched.elapsed:8.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chunks', type=int, default=40, help='chunks per CV')
+    parser.add_argument('--cvs', type=int, default=5, help='number of CVs')
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+    run(args.chunks, args.cvs, args.batch_size)
@@ -0,0 +1,285 @@
+"""
+End-to-end benchmark of the upload_cv and chat_with_cv endpoints, offline:
+Qdrant in local in-memory mode, the fake Groq server (FakeLLMServer, with a
+fixed answer latency) and a synthetic PDF/DOCX corpus. Reports throughput
+and p50/p95/p99 latency of ingestion and chat at each concurrency level.
+Needs a reachable Postgres server to create a throwaway test database.
+
+Results can be saved as JSON (--output) and compared with a previous run
+(--baseline): a latency percentile more than --threshold above the
+baseline, or a throughput more than --threshold below it, is reported as a
+regression and the command exits with status 1. --compare compares two
+saved runs without running anything.
+
+Usage: python -m benchmarks.end_to_end --uploads 8 --pages 2 --requests 200 --concurrency 1 4 16 --output run.json [--baseline baseline.json --threshold 0.1]
+       python -m benchmarks.end_to_end --compare run.json --baseline baseline.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+from .common import Timer, percentile
+from .corpus import write_docx, write_pdf
+
+LATENCY_METRICS = ('p50_ms', 'p95_ms', 'p99_ms')
+QUESTION_TEMPLATES = (
+    "What did the candidate build with {}?",
+    "How many years of {} experience does the candidate have?",
+    "Did the candidate lead a team working with {}?",
+)
+SKILLS = ("Python", "Django", "Kubernetes", "PyTorch", "AWS", "Kafka", "Terraform", "React")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=8, help='CVs uploaded per concurrency level')
+    parser.add_argument('--pages', type=int, default=2, help='pages per synthetic CV')
+    parser.add_argument('--formats', nargs='+', default=['pdf', 'docx'], choices=['pdf', 'docx'])
+    parser.add_argument('--requests', type=int, default=200, help='chat requests per concurrency level')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='seconds the fake LLM takes to answer')
+    parser.add_argument('--warmup', type=int, default=3, help='unmeasured chat requests before measuring')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative change counted as a regression (0.10 = 10%%)')
+    parser.add_argument('--compare', help='JSON results to compare with --baseline, without running')
+    return parser.parse_args()
+
+
+def build_documents(directory, count, pages, formats, seed):
+    """Writes `count` synthetic CVs, alternating formats; returns (file name, bytes, content type) tuples"""
+    documents = []
+    for i in range(count):
+        extension = formats[i % len(formats)]
+        path = os.path.join(directory, f"cv_{i}.{extension}")
+        if extension == 'pdf':
+            write_pdf(path, pages, seed=seed + i)
+            content_type = 'application/pdf'
+        else:
+            write_docx(path, pages, seed=seed + i)
+            content_type = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+        with open(path, 'rb') as handle:
+            documents.append((os.path.basename(path), handle.read(), content_type))
+    return documents
+
+
+def summarize(phase, concurrency, latencies, errors, elapsed):
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        "phase": phase,
+        "concurrency": concurrency,
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "mean_ms": round(sum(milliseconds) / len(milliseconds), 3) if milliseconds else 0.0,
+        "p50_ms": round(percentile(milliseconds, 50), 3),
+        "p95_ms": round(percentile(milliseconds, 95), 3),
+        "p99_ms": round(percentile(milliseconds, 99), 3),
+    }
+
+
+def report(result):
+    print(f"{result['phase']:6s} c={result['concurrency']:<4d} {result['throughput_rps']:8.2f} req/s  "
+          f"p50 {result['p50_ms']:9.1f}ms  p95 {result['p95_ms']:9.1f}ms  p99 {result['p99_ms']:9.1f}ms"
+          f"{'  errors ' + str(result['errors']) if result['errors'] else ''}")
+
+
+def run_level(call, count, concurrency):
+    """Runs call(i) for i in range(count) on `concurrency` threads; returns (latencies, errors, elapsed)"""
+    from django.db import connection
+
+    def timed(i):
+        try:
+            with Timer() as timer:
+                ok = call(i)
+            return timer.elapsed if ok else None
+        finally:
+            connection.close()
+
+    with Timer() as total:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(timed, range(count)))
+    latencies = [outcome for outcome in outcomes if outcome is not None]
+    return latencies, len(outcomes) - len(latencies), total.elapsed
+
+
+def upload(documents, level):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test import Client
+
+    uploaded = []
+
+    def call(i):
+        name, data, content_type = documents[i]
+        response = Client().post('/api/cvs/upload_cv/', {
+            "name": f"Candidate {level}-{i}",
+            "file": SimpleUploadedFile(name, data, content_type=content_type),
+            "async": "false",
+        })
+        if response.status_code != 201:
+            print(f"Upload of {name} failed ({response.status_code}): {response.content[:200]!r}")
+            return False
+        uploaded.append(response.json()["id"])
+        return True
+
+    return call, uploaded
+
+
+def chat(cv_ids, questions):
+    from django.test import Client
+
+    def call(i):
+        response = Client().post('/api/chat/', data=json.dumps({
+            "cv_id": cv_ids[i % len(cv_ids)], "question": questions[i % len(questions)],
+        }), content_type='application/json')
+        if response.status_code != 200:
+            print(f"Chat request failed ({response.status_code}): {response.content[:200]!r}")
+            return False
+        return True
+
+    return call
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    from cv_chatbot_app.services.embedding import EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "embedding_backend": EMBEDDING_BACKEND,
+    }
+
+
+def run(args):
+    from cv_chatbot_app.services.fake_llm import FakeLLMServer
+    from .django_setup import setup_django, test_database
+
+    # Deterministic fake LLM: no injected errors, fixed latency, no streaming delay per token
+    server = FakeLLMServer(first_token_delay=args.llm_latency, token_delay=0, seed=args.seed)
+    # Forced rather than defaulted: the benchmark must never reach a real backend
+    os.environ.update(
+        GROQ_BASE_URL=server.start(), GROQ_API_KEY='fake', LLM_PROVIDERS='groq', QDRANT_PATH=':memory:',
+    )
+    setup_django(ANSWER_CACHE_ENABLED='false', CV_INGESTION_MODE='sync', TRACE_SLOW_REQUEST_SECONDS=0)
+    # Keep the model load out of the first measured uploads
+    from cv_chatbot_app.services.embedding import warmup_embedding_model
+    warmup_embedding_model()
+
+    rng = random.Random(args.seed)
+    questions = [rng.choice(QUESTION_TEMPLATES).format(rng.choice(SKILLS)) for _ in range(50)]
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as directory, test_database():
+            documents = build_documents(directory, args.uploads, args.pages, args.formats, args.seed)
+            print(f"{len(documents)} CVs of {args.pages} page(s), {args.requests} chat requests per level, "
+                  f"LLM latency {args.llm_latency}s")
+
+            cv_ids = []
+            for concurrency in args.concurrency:
+                call, uploaded = upload(documents, concurrency)
+                latencies, errors, elapsed = run_level(call, len(documents), concurrency)
+                results.append(summarize('ingest', concurrency, latencies, errors, elapsed))
+                report(results[-1])
+                cv_ids.extend(uploaded)
+            if not cv_ids:
+                raise RuntimeError("No CV was ingested")
+
+            call = chat(cv_ids, questions)
+            run_level(call, args.warmup, 1)
+            for concurrency in args.concurrency:
+                latencies, errors, elapsed = run_level(call, args.requests, concurrency)
+                results.append(summarize('chat', concurrency, latencies, errors, elapsed))
+                report(results[-1])
+            fake_llm_stats = dict(server.stats)
+    finally:
+        server.stop()
+
+    return {
+        "benchmark": "end_to_end",
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ('output', 'baseline', 'compare')},
+        "environment": environment(),
+        "fake_llm": fake_llm_stats,
+        "results": results,
+    }
+
+
+def compare(run_results, baseline, threshold):
+    """
+    Prints the change of every metric against the baseline run; returns the
+    regressions, as (phase, concurrency, metric, baseline value, new value)
+    """
+    previous = {(result["phase"], result["concurrency"]): result for result in baseline["results"]}
+    regressions = []
+    print(f"Compared with {baseline.get('environment', {}).get('commit') or 'baseline'} "
+          f"({baseline.get('created', 'unknown date')}), threshold {threshold:.0%}")
+    for result in run_results["results"]:
+        key = (result["phase"], result["concurrency"])
+        old = previous.get(key)
+        if old is None:
+            print(f"{key[0]:6s} c={key[1]:<4d} not in baseline")
+            continue
+        changes = []
+        for metric in ('throughput_rps',) + LATENCY_METRICS:
+            if not old[metric]:
+                continue
+            change = result[metric] / old[metric] - 1
+            # Lower throughput and higher latency are regressions
+            regressed = change < -threshold if metric == 'throughput_rps' else change > threshold
+            if regressed:
+                regressions.append((key[0], key[1], metric, old[metric], result[metric]))
+            changes.append(f"{metric.split('_')[0]} {change:+.1%}{' REGRESSION' if regressed else ''}")
+        if result["errors"] > old["errors"]:
+            regressions.append((key[0], key[1], 'errors', old["errors"], result["errors"]))
+            changes.append(f"errors {old['errors']} -> {result['errors']} REGRESSION")
+        print(f"{key[0]:6s} c={key[1]:<4d} " + ", ".join(changes))
+    return regressions
+
+
+def main():
+    args = parse_args()
+    if args.compare:
+        if not args.baseline:
+            sys.exit("--compare needs --baseline")
+        with open(args.compare) as handle:
+            run_results = json.load(handle)
+    else:
+        run_results = run(args)
+        if args.output:
+            with open(args.output, 'w') as handle:
+                json.dump(run_results, handle, indent=2)
+            print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        regressions = compare(run_results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            sys.exit(1)
+        print("No regression")
+
+
+if __name__ == '__main__':
+    main()
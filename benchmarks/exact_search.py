@@ -0,0 +1,75 @@
+"""
+Benchmarks the in-process NumPy exact search engine against the CV's vector
+store search (Qdrant; set Qdrant_client_url to measure a remote server) at
+several concurrency levels. Uses a throwaway test database (needs Postgres).
+
+Usage: python -m benchmarks.exact_search --cvs 50 --chunks 40 --requests 2000 --concurrency 1 10 100
+"""
+import argparse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .common import Timer, percentile
+from .django_setup import setup_django, test_database
+
+DIMENSION = 384
+
+
+def run(args):
+    setup_django()
+    from django.db import connection
+    from cv_chatbot_app.models import CV, CVChunk
+    from cv_chatbot_app.services.exact_search import exact_search, get_exact_search_stats
+    from cv_chatbot_app.services.qdrant_service import generate_collection_name
+    from cv_chatbot_app.services.vector_store import QdrantVectorStore
+
+    store = QdrantVectorStore()
+    rng = np.random.default_rng(args.seed)
+    with test_database():
+        cvs = []
+        for i in range(args.cvs):
+            cv = CV.objects.create(name=f"Exact {i}", qdrant_collection_name=generate_collection_name())
+            store.create_cv_storage(cv)
+            vectors = rng.standard_normal((args.chunks, DIMENSION)).astype(np.float32)
+            records = [
+                CVChunk(cv=cv, chunk_index=j, chunk_text=f"chunk {j}", qdrant_point_id=str(uuid.uuid4()))
+                for j in range(args.chunks)
+            ]
+            store.add_chunks(cv, records, vectors)
+            CVChunk.objects.bulk_create(records)
+            cvs.append(cv)
+
+        queries = [(cvs[int(rng.integers(args.cvs))], rng.standard_normal(DIMENSION).tolist())
+                   for _ in range(args.requests)]
+
+        engines = [
+            ('store', lambda cv, query: store.search(cv, query, limit=3)),
+            ('exact', lambda cv, query: exact_search(cv, query, limit=3)),
+        ]
+        for label, search in engines:
+            for concurrency in args.concurrency:
+                def call(item):
+                    cv, query = item
+                    with Timer() as timer:
+                        search(cv, query)
+                    return timer.elapsed * 1000
+
+                with Timer() as total:
+                    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                        latencies = list(pool.map(call, queries))
+                print(f"{label:5s} c={concurrency:<4d} {len(latencies) / total.elapsed:9.1f} req/s  "
+                      f"p50 {percentile(latencies, 50):7.3f}ms  p99 {percentile(latencies, 99):7.3f}ms")
+        print(f"matrix cache: {get_exact_search_stats()}")
+        connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cvs', type=int, default=50)
+    parser.add_argument('--chunks', type=int, default=40, help='chunks per CV')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--seed', type=int, default=0)
+    run(parser.parse_args())
@@ -0,0 +1,90 @@
+"""
+Compares document text extraction throughput (pages/sec), time to first chunk
+and peak RSS of the original whole-file extractor with the streaming one,
+serial and with the process pool. Each measurement runs in a fresh process.
+
+Usage: python -m benchmarks.extraction --pages 10 50 200 [--workers 4]
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from .common import Timer
+from .corpus import build_corpus
+
+VARIANTS = ['baseline', 'streaming', 'parallel']
+
+
+def baseline_extract(file_obj):
+    """The original implementation: whole file parsed and concatenated first"""
+    import PyPDF2
+    import docx
+
+    text = ""
+    if file_obj.name.endswith('.pdf'):
+        for page in PyPDF2.PdfReader(file_obj).pages:
+            text += page.extract_text() + "\n"
+    else:
+        for para in docx.Document(file_obj).paragraphs:
+            text += para.text + "\n"
+    return [text]
+
+
+def measure(variant, path, workers):
+    """Runs in a child process; prints one JSON line"""
+    os.environ['PDF_EXTRACT_WORKERS'] = str(workers if variant == 'parallel' else 1)
+    os.environ['PDF_PARALLEL_MIN_PAGES'] = '2'
+    from .django_setup import setup_django
+    setup_django()
+    from cv_chatbot_app.services.cv_upload import iter_text_from_file, iter_chunks
+
+    first_chunk = None
+    chunks = 0
+    with open(path, 'rb') as file_obj, Timer() as timer:
+        parts = baseline_extract(file_obj) if variant == 'baseline' else iter_text_from_file(file_obj)
+        for _ in iter_chunks(parts):
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - timer.start
+            chunks += 1
+
+    peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+    print(json.dumps({"seconds": timer.elapsed, "first_chunk": first_chunk or 0.0,
+                      "chunks": chunks, "peak_rss_mb": peak}))
+
+
+def run(args):
+    directory = tempfile.mkdtemp(prefix='cv_extract_bench_')
+    paths = build_corpus(directory, args.pages)
+    for path in paths:
+        pages = int(re.search(r'_(\d+)p\.', path).group(1))
+        for variant in VARIANTS:
+            if variant == 'parallel' and not path.endswith('.pdf'):
+                continue
+            output = subprocess.check_output([
+                sys.executable, '-m', 'benchmarks.extraction',
+                '--measure', variant, path, '--workers', str(args.workers),
+            ])
+            result = json.loads(output.decode().strip().splitlines()[-1])
+            print(f"{os.path.basename(path):16s} {variant:9s} "
+                  f"{pages / result['seconds']:8.1f} pages/s  "
+                  f"first chunk {result['first_chunk'] * 1000:8.1f}ms  "
+                  f"peak RSS {result['peak_rss_mb']:7.1f} MiB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--measure', nargs=2, metavar=('VARIANT', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure(args.measure[0], args.measure[1], args.workers)
+    else:
+        run(args)
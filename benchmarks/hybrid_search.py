@@ -0,0 +1,111 @@
+"""
+Relevance and latency of the vector, lexical (BM25) and hybrid search modes
+on a local fixture corpus: synthetic CVs in which one chunk per query holds
+an exact token (a certification ID or an employer name) that the question
+asks about. Reports hit rate at k, MRR, p50/p95 latency and the size of the
+inverted index.
+
+Uses a throwaway test database (needs Postgres), Qdrant in-memory mode and
+the embedding model.
+
+Usage: python -m benchmarks.hybrid_search --cvs 50 --chunks 30 --needles 3 --k 3
+"""
+import argparse
+import random
+
+from .common import Timer, percentile, synthetic_chunks
+from .django_setup import setup_django, test_database
+
+_CERT_PREFIXES = ["AZ", "CKA", "DP", "SAA", "PMP", "CISSP", "GCP", "RHCE"]
+_EMPLOYERS = ["Quantexa", "Zalando", "Ocado", "Personio", "Wayfair", "Monzo", "Criteo", "Adyen"]
+
+
+def needle(rng, used):
+    """Returns (sentence, question) about a token found nowhere else in the corpus"""
+    while True:
+        if rng.random() < 0.5:
+            token = f"{rng.choice(_CERT_PREFIXES)}-{rng.randint(100, 999)}"
+            sentence = f"Holds the {token} certification, renewed in {rng.randint(2015, 2024)}."
+            question = f"Does the candidate have the {token} certification?"
+        else:
+            token = f"{rng.choice(_EMPLOYERS)}{rng.randint(10, 99)}"
+            sentence = f"Worked as a contractor at {token} on internal tooling."
+            question = f"What did the candidate do at {token}?"
+        if token not in used:
+            used.add(token)
+            return sentence, question
+
+
+def build_corpus(cvs, chunks, needles, seed):
+    """Returns [(chunks, [(needle_chunk_index, question), ...])] for each CV"""
+    rng = random.Random(seed)
+    used = set()
+    corpus = []
+    for cv_index in range(cvs):
+        texts = synthetic_chunks(chunks, seed=seed * 100003 + cv_index)
+        questions = []
+        for index in rng.sample(range(chunks), needles):
+            sentence, question = needle(rng, used)
+            texts[index] = f"{texts[index]} {sentence}"
+            questions.append((index, question))
+        corpus.append((texts, questions))
+    return corpus
+
+
+def index_size(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_total_relation_size('cv_chatbot_app_lexicalposting'), "
+            "pg_total_relation_size('cv_chatbot_app_lexicalterm')"
+        )
+        postings, terms = cursor.fetchone()
+    return (postings + terms) / (1024 * 1024)
+
+
+def run(args):
+    setup_django(QDRANT_PATH=':memory:')
+    from django.db import connection
+    from cv_chatbot_app.models import CV, LexicalPosting, LexicalTerm
+    from cv_chatbot_app.services.cv_search import search_cv, SEARCH_MODES
+    from cv_chatbot_app.services.cv_upload import choose_cv_storage, _store_chunks
+    from cv_chatbot_app.services.embedding import generate_embeddings
+    from cv_chatbot_app.services.vector_store import get_vector_store
+
+    corpus = build_corpus(args.cvs, args.chunks, args.needles, args.seed)
+    with test_database():
+        queries = []
+        with Timer() as load:
+            for cv_index, (texts, questions) in enumerate(corpus):
+                collection_name, layout = choose_cv_storage()
+                cv = CV.objects.create(name=f"Fixture {cv_index}", qdrant_collection_name=collection_name,
+                                       storage_layout=layout)
+                get_vector_store(cv).create_cv_storage(cv)
+                _store_chunks(cv, zip(texts, generate_embeddings(texts)))
+                queries.extend((cv, index, question) for index, question in questions)
+        print(f"loaded {args.cvs} CVs x {args.chunks} chunks in {load.elapsed:.1f}s; "
+              f"index: {LexicalTerm.objects.count()} terms, {LexicalPosting.objects.count()} postings, "
+              f"{index_size(connection):.1f} MiB")
+
+        for mode in SEARCH_MODES:
+            hits, reciprocal_ranks, latencies = 0, [], []
+            for cv, index, question in queries:
+                with Timer() as timer:
+                    results = search_cv(cv, question, limit=args.k, mode=mode)
+                latencies.append(timer.elapsed * 1000)
+                ranks = [rank for rank, result in enumerate(results, start=1)
+                         if result.payload["chunk_index"] == index]
+                hits += bool(ranks)
+                reciprocal_ranks.append(1 / ranks[0] if ranks else 0.0)
+            print(f"{mode:8s} hit@{args.k} {hits / len(queries):.3f}  "
+                  f"MRR {sum(reciprocal_ranks) / len(queries):.3f}  "
+                  f"p50 {percentile(latencies, 50):7.2f}ms  p95 {percentile(latencies, 95):7.2f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cvs', type=int, default=50)
+    parser.add_argument('--chunks', type=int, default=30, help='chunks per CV')
+    parser.add_argument('--needles', type=int, default=3, help='questions per CV')
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    run(parser.parse_args())
@@ -0,0 +1,73 @@
+"""
+Measures the chat-path query embedding latency with and without the query
+embedding cache, replaying a recruiter-style workload where the same few
+questions are asked about many CVs.
+
+Usage: python -m benchmarks.query_embedding_cache --cvs 50 [--shared-path /tmp/qcache.sqlite3]
+"""
+import argparse
+import os
+
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+from cv_chatbot_app.services.embedding import (
+    QueryEmbeddingCache, get_embedding_model, generate_embedding,
+)
+import cv_chatbot_app.services.embedding as embedding
+from .common import Timer, percentile
+
+QUESTIONS = [
+    "What is their Python experience?",
+    "Have they worked with Kubernetes?",
+    "What is their highest degree?",
+    "Summarize their leadership experience.",
+    "Which cloud providers have they used?",
+    "What databases do they know?",
+    "How many years of experience do they have?",
+    "Have they built machine learning models?",
+]
+
+
+def workload(cvs):
+    # Recruiters type the same questions with small casing/spacing differences
+    for cv in range(cvs):
+        for i, question in enumerate(QUESTIONS):
+            yield question.upper() if (cv + i) % 5 == 0 else f"  {question}  "
+
+
+def measure(embed, cvs):
+    latencies = []
+    for question in workload(cvs):
+        with Timer() as timer:
+            embed(question)
+        latencies.append(timer.elapsed * 1000)
+    return latencies
+
+
+def report(label, latencies):
+    print(f"{label:10s} p50 {percentile(latencies, 50):7.3f}ms  p95 {percentile(latencies, 95):7.3f}ms  "
+          f"total {sum(latencies):9.1f}ms")
+
+
+def run(args):
+    get_embedding_model()
+    generate_embedding("warmup")
+
+    uncached = measure(generate_embedding, args.cvs)
+    report("uncached", uncached)
+
+    embedding._query_cache = QueryEmbeddingCache(max_size=args.cache_size, path=args.shared_path)
+    cached = measure(embedding.generate_query_embedding, args.cvs)
+    report("cached", cached)
+
+    stats = embedding.get_query_cache_stats()
+    print(f"cache stats: {stats}")
+    print(f"saved per chat request: {(sum(uncached) - sum(cached)) / len(cached):.3f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cvs', type=int, default=50)
+    parser.add_argument('--cache-size', type=int, default=1024)
+    parser.add_argument('--shared-path', help='SQLite file for the shared tier')
+    run(parser.parse_args())
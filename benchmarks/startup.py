@@ -0,0 +1,127 @@
+"""
+Cold start and memory of a gunicorn deployment with and without preload_app
+(GUNICORN_PRELOAD, see gunicorn.conf.py): seconds until every worker is
+ready to serve, and the RSS and PSS of the master plus its workers. RSS
+counts pages shared copy-on-write once per process; PSS splits them between
+the processes sharing them, so its total is the memory actually used.
+Also prints the startup phases reported by one worker (/api/startup/stats/).
+
+Linux only (reads /proc). Runs against the configured settings; no request
+touches the database.
+
+Usage: python -m benchmarks.startup --workers 4 --modes preload no-preload
+"""
+import argparse
+import json
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from .common import Timer
+
+MODES = ('preload', 'no-preload')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def memory_mb(pid):
+    """Returns (RSS, PSS) of a process in MiB"""
+    values = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in ('Rss', 'Pss'):
+                    values[key] = int(rest.split()[0]) / 1024
+    except OSError:
+        pass
+    return values.get('Rss', 0.0), values.get('Pss', 0.0)
+
+
+def wait_ready(process, workers, timeout):
+    """Reads gunicorn's output until every worker printed its ready line"""
+    ready = 0
+    buffer = b''
+    deadline = time.monotonic() + timeout
+    while ready < workers:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or process.poll() is not None:
+            raise RuntimeError(f"{ready}/{workers} workers ready; gunicorn output:\n{buffer.decode(errors='replace')}")
+        readable, _, _ = select.select([process.stdout], [], [], remaining)
+        if readable:
+            data = os.read(process.stdout.fileno(), 65536)
+            buffer += data
+            ready = buffer.count(b' ready: ')
+
+
+def run_mode(mode, args):
+    port = free_port()
+    env = dict(os.environ, GUNICORN_PRELOAD='true' if mode == 'preload' else 'false',
+               WEB_CONCURRENCY=str(args.workers), PYTHONUNBUFFERED='1', CUDA_VISIBLE_DEVICES='')
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+               '--bind', f'127.0.0.1:{port}', 'chatbot_project.asgi:application']
+    process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    try:
+        with Timer() as timer:
+            wait_ready(process, args.workers, args.timeout)
+        # Let copy-on-write faults from the first moments of each worker settle
+        time.sleep(1)
+        pids = [process.pid] + children(process.pid)
+        usage = [memory_mb(pid) for pid in pids]
+        with Timer() as first:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/startup/stats/', timeout=60) as response:
+                report = json.load(response)
+        return {
+            "ready_seconds": timer.elapsed,
+            "first_request_ms": first.elapsed * 1000,
+            "rss_mb": sum(rss for rss, _ in usage),
+            "pss_mb": sum(pss for _, pss in usage),
+            "master_pss_mb": usage[0][1],
+            "processes": len(pids),
+            "report": report,
+        }
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def run(args):
+    print(f"workers: {args.workers}")
+    for mode in args.modes:
+        result = run_mode(mode, args)
+        print(f"{mode:>10}: all workers ready in {result['ready_seconds']:.2f}s, "
+              f"first request {result['first_request_ms']:.1f}ms, "
+              f"{result['processes']} processes RSS {result['rss_mb']:.0f} MiB, "
+              f"PSS {result['pss_mb']:.0f} MiB (master {result['master_pss_mb']:.0f} MiB)")
+        for phase in result["report"]["phases"]:
+            where = 'master' if phase["pid"] != result["report"]["pid"] else 'worker'
+            print(f"{'':>12}{phase['phase']:<24} {phase['seconds']:7.2f}s "
+                  f"{phase['rss_delta_mb']:+7.0f} MiB  ({where})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=MODES)
+    parser.add_argument('--timeout', type=float, default=300, help='seconds to wait for the workers')
+    run(parser.parse_args())
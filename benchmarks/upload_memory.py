@@ -0,0 +1,70 @@
+"""
+Measures peak transient memory of CV ingestion as the document grows, for the
+original list-based pipeline and the streaming pipeline of
+process_and_store_cv. Uses Qdrant in-memory mode and a throwaway test
+database (needs a reachable Postgres server).
+
+Transient memory is the tracemalloc peak minus what stays allocated after the
+upload (e.g. the points kept by in-memory Qdrant), so it isolates the pipeline.
+
+Usage: python -m benchmarks.upload_memory --pages 10 50 200
+"""
+import argparse
+import os
+import tempfile
+import tracemalloc
+
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+from .common import Timer
+from .corpus import write_pdf
+from .django_setup import setup_django, test_database
+
+
+def baseline_upload(name, file_obj):
+    """The list-based pipeline: full text, all chunks and all embeddings held at once"""
+    from cv_chatbot_app.services.cv_upload import (
+        choose_cv_storage, create_chunks, extract_text_from_file, store_cv_chunks,
+    )
+    from cv_chatbot_app.services.embedding import generate_embeddings
+    from cv_chatbot_app.services.qdrant_service import create_collection
+
+    text = extract_text_from_file(file_obj)
+    collection_name, storage_layout = choose_cv_storage()
+    create_collection(collection_name)
+    chunks = [chunk for chunk in create_chunks(text) if len(chunk.strip()) >= 20]
+    embeddings = generate_embeddings(chunks)
+    return store_cv_chunks(name, collection_name, list(zip(chunks, embeddings)), storage_layout)
+
+
+def measure(upload, path):
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    with open(path, 'rb') as file_obj, Timer() as timer:
+        upload('Memory Benchmark', file_obj)
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (peak - after) / 1024 / 1024, (after - before) / 1024 / 1024, timer.elapsed
+
+
+def run(args):
+    setup_django(QDRANT_PATH=':memory:', PDF_EXTRACT_WORKERS=1,
+                 CV_MAX_PAGES=max(args.pages), CV_MAX_UPLOAD_BYTES=1 << 34)
+    from cv_chatbot_app.services.cv_upload import process_and_store_cv
+    from cv_chatbot_app.services.embedding import generate_embeddings
+
+    directory = tempfile.mkdtemp(prefix='cv_memory_bench_')
+    with test_database():
+        generate_embeddings(["warmup"])
+        for pages in args.pages:
+            path = write_pdf(os.path.join(directory, f"cv_{pages}p.pdf"), pages)
+            for label, upload in [('list', baseline_upload), ('streaming', process_and_store_cv)]:
+                transient, retained, seconds = measure(upload, path)
+                print(f"{pages:5d} pages {label:9s} transient peak {transient:8.2f} MiB  "
+                      f"retained {retained:8.2f} MiB  {seconds:6.2f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, nargs='+', default=[10, 50, 200])
+    run(parser.parse_args())
@@ -0,0 +1,100 @@
+"""
+Compares recall@k and per-CV search latency of the Qdrant and pgvector vector
+store backends against exact (brute-force) search. Uses a throwaway test
+database (needs Postgres with the pgvector extension available) and Qdrant
+in-memory mode unless Qdrant_client_url/QDRANT_PATH are set.
+
+Usage: python -m benchmarks.vector_backends --cvs 100 --chunks 40 --queries 300 --k 3
+"""
+import argparse
+import uuid
+
+import numpy as np
+
+from .common import Timer, percentile
+from .django_setup import setup_django, test_database
+
+DIMENSION = 384
+
+
+def normalized(rng, count):
+    vectors = rng.standard_normal((count, DIMENSION)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def load(store, layout_cvs, vectors_by_cv):
+    from cv_chatbot_app.models import CVChunk
+
+    for cv in layout_cvs:
+        store.create_cv_storage(cv)
+        vectors = vectors_by_cv[cv.id]
+        records = [
+            CVChunk(cv=cv, chunk_index=i, chunk_text=f"chunk {i} of CV {cv.id}",
+                    qdrant_point_id=str(uuid.uuid4()))
+            for i in range(len(vectors))
+        ]
+        store.add_chunks(cv, records, vectors)
+        CVChunk.objects.bulk_create(records)
+
+
+def evaluate(store, cvs, vectors_by_cv, queries, k):
+    from cv_chatbot_app.models import CVChunk
+
+    index_of = {
+        point_id: index for point_id, index in
+        CVChunk.objects.filter(cv__in=cvs).values_list('qdrant_point_id', 'chunk_index')
+    }
+    recalls, latencies = [], []
+    for cv, query in queries:
+        truth = set(np.argsort(-(vectors_by_cv[cv.id] @ query))[:k].tolist())
+        with Timer() as timer:
+            results = store.search(cv, query.tolist(), limit=k)
+        latencies.append(timer.elapsed * 1000)
+        found = {index_of[str(result.id)] for result in results}
+        recalls.append(len(found & truth) / k)
+    return float(np.mean(recalls)), latencies
+
+
+def run(args):
+    setup_django(QDRANT_PATH=':memory:')
+    from cv_chatbot_app.models import CV
+    from cv_chatbot_app.services.qdrant_service import generate_collection_name
+    from cv_chatbot_app.services.vector_store import PgVectorStore, QdrantVectorStore
+
+    rng = np.random.default_rng(args.seed)
+    with test_database():
+        backends = []
+        for label, store, layout in [
+            ('qdrant', QdrantVectorStore(), CV.LAYOUT_PER_CV),
+            ('pgvector', PgVectorStore(), CV.LAYOUT_PGVECTOR),
+        ]:
+            cvs = [
+                CV.objects.create(
+                    name=f"{label} {i}", storage_layout=layout,
+                    qdrant_collection_name=generate_collection_name() if layout == CV.LAYOUT_PER_CV else '')
+                for i in range(args.cvs)
+            ]
+            backends.append((label, store, cvs))
+
+        # Same vectors and queries for both backends
+        vectors = [normalized(rng, args.chunks) for _ in range(args.cvs)]
+        query_plan = [(int(rng.integers(args.cvs)), normalized(rng, 1)[0]) for _ in range(args.queries)]
+
+        for label, store, cvs in backends:
+            vectors_by_cv = {cv.id: vectors[i] for i, cv in enumerate(cvs)}
+            with Timer() as ingest:
+                load(store, cvs, vectors_by_cv)
+            recall, latencies = evaluate(store, cvs, vectors_by_cv,
+                                         [(cvs[i], query) for i, query in query_plan], args.k)
+            print(f"{label:9s} ingest {ingest.elapsed:6.2f}s  recall@{args.k} {recall:.3f}  "
+                  f"p50 {percentile(latencies, 50):7.2f}ms  p95 {percentile(latencies, 95):7.2f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cvs', type=int, default=100)
+    parser.add_argument('--chunks', type=int, default=40, help='chunks per CV')
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    run(parser.parse_args())
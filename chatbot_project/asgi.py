@@ -2,6 +2,8 @@
 ASGI config for chatbot_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn chatbot_project.asgi:application``)
+so the streaming chat endpoint does not hold a worker thread per stream.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chatbot_project.settings')
 
-application = get_asgi_application()
+from cv_chatbot_app.services.startup import prepare_application, startup_phase
+
+with startup_phase('django_setup'):
+    application = get_asgi_application()
+
+# gunicorn imports the views and loads the embedding model from its hooks
+# (gunicorn.conf.py); other servers can do it here rather than during the
+# first request
+if os.getenv('PREPARE_ON_IMPORT', 'false').lower() == 'true':
+    prepare_application()
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'cv_chatbot_app.middleware.TracingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -127,6 +128,10 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# Uploads larger than this are spooled to a temporary file on disk instead of
+# being held in memory; the CV pipeline then reads them through mmap
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.environ.get('CV_UPLOAD_SPOOL_THRESHOLD', str(1024 * 1024)))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -16,8 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from cv_chatbot_app import views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('cv_chatbot_app.urls')),
+    # Prometheus scrape target
+    path('metrics', views.metrics, name='metrics'),
 ]
@@ -13,4 +13,13 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chatbot_project.settings')
 
-application = get_wsgi_application()
+from cv_chatbot_app.services.startup import prepare_application, startup_phase
+
+with startup_phase('django_setup'):
+    application = get_wsgi_application()
+
+# gunicorn imports the views and loads the embedding model from its hooks
+# (gunicorn.conf.py); other servers can do it here rather than during the
+# first request
+if os.getenv('PREPARE_ON_IMPORT', 'false').lower() == 'true':
+    prepare_application()
@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import CV, CVChunk, Conversation
+from .models import CV, CVChunk, Conversation, IngestionJob
 # Register your models here.
 
 admin.site.register(CV)
 admin.site.register(CVChunk)
 admin.site.register(Conversation)
+admin.site.register(IngestionJob)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from ...models import CV, CVChunk
+from ...services.lexical_index import count_terms, index_chunks, remove_cv_from_index
+
+
+class Command(BaseCommand):
+    help = "Builds the lexical (BM25) index for CVs uploaded before it existed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Rebuild every CV, not only those without indexed chunks')
+
+    def handle(self, *args, **options):
+        cvs = CV.objects.order_by('id')
+        if not options['all']:
+            # Chunks of indexed CVs have a non-zero token_count
+            cvs = cvs.exclude(chunks__token_count__gt=0)
+        indexed = 0
+
+        for cv in cvs.distinct().iterator():
+            with transaction.atomic():
+                remove_cv_from_index(cv)
+                chunks = list(CVChunk.objects.filter(cv=cv).only('id', 'cv_id', 'chunk_text'))
+                term_counts = count_terms(chunks)
+                CVChunk.objects.bulk_update(chunks, ['token_count'], batch_size=500)
+                index_chunks(chunks, term_counts)
+            indexed += 1
+            self.stdout.write(f"CV {cv.id}: indexed {len(chunks)} chunk(s)")
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} CV(s)"))
@@ -0,0 +1,53 @@
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from ...services.bulk_import import import_cvs, BULK_IMPORT_STALE_SECONDS
+from ...services.embedding import DEFAULT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports every PDF/DOCX file in a directory or zip/tar archive as a CV. "
+        "Re-running skips files already imported, so an interrupted import can "
+        "be resumed. For a fully offline run use local Qdrant mode "
+        "(QDRANT_PATH=/path/to/storage) and a cached embedding model (HF_HUB_OFFLINE=1)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Directory or .zip/.tar(.gz) archive of CV files')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes extracting and chunking documents')
+        parser.add_argument('--batch-chunks', type=int, default=512,
+                            help='Chunks embedded and written per batch')
+        parser.add_argument('--embed-batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Texts per encode call')
+        parser.add_argument('--stale-after', type=int, default=BULK_IMPORT_STALE_SECONDS,
+                            help='Age in seconds after which an unfinished CV not created by an import is redone')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['source']):
+            raise CommandError(f"{options['source']} does not exist")
+        try:
+            report = import_cvs(
+                options['source'],
+                workers=options['workers'],
+                batch_chunks=options['batch_chunks'],
+                embed_batch_size=options['embed_batch_size'],
+                stale_after=options['stale_after'],
+                log=self.stdout.write,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(
+            f"Imported {report['imported']} CV(s) ({report['chunks']} chunks) in {report['seconds']}s: "
+            f"{report['docs_per_second']} docs/s, {report['chunks_per_second']} chunks/s; "
+            f"{report['skipped']} skipped, {report['failed']} failed"
+        )
+        for stage, seconds in report['stage_seconds'].items():
+            self.stdout.write(f"  {stage}: {seconds}s")
+        self.stdout.write(self.style.SUCCESS("Import finished"))
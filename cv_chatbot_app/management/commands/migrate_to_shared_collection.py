@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from qdrant_client.http import models as qdrant_models
+from ...models import CV
+from ...services.qdrant_service import (
+    get_qdrant_client, collection_exists, ensure_shared_collection, delete_collection,
+)
+
+
+class Command(BaseCommand):
+    help = "Moves CVs stored in per-CV Qdrant collections into the shared collection"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=256,
+                            help='Points scrolled and upserted per request')
+        parser.add_argument('--keep-old', action='store_true',
+                            help='Keep the per-CV collections after copying')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be migrated')
+
+    def handle(self, *args, **options):
+        cvs = CV.objects.filter(storage_layout=CV.LAYOUT_PER_CV).order_by('id')
+        self.stdout.write(f"{cvs.count()} CV(s) in per-CV collections")
+        if options['dry_run']:
+            return
+
+        client = get_qdrant_client()
+        shared_collection = ensure_shared_collection()
+        migrated = 0
+
+        for cv in cvs.iterator():
+            old_collection = cv.qdrant_collection_name
+            if not collection_exists(old_collection):
+                self.stderr.write(f"CV {cv.id}: collection {old_collection} not found, skipping")
+                continue
+
+            copied = self._copy_points(client, old_collection, shared_collection, cv.id,
+                                       options['batch_size'])
+
+            cv.qdrant_collection_name = shared_collection
+            cv.storage_layout = CV.LAYOUT_SHARED
+            cv.save(update_fields=['qdrant_collection_name', 'storage_layout'])
+
+            if not options['keep_old']:
+                delete_collection(old_collection)
+
+            migrated += 1
+            self.stdout.write(f"CV {cv.id}: moved {copied} point(s) from {old_collection}")
+
+        self.stdout.write(self.style.SUCCESS(f"Migrated {migrated} CV(s) into {shared_collection}"))
+
+    def _copy_points(self, client, source, target, cv_id, batch_size):
+        """Copies every point of source into target, tagging it with cv_id"""
+        copied = 0
+        offset = None
+        while True:
+            records, offset = client.scroll(
+                collection_name=source,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            if records:
+                client.upsert(
+                    collection_name=target,
+                    points=[
+                        qdrant_models.PointStruct(
+                            id=record.id,
+                            vector=record.vector,
+                            payload={**(record.payload or {}), "cv_id": cv_id},
+                        )
+                        for record in records
+                    ],
+                )
+                copied += len(records)
+            if offset is None:
+                return copied
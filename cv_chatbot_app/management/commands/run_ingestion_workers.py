@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from ...services.ingestion_queue import run_worker_pool
+
+
+class Command(BaseCommand):
+    help = "Processes queued CV uploads from the ingestion job table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2,
+                            help='Worker threads polling the job table')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is drained')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Starting {options['workers']} ingestion worker(s)")
+        run_worker_pool(
+            workers=options['workers'],
+            poll_interval=options['poll_interval'],
+            once=options['once'],
+        )
@@ -0,0 +1,47 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from .services.tracing import start_trace, finish_trace
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.url_name or match.view_name or 'unnamed'
+
+
+class TracingMiddleware:
+    """
+    Traces every request: the spans recorded by the services while it runs
+    feed the stage histograms, its duration feeds the per-view metrics, and
+    slow requests are logged with their stage breakdown. Streaming responses
+    are timed until the response is returned, not until the stream ends.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trace, token, profiler = start_trace(request.method, request.path)
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            finish_trace(trace, token, profiler, _view_name(request), status)
+
+    async def __acall__(self, request):
+        trace, token, profiler = start_trace(request.method, request.path)
+        status = 500
+        try:
+            response = await self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            finish_trace(trace, token, profiler, _view_name(request), status)
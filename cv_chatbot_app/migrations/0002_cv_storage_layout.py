@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv_chatbot_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cv',
+            name='qdrant_collection_name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='cv',
+            name='storage_layout',
+            field=models.CharField(choices=[('per_cv', 'One collection per CV'), ('shared', 'Shared collection filtered by cv_id')], default='per_cv', max_length=16),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv_chatbot_app', '0002_cv_storage_layout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cv',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='cv',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=100),
+        ),
+        migrations.CreateModel(
+            name='IngestionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_path', models.CharField(max_length=1024)),
+                ('original_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=16)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3)),
+                ('last_error', models.TextField(blank=True)),
+                ('stage_timings', models.JSONField(blank=True, default=dict)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('cv', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingestion_jobs', to='cv_chatbot_app.cv')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='ingestionjob_status_idx')],
+            },
+        ),
+    ]
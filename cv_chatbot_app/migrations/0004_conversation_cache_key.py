@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv_chatbot_app', '0003_ingestion_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='cache_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:00
+
+import pgvector.django
+from django.db import migrations, models
+from pgvector.django import VectorExtension
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv_chatbot_app', '0004_conversation_cache_key'),
+    ]
+
+    operations = [
+        VectorExtension(),
+        migrations.AlterField(
+            model_name='cv',
+            name='storage_layout',
+            field=models.CharField(choices=[('per_cv', 'One collection per CV'), ('shared', 'Shared collection filtered by cv_id'), ('pgvector', 'pgvector embeddings on CVChunk')], default='per_cv', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='cvchunk',
+            name='embedding',
+            field=pgvector.django.VectorField(blank=True, dimensions=384, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='cvchunk',
+            index=pgvector.django.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='cvchunk_embedding_hnsw', opclasses=['vector_cosine_ops']),
+        ),
+    ]
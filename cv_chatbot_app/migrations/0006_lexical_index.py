@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv_chatbot_app', '0005_cvchunk_embedding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LexicalTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, unique=True)),
+                ('doc_freq', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cvchunk',
+            name='token_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='LexicalPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term_freq', models.PositiveSmallIntegerField()),
+                ('chunk', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='cv_chatbot_app.cvchunk')),
+                ('cv', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cv_chatbot_app.cv')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='cv_chatbot_app.lexicalterm')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'cv'], name='lexicalposting_term_cv_idx')],
+            },
+        ),
+    ]
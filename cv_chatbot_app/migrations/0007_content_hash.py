@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv_chatbot_app', '0006_lexical_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cv',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='cvchunk',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
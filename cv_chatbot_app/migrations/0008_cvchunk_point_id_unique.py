@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv_chatbot_app', '0007_content_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cvchunk',
+            name='qdrant_point_id',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
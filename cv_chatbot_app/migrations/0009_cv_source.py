@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv_chatbot_app', '0008_cvchunk_point_id_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cv',
+            name='source',
+            field=models.CharField(default='upload', max_length=16),
+        ),
+    ]
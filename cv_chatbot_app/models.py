@@ -1,12 +1,51 @@
 from django.db import models
-from pgvector.django import VectorField
+from django.utils import timezone
+from pgvector.django import VectorField, HnswIndex
 
 class CV(models.Model):
+    LAYOUT_PER_CV = 'per_cv'
+    LAYOUT_SHARED = 'shared'
+    LAYOUT_PGVECTOR = 'pgvector'
+    STORAGE_LAYOUT_CHOICES = [
+        (LAYOUT_PER_CV, 'One collection per CV'),
+        (LAYOUT_SHARED, 'Shared collection filtered by cv_id'),
+        (LAYOUT_PGVECTOR, 'pgvector embeddings on CVChunk'),
+    ]
+
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=255) 
     uploaded_at = models.DateTimeField(auto_now_add=True)
     # Store the Qdrant collection name/ID associated with this CV
-    qdrant_collection_name = models.CharField(max_length=255, unique=True)
+    # (the shared collection name when storage_layout is 'shared')
+    qdrant_collection_name = models.CharField(max_length=255, db_index=True)
+    storage_layout = models.CharField(max_length=16, choices=STORAGE_LAYOUT_CHOICES, default=LAYOUT_PER_CV)
+
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_READY, 'Ready'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    # Ingestion state, updated by the background queue for queued uploads
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_READY)
+    progress = models.PositiveSmallIntegerField(default=100)  # percent
+    # SHA-256 of the last ingested file; re-uploading identical bytes is a no-op
+    content_hash = models.CharField(max_length=64, blank=True)
+
+    SOURCE_UPLOAD = 'upload'
+    SOURCE_BULK_IMPORT = 'bulk_import'
+    # How the CV was created: a re-run bulk import redoes the unfinished CVs
+    # of earlier imports, but leaves recent uploads alone
+    source = models.CharField(max_length=16, default=SOURCE_UPLOAD)
+
+    @property
+    def uses_shared_collection(self):
+        return self.storage_layout == self.LAYOUT_SHARED
 
     def __str__(self):
         return f"CV {self.id} - {self.name}"
@@ -15,18 +54,98 @@ class CVChunk(models.Model):
     cv = models.ForeignKey(CV, on_delete=models.CASCADE, related_name='chunks')
     chunk_index = models.IntegerField()
     chunk_text = models.TextField()
-    # Store the Qdrant point ID for this chunk
-    qdrant_point_id = models.CharField(max_length=255)
-    
+    # Store the Qdrant point ID for this chunk; unique so search results can
+    # be matched to their rows with in_bulk
+    qdrant_point_id = models.CharField(max_length=255, unique=True)
+    # Chunk embedding, only set for CVs stored with the pgvector backend
+    embedding = VectorField(dimensions=384, null=True, blank=True)
+    # SHA-256 of chunk_text, used to reuse embeddings when a CV is updated
+    content_hash = models.CharField(max_length=64, blank=True)
+    # Number of indexed terms in chunk_text (BM25 document length)
+    token_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            HnswIndex(
+                name='cvchunk_embedding_hnsw',
+                fields=['embedding'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_cosine_ops'],
+            ),
+        ]
 
     def __str__(self):
         return f"Chunk {self.chunk_index} of CV {self.cv.name}"
 
+class LexicalTerm(models.Model):
+    """A term of the lexical (BM25) index with the number of chunks containing it"""
+    term = models.CharField(max_length=64, unique=True)
+    doc_freq = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.term} ({self.doc_freq})"
+
+class LexicalPosting(models.Model):
+    """One entry of the inverted index: a term occurring term_freq times in a chunk"""
+    term = models.ForeignKey(LexicalTerm, on_delete=models.CASCADE, related_name='postings')
+    chunk = models.ForeignKey(CVChunk, on_delete=models.CASCADE, related_name='postings')
+    # Copy of chunk.cv_id so per-CV lookups use the (term, cv) index alone
+    cv = models.ForeignKey(CV, on_delete=models.CASCADE, related_name='+', db_index=False)
+    term_freq = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'cv'], name='lexicalposting_term_cv_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.term_id} in chunk {self.chunk_id} x{self.term_freq}"
+
 class Conversation(models.Model):
     question = models.TextField()
     response = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
     related_cv = models.ForeignKey(CV, on_delete=models.SET_NULL, null=True)
+    # Answer cache key; empty for answers that must not be served from cache
+    cache_key = models.CharField(max_length=64, blank=True, db_index=True)
 
     def __str__(self):
         return f"Conversation at {self.timestamp}"
+
+
+class IngestionJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    cv = models.ForeignKey(CV, on_delete=models.CASCADE, related_name='ingestion_jobs')
+    # Spooled copy of the uploaded file, readable by the worker processes
+    file_path = models.CharField(max_length=1024)
+    original_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    last_error = models.TextField(blank=True)
+    # Seconds spent in each stage of the last attempt, e.g. {"extract": 0.42}
+    stage_timings = models.JSONField(default=dict, blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='ingestionjob_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Ingestion job {self.id} for CV {self.cv_id} ({self.status})"
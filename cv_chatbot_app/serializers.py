@@ -1,10 +1,10 @@
 from rest_framework import serializers
-from .models import CV, CVChunk, Conversation
+from .models import CV, CVChunk, Conversation, IngestionJob
 
 class CVSerializer(serializers.ModelSerializer):
     class Meta:
         model = CV
-        fields = ['id', 'name', 'uploaded_at', 'qdrant_collection_name']
+        fields = ['id', 'name', 'uploaded_at', 'qdrant_collection_name', 'storage_layout', 'status', 'progress']
 
 class CVChunkSerializer(serializers.ModelSerializer):
     class Meta:
@@ -14,4 +14,13 @@ class CVChunkSerializer(serializers.ModelSerializer):
 class ConversationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Conversation
-        fields = ['id', 'question', 'response', 'timestamp', 'related_cv']
\ No newline at end of file
+        fields = ['id', 'question', 'response', 'timestamp', 'related_cv']
+
+class IngestionJobSerializer(serializers.ModelSerializer):
+    cv_status = serializers.CharField(source='cv.status', read_only=True)
+    cv_progress = serializers.IntegerField(source='cv.progress', read_only=True)
+
+    class Meta:
+        model = IngestionJob
+        fields = ['id', 'cv', 'cv_status', 'cv_progress', 'status', 'attempts', 'max_attempts',
+                  'last_error', 'stage_timings', 'created_at', 'started_at', 'finished_at']
\ No newline at end of file
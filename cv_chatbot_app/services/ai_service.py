@@ -1,20 +1,109 @@
 import os
-import groq
+import threading
 from dotenv import load_dotenv
+from .async_clients import LoopBoundClient
+from .llm_gateway import LLMGateway, LLM_TIMEOUT
+from .llm_router import LLMProvider, LLMRouter, provider_from_env, provider_setting
+from .tracing import traced
 
 # Load environment variables
 load_dotenv()
 
 # Initialize Groq client
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+GROQ_MODEL = os.getenv('GROQ_MODEL', 'llama3-8b-8192')
+# Overrides the API URL, e.g. to point at the local fake LLM server
+GROQ_BASE_URL = os.getenv('GROQ_BASE_URL')
+# 'groq' talks to the Groq API, 'fake' uses the local FakeGroqClient
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'groq')
+# Providers the router may use, in priority order: 'groq', 'local' (CPU
+# model, see local_llm) or any name configured as an OpenAI-compatible
+# endpoint with LLM_<NAME>_BASE_URL and LLM_<NAME>_MODEL. Only Groq by
+# default; add 'local' (e.g. 'groq,local') to fall back to the CPU model
+LLM_PROVIDERS = [name.strip() for name in os.getenv('LLM_PROVIDERS', 'groq').split(',') if name.strip()]
+
+# Bump whenever the prompts below change so cached answers are not reused
+PROMPT_VERSION = '2'
+
+# Overrides the clients returned by get_groq_client/get_async_groq_client (see set_llm_client)
+_client_override = None
+_async_client_override = None
+
+# Process-wide client, rebuilt after fork
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def _build_async_client():
+    if LLM_BACKEND == 'fake':
+        from .fake_llm import FakeAsyncGroqClient
+        return FakeAsyncGroqClient()
+    import groq
+    return groq.AsyncClient(**_client_options())
+
+# Async client, bound to the event loop that created it
+_async_client = LoopBoundClient(_build_async_client)
+
+_router = None
+_router_lock = threading.Lock()
+
+def _client_options():
+    # Retries and timeouts are handled by the LLM gateway
+    return {"api_key": GROQ_API_KEY, "base_url": GROQ_BASE_URL, "timeout": LLM_TIMEOUT, "max_retries": 0}
 
 def get_groq_client():
-    """Returns a configured Groq client"""
-    return groq.Client(api_key=GROQ_API_KEY)
+    """Returns the process-wide Groq client (or the fake/override client)"""
+    global _client, _client_pid
+    if _client_override is not None:
+        return _client_override
+    if LLM_BACKEND == 'fake':
+        from .fake_llm import FakeGroqClient
+        return FakeGroqClient()
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            import groq
+            _client = groq.Client(**_client_options())
+            _client_pid = os.getpid()
+        return _client
 
-def generate_response(context, question):
-    client = get_groq_client()
-    
+def get_async_groq_client():
+    """Returns the async Groq client for the running event loop"""
+    if _async_client_override is not None:
+        return _async_client_override
+    return _async_client.get()[0]
+
+def _build_provider(name):
+    if name == 'groq':
+        gateway = LLMGateway(get_groq_client, get_async_groq_client, name='groq')
+        return LLMProvider('groq', GROQ_MODEL, gateway, cost=float(provider_setting('groq', 'COST', '1')))
+    return provider_from_env(name)
+
+def get_router():
+    """Returns the LLM router, building the providers on first use"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = LLMRouter([_build_provider(name) for name in LLM_PROVIDERS])
+        return _router
+
+def get_llm_stats():
+    """Returns routing decisions, per-provider latency and gateway counters"""
+    return get_router().get_stats()
+
+def get_model_id():
+    """Identifies the models behind cacheable answers, for the answer cache key"""
+    return get_router().model_id
+
+def set_llm_client(client, async_client=None):
+    """
+    Replaces the LLM clients, e.g. with FakeGroqClient/FakeAsyncGroqClient in
+    tests; None restores Groq.
+    """
+    global _client_override, _async_client_override
+    _client_override = client
+    _async_client_override = async_client
+
+def build_messages(context, question):
     system_prompt = (
         "You are an intelligent AI assistant that reviews a candidate's CV and answers questions about their experience. "
         "Use only the provided CV text. Generate a natural, concise answer based on what's present. "
@@ -25,16 +114,33 @@ def generate_response(context, question):
     )
 
     user_prompt = f"CV:\n{context}\n\nQ: {question}\nA:"
-    
-    try:
-        completion = client.chat.completions.create(
-            model="llama3-8b-8192",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-        )
-        return completion.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"Error generating response: {str(e)}")
-        return "Error"
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+@traced('generate_response')
+def generate_answer(context, question):
+    """Returns the LLMAnswer of the routed provider; raises LLMError on failure"""
+    return get_router().complete(build_messages(context, question))
+
+@traced('generate_response')
+async def agenerate_answer(context, question):
+    """Async variant of generate_answer"""
+    return await get_router().acomplete(build_messages(context, question))
+
+def generate_response(context, question):
+    """Returns the answer to a question about the CV text; raises LLMError on failure"""
+    return generate_answer(context, question).text
+
+async def agenerate_response(context, question):
+    """Async variant of generate_response"""
+    return (await agenerate_answer(context, question)).text
+
+def stream_response(context, question):
+    """
+    Returns an iterator of answer deltas; its provider and cacheable
+    attributes are set once the routed provider starts answering.
+    """
+    return get_router().stream(build_messages(context, question))
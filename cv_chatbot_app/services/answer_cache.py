@@ -0,0 +1,75 @@
+import os
+import hashlib
+from datetime import timedelta
+from django.utils import timezone
+from dotenv import load_dotenv
+from ..models import Conversation
+from .ai_service import PROMPT_VERSION, get_model_id
+from .embedding import normalize_query
+from .tracing import traced
+
+# Load environment variables
+load_dotenv()
+
+ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', '86400'))  # seconds
+
+def answer_cache_key(cv_id, question, search_results):
+    """
+    Builds the cache key of an answer from the CV, the normalized question,
+    the retrieved chunks, the prompt version and the models answering.
+    """
+    fingerprint = ','.join(str(result.id) for result in search_results)
+    raw = '\x00'.join([
+        str(cv_id), normalize_query(question), fingerprint, PROMPT_VERSION, get_model_id()
+    ])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+@traced('answer_cache')
+def get_cached_answer(cache_key):
+    """Returns a stored answer for the key if one was generated within the TTL"""
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    cutoff = timezone.now() - timedelta(seconds=ANSWER_CACHE_TTL)
+    return (
+        Conversation.objects
+        .filter(cache_key=cache_key, timestamp__gte=cutoff)
+        .order_by('-timestamp')
+        .values_list('response', flat=True)
+        .first()
+    )
+
+@traced('answer_cache')
+def get_cached_answers(cache_keys):
+    """Batch variant of get_cached_answer: returns {cache_key: answer} for the keys found"""
+    if not ANSWER_CACHE_ENABLED or not cache_keys:
+        return {}
+    cutoff = timezone.now() - timedelta(seconds=ANSWER_CACHE_TTL)
+    answers = {}
+    # Oldest first, so the newest answer of each key wins
+    for cache_key, response in (
+        Conversation.objects
+        .filter(cache_key__in=list(cache_keys), timestamp__gte=cutoff)
+        .order_by('timestamp')
+        .values_list('cache_key', 'response')
+    ):
+        answers[cache_key] = response
+    return answers
+
+@traced('answer_cache')
+async def aget_cached_answer(cache_key):
+    """Async variant of get_cached_answer using the async ORM"""
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    cutoff = timezone.now() - timedelta(seconds=ANSWER_CACHE_TTL)
+    return await (
+        Conversation.objects
+        .filter(cache_key=cache_key, timestamp__gte=cutoff)
+        .order_by('-timestamp')
+        .values_list('response', flat=True)
+        .afirst()
+    )
+
+def invalidate_cv_answers(cv):
+    """Stops serving cached answers for a CV (on delete or re-ingestion)"""
+    return Conversation.objects.filter(related_cv=cv).exclude(cache_key='').update(cache_key='')
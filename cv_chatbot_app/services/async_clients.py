@@ -0,0 +1,81 @@
+import asyncio
+import os
+import threading
+import weakref
+
+# Every LoopBoundClient of this process, forgotten in forked children
+_instances = weakref.WeakSet()
+
+async def _close_at_loop_shutdown(client):
+    # Started as an async generator of the loop, so asyncio.run() (and the
+    # servers built on it) closes it, and with it the client, in
+    # shutdown_asyncgens() before the loop itself is closed
+    try:
+        yield
+    finally:
+        await client.close()
+
+class LoopBoundClient:
+    """
+    Holds the async client of the running event loop. Async clients keep
+    connections bound to the loop that opened them, so another loop gets its
+    own client; the previous one is closed, either when its loop shuts down
+    or, if that loop outlives it, on that loop as soon as it is replaced.
+    """
+    def __init__(self, factory):
+        self.factory = factory
+        self._client = None
+        self._loop = None
+        self._guard = None
+        self._lock = threading.Lock()
+        _instances.add(self)
+
+    def get(self):
+        """Returns (client, created) for the running loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._client is not None and self._loop is loop:
+                return self._client, False
+            previous, previous_loop, previous_guard = self._client, self._loop, self._guard
+            self._client, self._loop = self.factory(), loop
+            # Kept here: the loop only holds its async generators weakly
+            self._guard = _close_at_loop_shutdown(self._client)
+            client = self._client
+        # Runs the guard up to its yield, registering it with the loop
+        asyncio.ensure_future(self._guard.__anext__())
+        if previous is not None:
+            _close_on_loop(previous, previous_loop, previous_guard)
+        return client, True
+
+    def reset(self):
+        """Forgets the client; the loop that owns it still closes it at shutdown"""
+        with self._lock:
+            self._client = None
+            self._loop = None
+            self._guard = None
+
+    def _after_fork(self):
+        # The parent's client, loop and lock are not this process's to use or close
+        self._lock = threading.Lock()
+        self._client = None
+        self._loop = None
+        self._guard = None
+
+def _reset_after_fork():
+    for client in list(_instances):
+        client._after_fork()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def _close_on_loop(client, loop, guard):
+    if loop.is_closed():
+        # Already closed by the guard when the loop shut down
+        return
+    if loop.is_running():
+        # Owned by a loop still running in another thread
+        asyncio.run_coroutine_threadsafe(guard.aclose(), loop)
+    else:
+        # A stopped loop can still run the close, but not from this thread,
+        # which is running another loop
+        threading.Thread(target=loop.run_until_complete, args=(guard.aclose(),), daemon=True).start()
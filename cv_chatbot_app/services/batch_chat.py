@@ -0,0 +1,82 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from dotenv import load_dotenv
+from ..models import Conversation
+from .ai_service import generate_answer
+from .llm_gateway import LLMError
+from .answer_cache import answer_cache_key, get_cached_answers
+from .context_builder import build_context, CONTEXT_CANDIDATES
+from .cv_search import search_cv_batch
+from .tracing import span
+
+# Load environment variables
+load_dotenv()
+
+# Questions accepted by one batch request
+BATCH_CHAT_MAX_QUESTIONS = int(os.getenv('BATCH_CHAT_MAX_QUESTIONS', '20'))
+# LLM calls in flight at once for one batch request
+BATCH_CHAT_CONCURRENCY = int(os.getenv('BATCH_CHAT_CONCURRENCY', '4'))
+
+def answer_questions(cv, questions, mode=None, concurrency=BATCH_CHAT_CONCURRENCY):
+    """
+    Answers several questions about one CV.
+
+    The questions are embedded in one batched encode call and retrieved with
+    one batched search. Cached answers are looked up in one query, the other
+    questions are sent to the LLM with at most `concurrency` calls in
+    flight, and every Conversation is saved with one bulk_create. Returns
+    one result dict per question, in order.
+    """
+    if not questions:
+        return []
+
+    contexts = [
+        build_context(results)
+        for results in search_cv_batch(cv, questions, limit=CONTEXT_CANDIDATES, mode=mode)
+    ]
+    cache_keys = [
+        answer_cache_key(cv.id, question, context.results)
+        for question, context in zip(questions, contexts)
+    ]
+    cached = get_cached_answers(set(cache_keys))
+
+    def generate(i):
+        try:
+            return generate_answer(contexts[i].text, questions[i])
+        except LLMError as e:
+            return e
+
+    pending = [i for i, cache_key in enumerate(cache_keys) if cache_key not in cached]
+    responses = {}
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(pending)))) as pool:
+            # Each call runs in a copy of this context, so its spans join the request trace
+            futures = [pool.submit(copy_context().run, generate, i) for i in pending]
+            responses = {i: future.result() for i, future in zip(pending, futures)}
+
+    results = []
+    conversations = []
+    for i, (question, context, cache_key) in enumerate(zip(questions, contexts, cache_keys)):
+        if isinstance(responses.get(i), LLMError):
+            # Failed questions are reported but not saved
+            results.append({"question": question, "error": str(responses[i]), "cached": False})
+            continue
+        if i in responses:
+            answer = responses[i]
+            response_text = answer.text
+            result = {"question": question, "response": response_text, "cached": False,
+                      "provider": answer.provider, **context.stats(question)}
+            saved_key = cache_key if answer.cacheable else ""
+        else:
+            response_text = cached[cache_key]
+            result = {"question": question, "response": response_text, "cached": True}
+            saved_key = ""
+        results.append(result)
+        conversations.append(Conversation(
+            question=question, response=response_text, related_cv=cv, cache_key=saved_key
+        ))
+
+    with span('db_write'):
+        Conversation.objects.bulk_create(conversations)
+    return results
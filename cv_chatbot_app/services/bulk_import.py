@@ -0,0 +1,249 @@
+import os
+import tarfile
+import tempfile
+import time
+import uuid
+import zipfile
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+from django.utils import timezone
+from dotenv import load_dotenv
+from ..models import CV, CVChunk
+from . import cv_upload
+from .cv_upload import (
+    SUPPORTED_EXTENSIONS, MappedFile, chunk_hash, create_chunks, extract_text_from_file,
+    file_content_hash, numbered_chunks, _discard_cv,
+)
+from .embedding import generate_embeddings, DEFAULT_BATCH_SIZE
+from .lexical_index import count_terms, index_chunks
+from .vector_store import get_vector_store
+
+# Load environment variables
+load_dotenv()
+
+# Unfinished CVs not created by a bulk import (e.g. an upload being ingested
+# right now) are only redone once they are this many seconds old
+BULK_IMPORT_STALE_SECONDS = int(os.getenv('BULK_IMPORT_STALE_SECONDS', '3600'))
+# Documents extracted ahead of the embedding, per worker process; bounds the
+# chunks waiting in memory when extraction outpaces embedding
+BULK_IMPORT_PREFETCH = int(os.getenv('BULK_IMPORT_PREFETCH', '2'))
+
+def _is_cv_file(path):
+    return os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS
+
+def collect_files(source, extract_dir):
+    """
+    Returns the CV files under a directory, or inside a .zip/.tar(.gz) archive
+    after extracting them into extract_dir. Sorted, so runs are repeatable.
+    """
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(source)
+            for name in names if _is_cv_file(name)
+        )
+
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            members = [name for name in archive.namelist() if _is_cv_file(name)]
+            for name in members:
+                archive.extract(name, extract_dir)
+        return sorted(os.path.join(extract_dir, name) for name in members)
+
+    if tarfile.is_tarfile(source):
+        with tarfile.open(source) as archive:
+            members = [member for member in archive.getmembers() if member.isfile() and _is_cv_file(member.name)]
+            if hasattr(tarfile, 'data_filter'):
+                archive.extractall(extract_dir, members=members, filter='data')
+            else:
+                archive.extractall(extract_dir, members=members)
+        return sorted(os.path.join(extract_dir, member.name) for member in members)
+
+    raise ValueError(f"{source} is neither a directory nor a zip/tar archive")
+
+def _init_extract_worker():
+    # The import already runs one document per process
+    cv_upload.PDF_EXTRACT_WORKERS = 1
+
+def _extract_chunks(path):
+    """Runs in a worker process: returns (path, chunks, seconds, error)"""
+    started = time.perf_counter()
+    try:
+        with MappedFile(path) as file_obj:
+            chunks = create_chunks(extract_text_from_file(file_obj))
+        return path, chunks, time.perf_counter() - started, None
+    except Exception as e:
+        return path, None, time.perf_counter() - started, str(e)
+
+class BulkImporter:
+    """
+    Imports many CV files: extraction and chunking run in a process pool, and
+    the chunks of several documents are embedded in one batched call and
+    written with one bulk_create and one upsert per collection.
+
+    Every CV records the hash of its file, so re-running the import skips
+    files already imported and redoes documents left half-written by a crash.
+    """
+    def __init__(self, workers=None, batch_chunks=512, embed_batch_size=DEFAULT_BATCH_SIZE,
+                 stale_after=BULK_IMPORT_STALE_SECONDS, log=print):
+        self.workers = workers or os.cpu_count() or 1
+        self.stale_after = stale_after
+        self.batch_chunks = batch_chunks
+        self.embed_batch_size = embed_batch_size
+        self.log = log
+        self.timings = defaultdict(float)
+        self.counts = defaultdict(int)
+        self._pending = []
+
+    def _select(self, paths):
+        """Hashes the files and drops those already imported"""
+        started = time.perf_counter()
+        hashes = {}
+        for path in paths:
+            with open(path, 'rb') as file_obj:
+                hashes[path] = file_content_hash(file_obj)
+        self.timings['hash'] += time.perf_counter() - started
+
+        existing = CV.objects.filter(content_hash__in=set(hashes.values()))
+        incomplete = existing.exclude(status=CV.STATUS_READY).filter(ingestion_jobs__isnull=True)
+        for cv in incomplete:
+            if self._is_abandoned(cv):
+                # Left behind by an interrupted import: redo it
+                self.log(f"Discarding incomplete CV {cv.id} ({cv.name})")
+                _discard_cv(cv)
+        done = set(existing.values_list('content_hash', flat=True))
+
+        selected = []
+        seen = set()
+        for path, digest in hashes.items():
+            if digest in done or digest in seen:
+                self.counts['skipped'] += 1
+                continue
+            seen.add(digest)
+            selected.append((path, digest))
+        return selected
+
+    def _is_abandoned(self, cv):
+        """
+        Whether an unfinished CV without ingestion jobs can be discarded: those
+        of bulk imports are only finished by the run that created them, any
+        other is left alone until it is stale_after seconds old.
+        """
+        if cv.source == CV.SOURCE_BULK_IMPORT:
+            return True
+        return cv.uploaded_at < timezone.now() - timedelta(seconds=self.stale_after)
+
+    def _extracted(self, paths):
+        """
+        Yields _extract_chunks results as the pool finishes them, with at most
+        BULK_IMPORT_PREFETCH documents per worker submitted ahead
+        """
+        window = self.workers * BULK_IMPORT_PREFETCH
+        paths = iter(paths)
+        in_flight = set()
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_extract_worker) as pool:
+            while True:
+                for path in paths:
+                    in_flight.add(pool.submit(_extract_chunks, path))
+                    if len(in_flight) >= window:
+                        break
+                if not in_flight:
+                    return
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    def run(self, paths):
+        started = time.perf_counter()
+        selected = self._select(paths)
+        self.log(f"{len(selected)} file(s) to import, {self.counts['skipped']} already imported")
+        if selected:
+            hashes = dict(selected)
+            for path, chunks, seconds, error in self._extracted(list(hashes)):
+                self.timings['extract_chunk'] += seconds
+                if error:
+                    self.counts['failed'] += 1
+                    self.log(f"Failed to read {path}: {error}")
+                    continue
+                self._pending.append((path, hashes[path], chunks))
+                if sum(len(item[2]) for item in self._pending) >= self.batch_chunks:
+                    self._flush()
+            self._flush()
+        self.timings['total'] = time.perf_counter() - started
+        return self.report()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        store = get_vector_store()
+
+        started = time.perf_counter()
+        numbered = [list(numbered_chunks(chunks)) for _, _, chunks in pending]
+        texts = [chunk_text for cv_chunks in numbered for _, chunk_text in cv_chunks]
+        embeddings = iter(generate_embeddings(texts, batch_size=self.embed_batch_size))
+        self.timings['embed'] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        cvs = []
+        for path, digest, _ in pending:
+            collection_name, storage_layout = store.new_cv_storage()
+            cvs.append(CV(
+                name=os.path.splitext(os.path.basename(path))[0],
+                qdrant_collection_name=collection_name,
+                storage_layout=storage_layout,
+                status=CV.STATUS_PROCESSING,
+                progress=0,
+                content_hash=digest,
+                source=CV.SOURCE_BULK_IMPORT
+            ))
+        # Postgres returns the primary keys of bulk-created rows
+        CV.objects.bulk_create(cvs)
+
+        batches = []
+        records = []
+        for cv, cv_chunks in zip(cvs, numbered):
+            store.create_cv_storage(cv)
+            cv_records, cv_embeddings = [], []
+            for i, chunk_text in cv_chunks:
+                cv_records.append(CVChunk(
+                    cv=cv, chunk_index=i, chunk_text=chunk_text,
+                    qdrant_point_id=str(uuid.uuid4()), content_hash=chunk_hash(chunk_text)
+                ))
+                cv_embeddings.append(next(embeddings))
+            batches.append((cv, cv_records, cv_embeddings))
+            records.extend(cv_records)
+
+        store.add_chunks_many(batches)
+        term_counts = count_terms(records)
+        CVChunk.objects.bulk_create(records, batch_size=1000)
+        index_chunks(records, term_counts)
+        # Marked ready last: a crash before this leaves them to be redone
+        CV.objects.filter(id__in=[cv.id for cv in cvs]).update(status=CV.STATUS_READY, progress=100)
+        self.timings['store'] += time.perf_counter() - started
+
+        self.counts['imported'] += len(cvs)
+        self.counts['chunks'] += len(records)
+        self.log(f"Imported {self.counts['imported']} CV(s), {self.counts['chunks']} chunk(s)")
+
+    def report(self):
+        total = self.timings['total'] or 1e-9
+        return {
+            "imported": self.counts['imported'],
+            "skipped": self.counts['skipped'],
+            "failed": self.counts['failed'],
+            "chunks": self.counts['chunks'],
+            "seconds": round(total, 3),
+            "docs_per_second": round(self.counts['imported'] / total, 3),
+            "chunks_per_second": round(self.counts['chunks'] / total, 3),
+            "stage_seconds": {
+                stage: round(seconds, 3) for stage, seconds in self.timings.items() if stage != 'total'
+            },
+        }
+
+def import_cvs(source, **options):
+    """Imports every CV file in a directory or archive; returns the import report"""
+    with tempfile.TemporaryDirectory(prefix='cv_import_') as extract_dir:
+        paths = collect_files(source, extract_dir)
+        return BulkImporter(**options).run(paths)
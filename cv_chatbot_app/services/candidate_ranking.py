@@ -0,0 +1,193 @@
+import os
+import numpy as np
+from django.db import connection, transaction
+from dotenv import load_dotenv
+from pgvector.django import CosineDistance
+from ..models import CV, CVChunk
+from .cv_upload import create_chunks
+from .embedding import generate_embeddings, generate_query_embedding
+from .qdrant_service import get_qdrant_client, collection_exists, search_params, QDRANT_SHARED_COLLECTION
+from .vector_store import hydrate_payloads
+
+# Load environment variables
+load_dotenv()
+
+AGGREGATIONS = ('max', 'mean', 'top_n')
+# Upper bound on page * page_size, i.e. how deep results can be paged
+RANKING_MAX_CANDIDATES = int(os.getenv('RANKING_MAX_CANDIDATES', '500'))
+# Extra CVs fetched beyond the requested page, so that re-ranking by mean or
+# top_n (the ANN search orders CVs by their best chunk) rarely misses one
+RANKING_OVERFETCH = float(os.getenv('RANKING_OVERFETCH', '2'))
+# Chunks per CV returned by the shared collection search and shown as matches
+RANKING_TOP_N = int(os.getenv('RANKING_TOP_N', '3'))
+# pgvector searches stop widening past this many chunks (hnsw.ef_search limit)
+PGVECTOR_MAX_CHUNKS = 1000
+
+def embed_ranking_query(text):
+    """
+    Embeds a short query, or a job description longer than one chunk as the
+    normalized mean of its chunk embeddings, so either is a single vector.
+    """
+    chunks = create_chunks(text)
+    if len(chunks) <= 1:
+        return generate_query_embedding(text)
+    vector = generate_embeddings(chunks).mean(axis=0)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+def aggregate_scores(scores, aggregation='max', top_n=RANKING_TOP_N):
+    """
+    Combines the chunk scores of one CV (sorted best first):
+    max keeps the best chunk, mean averages the matched chunks and top_n
+    averages the best top_n chunks counting missing ones as 0, which favours
+    CVs matching the query in several places.
+    """
+    if not scores:
+        return 0.0
+    if aggregation == 'max':
+        return scores[0]
+    if aggregation == 'mean':
+        return sum(scores) / len(scores)
+    if aggregation == 'top_n':
+        return sum(scores[:top_n]) / top_n
+    raise ValueError(f"Unknown aggregation: {aggregation}. Use one of {', '.join(AGGREGATIONS)}")
+
+def _search_shared_collection(query_vector, cv_limit, top_n):
+    """
+    One grouped ANN search over every chunk of the shared collection.
+    Returns {cv_id: [(score, payload), ...]} with at most top_n hits per CV.
+    """
+    if not collection_exists(QDRANT_SHARED_COLLECTION):
+        return {}
+    result = get_qdrant_client().search_groups(
+        collection_name=QDRANT_SHARED_COLLECTION,
+        query_vector=query_vector,
+        group_by="cv_id",
+        limit=cv_limit,
+        group_size=top_n,
+        search_params=search_params(),
+        with_payload=["text", "chunk_index"],
+    )
+    # Text-free payloads (QDRANT_PAYLOAD_MODE=ids) are filled in with one query
+    hydrate_payloads([hit for group in result.groups for hit in group.hits])
+    return {
+        int(group.id): [(hit.score, hit.payload) for hit in group.hits if "text" in (hit.payload or {})]
+        for group in result.groups
+    }
+
+def _nearest_pgvector_chunks(query_vector, chunk_limit):
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # The HNSW scan returns at most ef_search rows (default 40)
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL hnsw.ef_search = %s", [min(max(chunk_limit, 40), PGVECTOR_MAX_CHUNKS)])
+        return list(
+            CVChunk.objects
+            .filter(embedding__isnull=False)
+            .annotate(distance=CosineDistance('embedding', query_vector))
+            .order_by('distance')
+            .values_list('cv_id', 'distance', 'chunk_text', 'chunk_index')[:chunk_limit]
+        )
+
+def _search_pgvector(query_vector, cv_limit, top_n):
+    """
+    HNSW search over the chunks of pgvector CVs. Starts with cv_limit * top_n
+    chunks and doubles the fetch while the chunks found cover fewer than
+    cv_limit CVs (a few CVs can hold every nearest chunk), up to
+    PGVECTOR_MAX_CHUNKS. Returns the same shape as _search_shared_collection.
+    """
+    if not CV.objects.filter(storage_layout=CV.LAYOUT_PGVECTOR).exists():
+        return {}
+    chunk_limit = min(cv_limit * top_n, PGVECTOR_MAX_CHUNKS)
+    while True:
+        chunks = _nearest_pgvector_chunks(query_vector, chunk_limit)
+        hits = {}
+        for cv_id, distance, text, chunk_index in chunks:
+            cv_hits = hits.setdefault(cv_id, [])
+            if len(cv_hits) < top_n:
+                cv_hits.append((1.0 - distance, {"text": text, "chunk_index": chunk_index}))
+        if len(hits) >= cv_limit or len(chunks) < chunk_limit or chunk_limit >= PGVECTOR_MAX_CHUNKS:
+            return hits
+        chunk_limit = min(chunk_limit * 2, PGVECTOR_MAX_CHUNKS)
+
+def count_unranked_cvs():
+    """
+    Counts the ready CVs still stored in per-CV collections. Ranking does not
+    search them (that would take one search per CV); they are ranked once
+    moved with migrate_to_shared_collection.
+    """
+    return CV.objects.filter(storage_layout=CV.LAYOUT_PER_CV, status=CV.STATUS_READY).count()
+
+def rank_cv_ids(query_vector, aggregation='max', top_n=RANKING_TOP_N, limit=20):
+    """
+    Ranks CVs against a query vector. Returns up to limit (cv_id, score, hits)
+    tuples, best first.
+
+    The shared Qdrant collection and pgvector are searched once each for the
+    CVs with the best chunks. CVs in per-CV collections are not ranked (see
+    count_unranked_cvs).
+    """
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation: {aggregation}. Use one of {', '.join(AGGREGATIONS)}")
+    if top_n < 1:
+        raise ValueError("top_n must be positive")
+    cv_limit = limit if aggregation == 'max' else int(limit * RANKING_OVERFETCH)
+
+    hits = _search_shared_collection(query_vector, cv_limit, top_n)
+    hits.update(_search_pgvector(query_vector, cv_limit, top_n))
+
+    ranked = [
+        (cv_id, aggregate_scores([score for score, _ in cv_hits], aggregation, top_n), cv_hits)
+        for cv_id, cv_hits in hits.items()
+    ]
+    ranked.sort(key=lambda item: (-item[1], item[0]))
+    return ranked[:limit]
+
+def rank_candidates(query, aggregation='max', top_n=RANKING_TOP_N, page=1, page_size=20):
+    """
+    Returns one page of ready CVs ranked against a query or job description.
+
+    The shared collection and pgvector searches select CVs by their best
+    chunk, so mean and top_n rankings only re-rank the CVs selected that way
+    (RANKING_OVERFETCH times the page end): a CV whose best chunk falls
+    outside them is missed, so those pages are flagged "approximate".
+    CVs still in per-CV collections are left out and counted in
+    "unranked_cvs", with "migration_required" set.
+    """
+    if page < 1 or page_size < 1:
+        raise ValueError("page and page_size must be positive")
+    if page * page_size > RANKING_MAX_CANDIDATES:
+        raise ValueError(f"Only the first {RANKING_MAX_CANDIDATES} candidates can be paged through")
+
+    query_vector = embed_ranking_query(query)
+    # One extra row tells whether another page exists
+    ranked = rank_cv_ids(query_vector, aggregation, top_n, limit=page * page_size + 1)
+    cvs = CV.objects.filter(status=CV.STATUS_READY).in_bulk([cv_id for cv_id, _, _ in ranked])
+    ranked = [item for item in ranked if item[0] in cvs]
+
+    start = (page - 1) * page_size
+    results = [
+        {
+            "cv_id": cv_id,
+            "name": cvs[cv_id].name,
+            "score": round(score, 6),
+            "matches": [
+                {"chunk_index": payload.get("chunk_index"), "text": payload.get("text"),
+                 "score": round(hit_score, 6)}
+                for hit_score, payload in cv_hits
+            ],
+        }
+        for cv_id, score, cv_hits in ranked[start:start + page_size]
+    ]
+    unranked = count_unranked_cvs()
+    return {
+        "aggregation": aggregation,
+        "approximate": aggregation != 'max',
+        "page": page,
+        "page_size": page_size,
+        "has_more": len(ranked) > start + page_size,
+        "results": results,
+        "unranked_cvs": unranked,
+        "migration_required": unranked > 0,
+        **({"warning": f"{unranked} CV(s) in per-CV collections were not ranked; "
+                       "run migrate_to_shared_collection"} if unranked else {}),
+    }
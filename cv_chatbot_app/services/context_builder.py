@@ -0,0 +1,111 @@
+import os
+import threading
+from dotenv import load_dotenv
+from .ai_service import build_messages
+from .embedding import get_embedding_model
+from .text import iter_sentences
+from .tracing import traced
+
+# Load environment variables
+load_dotenv()
+
+# Maximum tokens of CV text put in the prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '1024'))
+# Chunks retrieved per question before deduplication and packing
+CONTEXT_CANDIDATES = int(os.getenv('CONTEXT_CANDIDATES', '8'))
+# Hugging Face tokenizer used for counting; defaults to the embedding model's
+CONTEXT_TOKENIZER = os.getenv('CONTEXT_TOKENIZER')
+
+_tokenizer = None
+# Fast tokenizers must not be called from several threads at once
+_tokenizer_lock = threading.Lock()
+
+def get_tokenizer():
+    global _tokenizer
+    if _tokenizer is None:
+        if CONTEXT_TOKENIZER:
+            from transformers import AutoTokenizer
+            _tokenizer = AutoTokenizer.from_pretrained(CONTEXT_TOKENIZER)
+        else:
+            _tokenizer = get_embedding_model().tokenizer
+    return _tokenizer
+
+def count_tokens(text):
+    """Number of tokens in text, without special tokens"""
+    if not text:
+        return 0
+    tokenizer = get_tokenizer()
+    with _tokenizer_lock:
+        return len(tokenizer(text, add_special_tokens=False, verbose=False)["input_ids"])
+
+def count_prompt_tokens(context, question):
+    """Number of tokens of the chat messages sent for a question"""
+    return sum(count_tokens(message["content"]) for message in build_messages(context, question))
+
+class Context:
+    """CV text packed for the prompt, with the counts needed to measure it"""
+    def __init__(self, text, results, tokens, candidate_tokens, dropped_sentences):
+        self.text = text
+        # Search results (some possibly trimmed) that made it into text
+        self.results = results
+        self.tokens = tokens
+        # Tokens of all retrieved chunks joined as they were before packing
+        self.candidate_tokens = candidate_tokens
+        self.dropped_sentences = dropped_sentences
+
+    def stats(self, question):
+        return {
+            "prompt_tokens": count_prompt_tokens(self.text, question),
+            "context_tokens": self.tokens,
+            "candidate_tokens": self.candidate_tokens,
+            "context_chunks": len(self.results),
+        }
+
+@traced('build_context')
+def build_context(search_results, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Packs retrieved chunks into the prompt context.
+
+    Chunks are taken in relevance order. Sentences already taken from
+    another chunk (create_chunks overlaps adjacent chunks by a sentence) are
+    dropped, and sentences are added until token_budget is reached. The
+    chunks kept are then ordered by chunk_index so the CV reads in order.
+    """
+    seen = set()
+    selected = []
+    used = 0
+    dropped = 0
+    budget_reached = False
+
+    for result in search_results:
+        sentences = []
+        for sentence in iter_sentences([result.payload["text"]]):
+            sentence = sentence.strip()
+            key = ' '.join(sentence.lower().split())
+            if not sentence or key in seen:
+                dropped += bool(sentence)
+                continue
+            if budget_reached:
+                dropped += 1
+                continue
+            tokens = count_tokens(sentence)
+            if used + tokens > token_budget:
+                budget_reached = True
+                dropped += 1
+                continue
+            seen.add(key)
+            sentences.append(sentence)
+            used += tokens
+        if sentences:
+            selected.append((result.payload.get("chunk_index", 0), result, ' '.join(sentences)))
+
+    selected.sort(key=lambda item: item[0])
+    text = "\n\n".join(chunk_text for _, _, chunk_text in selected)
+    candidate_text = "\n\n".join(result.payload["text"] for result in search_results)
+    return Context(
+        text=text,
+        results=[result for _, result, _ in selected],
+        tokens=count_tokens(text),
+        candidate_tokens=count_tokens(candidate_text),
+        dropped_sentences=dropped,
+    )
@@ -1,20 +1,135 @@
-from .qdrant_service import search_points
-from .embedding import generate_embedding
+import os
+from asgiref.sync import sync_to_async
+from dotenv import load_dotenv
+from .vector_store import get_vector_store
+from .exact_search import exact_search, use_exact_search
+from .lexical_index import lexical_search
+from .embedding import generate_query_embedding, generate_query_embeddings, agenerate_query_embedding
+from .tracing import span, traced
 
-def search_cv(collection_name, query, limit=10):
-    """Searches for relevant chunks in a CV based on the query"""
+# Load environment variables
+load_dotenv()
+
+SEARCH_MODES = ('vector', 'lexical', 'hybrid')
+# Default retrieval: embeddings only, BM25 only, or both fused with RRF
+SEARCH_MODE = os.getenv('SEARCH_MODE', 'vector')
+# Reciprocal rank fusion constant: higher values flatten the rank weights
+RRF_K = int(os.getenv('RRF_K', '60'))
+# Candidates taken from each retriever per requested result in hybrid mode
+HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', '4'))
+
+def _check_mode(mode):
+    mode = mode or SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}. Use one of {', '.join(SEARCH_MODES)}")
+    return mode
+
+def reciprocal_rank_fusion(result_lists, limit, k=RRF_K):
+    """
+    Fuses ranked result lists: a chunk scores sum(1 / (k + rank)) over the
+    lists it appears in. Returns ScoredPoints carrying the fused score.
+    """
+    from qdrant_client.http import models as qdrant_models
+    scores = {}
+    points = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            key = str(result.id)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            points.setdefault(key, result)
+    ranked = sorted(scores, key=lambda key: -scores[key])[:limit]
+    return [
+        qdrant_models.ScoredPoint(id=points[key].id, version=0, score=scores[key],
+                                  payload=points[key].payload)
+        for key in ranked
+    ]
+
+@traced('search_points')
+def _vector_search(cv, query_embedding, limit):
+    if use_exact_search():
+        return exact_search(cv, query_embedding, limit=limit)
+    # Search in the CV's vector store
+    return get_vector_store(cv).search(cv, query_embedding, limit=limit)
+
+def search_cv(cv, query, limit=10, mode=None):
+    """
+    Searches for relevant chunks in a CV based on the query, using the
+    vector store that holds the CV (Qdrant or pgvector), or the in-process
+    exact search engine when SEARCH_ENGINE=exact.
+
+    mode is 'vector', 'lexical' (BM25 over the inverted index) or 'hybrid'
+    (both, fused with reciprocal rank fusion); it defaults to SEARCH_MODE.
+    """
+    mode = _check_mode(mode)
     try:
+        if mode == 'lexical':
+            return lexical_search(cv, query, limit=limit)
+
         # Generate embedding for the query
-        query_embedding = generate_embedding(query)
-        
-        # Search in Qdrant
-        search_results = search_points(
-            collection_name=collection_name,
-            query_vector=query_embedding,
-            limit=limit
-        )
-        
-        return search_results
+        query_embedding = generate_query_embedding(query)
+
+        if mode == 'vector':
+            return _vector_search(cv, query_embedding, limit)
+
+        candidates = limit * HYBRID_CANDIDATES
+        return reciprocal_rank_fusion([
+            _vector_search(cv, query_embedding, candidates),
+            lexical_search(cv, query, limit=candidates),
+        ], limit)
+    except Exception as e:
+        print(f"Error searching CV: {str(e)}")
+        return []
+
+def search_cv_batch(cv, queries, limit=10, mode=None):
+    """
+    Batch variant of search_cv: embeds every query in one encode call and
+    runs the vector searches as one batched vector store request. Returns
+    one result list per query.
+    """
+    mode = _check_mode(mode)
+    try:
+        if mode == 'lexical':
+            return [lexical_search(cv, query, limit=limit) for query in queries]
+
+        query_embeddings = generate_query_embeddings(list(queries))
+        candidates = limit if mode == 'vector' else limit * HYBRID_CANDIDATES
+        with span('search_points'):
+            if use_exact_search():
+                vector_results = [exact_search(cv, embedding, limit=candidates) for embedding in query_embeddings]
+            else:
+                vector_results = get_vector_store(cv).search_batch(cv, query_embeddings, limit=candidates)
+        if mode == 'vector':
+            return vector_results
+
+        return [
+            reciprocal_rank_fusion([results, lexical_search(cv, query, limit=candidates)], limit)
+            for query, results in zip(queries, vector_results)
+        ]
+    except Exception as e:
+        print(f"Error searching CV: {str(e)}")
+        return [[] for _ in queries]
+
+
+async def asearch_cv(cv, query, limit=10, mode=None):
+    """Async variant of search_cv for the ASGI chat path"""
+    mode = _check_mode(mode)
+    try:
+        if mode == 'lexical':
+            return await sync_to_async(lexical_search)(cv, query, limit=limit)
+
+        query_embedding = await agenerate_query_embedding(query)
+        candidates = limit if mode == 'vector' else limit * HYBRID_CANDIDATES
+
+        with span('search_points'):
+            if use_exact_search():
+                vector_results = await sync_to_async(exact_search)(cv, query_embedding, limit=candidates)
+            else:
+                vector_results = await get_vector_store(cv).asearch(cv, query_embedding, limit=candidates)
+        if mode == 'vector':
+            return vector_results
+
+        lexical_results = await sync_to_async(lexical_search)(cv, query, limit=candidates)
+        return reciprocal_rank_fusion([vector_results, lexical_results], limit)
     except Exception as e:
         print(f"Error searching CV: {str(e)}")
-        return []
\ No newline at end of file
+        return []
@@ -1,49 +1,213 @@
 import os
+import io
+import hashlib
+import mmap
+import multiprocessing
+import time
 import PyPDF2
 import docx
 import uuid
-from qdrant_client.http import models as qdrant_models
+from django.db import transaction
 from ..models import CV, CVChunk
-from .qdrant_service import get_qdrant_client, generate_collection_name, create_collection
-from .embedding import generate_embedding
-import re
+from .vector_store import get_vector_store
+from .exact_search import invalidate_cv_matrix
+from .embedding import generate_embeddings, DEFAULT_BATCH_SIZE
+from .answer_cache import invalidate_cv_answers
+from .lexical_index import count_terms, index_chunks, remove_cv_from_index, remove_chunks_from_index
+from .pdf_extraction import extract_pdf_pages
+from .text import iter_sentences
+from .tracing import record_span, span, traced
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# PDFs with at least this many pages are extracted in a process pool
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '16'))
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', '8'))
+
+# Upload limits; larger documents are rejected with a ValueError
+CV_MAX_UPLOAD_BYTES = int(os.getenv('CV_MAX_UPLOAD_BYTES', str(20 * 1024 * 1024)))
+CV_MAX_PAGES = int(os.getenv('CV_MAX_PAGES', '200'))
+# Points/rows written per Qdrant upsert and bulk_create while streaming
+STORE_BATCH_SIZE = int(os.getenv('CV_STORE_BATCH_SIZE', '64'))
+# Chunks shorter than this (stripped) are not stored
+MIN_CHUNK_CHARS = 20
+
+_extraction_pool = None
+_extraction_pool_pid = None
+
+SUPPORTED_EXTENSIONS = ['.pdf', '.doc', '.docx']
+
+def validate_file_type(file_obj):
+    """Raises ValueError for files extract_text_from_file cannot read"""
+    file_extension = os.path.splitext(file_obj.name)[1].lower()
+    if file_extension not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Unsupported file format: {file_extension}")
+
+def validate_upload_size(file_obj):
+    """Raises ValueError for uploads larger than CV_MAX_UPLOAD_BYTES"""
+    size = getattr(file_obj, 'size', None)
+    if size is not None and size > CV_MAX_UPLOAD_BYTES:
+        raise ValueError(
+            f"File is too large ({size} bytes, maximum is {CV_MAX_UPLOAD_BYTES} bytes)"
+        )
+
+def file_content_hash(file_obj, block_size=1024 * 1024):
+    """SHA-256 of the file's bytes; leaves the file positioned at the start"""
+    digest = hashlib.sha256()
+    file_obj.seek(0)
+    for block in iter(lambda: file_obj.read(block_size), b''):
+        digest.update(block)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+def chunk_hash(chunk_text):
+    """SHA-256 of a chunk's text, identifying chunks that did not change"""
+    return hashlib.sha256(chunk_text.encode('utf-8')).hexdigest()
+
+class MappedFile(io.RawIOBase):
+    """Read-only file object over a memory-mapped file on disk"""
+    def __init__(self, path, name=None):
+        super().__init__()
+        self.path = path
+        self.name = name or os.path.basename(path)
+        self._handle = open(path, 'rb')
+        self.size = os.fstat(self._handle.fileno()).st_size
+        self._buffer = mmap.mmap(self._handle.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, target):
+        if self._buffer is None:
+            return 0
+        data = self._buffer[self._position:self._position + len(target)]
+        target[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            if self._buffer is not None:
+                self._buffer.close()
+            self._handle.close()
+        super().close()
+
+@contextmanager
+def open_upload(file_obj):
+    """
+    Yields a file object for extraction. Uploads Django spooled to disk
+    (larger than FILE_UPLOAD_MAX_MEMORY_SIZE) are read through a memory map
+    instead of being loaded into memory.
+    """
+    validate_upload_size(file_obj)
+    if not hasattr(file_obj, 'temporary_file_path'):
+        yield file_obj
+        return
+    mapped = MappedFile(file_obj.temporary_file_path(), file_obj.name)
+    try:
+        yield mapped
+    finally:
+        mapped.close()
+
+def _pdf_source(file_obj):
+    """Returns something each extraction process can open: a path or the raw bytes"""
+    if isinstance(file_obj, MappedFile):
+        return file_obj.path
+    if hasattr(file_obj, 'temporary_file_path'):
+        return file_obj.temporary_file_path()
+    file_obj.seek(0)
+    return file_obj.read()
+
+def _get_extraction_pool():
+    global _extraction_pool, _extraction_pool_pid
+    if _extraction_pool is None or _extraction_pool_pid != os.getpid():
+        # Spawned rather than forked: the caller (a gunicorn worker, say) runs
+        # threads, and a forked child gets their locks in whatever state they
+        # were, which can hang it
+        _extraction_pool = ProcessPoolExecutor(
+            max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context('spawn')
+        )
+        _extraction_pool_pid = os.getpid()
+    return _extraction_pool
+
+def iter_text_from_file(file_obj, progress=None):
+    """
+    Yields the text of a file page by page (PDF) or paragraph by paragraph (DOCX).
+
+    Large PDFs are split into page ranges extracted in a process pool; pages
+    are still yielded in order, as soon as their range is done.
+    When a progress dict is given, progress['total'] is set to the number of
+    pages/paragraphs and progress['done'] counts the ones yielded so far.
+    """
+    if progress is None:
+        progress = {}
+    progress.update(done=0, total=0)
 
-def extract_text_from_file(file_obj):
-    """Extracts text from a file based on its extension"""
-    text = ""
     file_extension = os.path.splitext(file_obj.name)[1].lower()
-    
+
     if file_extension == '.pdf':
         pdf_reader = PyPDF2.PdfReader(file_obj)
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
+        page_count = len(pdf_reader.pages)
+        if page_count > CV_MAX_PAGES:
+            raise ValueError(f"Document has too many pages ({page_count}, maximum is {CV_MAX_PAGES})")
+        progress['total'] = page_count
+        if PDF_EXTRACT_WORKERS > 1 and page_count >= PDF_PARALLEL_MIN_PAGES:
+            source = _pdf_source(file_obj)
+            pool = _get_extraction_pool()
+            futures = [
+                pool.submit(extract_pdf_pages, source, start, min(start + PDF_PAGES_PER_TASK, page_count))
+                for start in range(0, page_count, PDF_PAGES_PER_TASK)
+            ]
+            pages = (page for future in futures for page in future.result())
+        else:
+            pages = (page.extract_text() + "\n" for page in pdf_reader.pages)
+        for page in pages:
+            progress['done'] += 1
+            yield page
     elif file_extension in ['.doc', '.docx']:
         doc = docx.Document(file_obj)
+        progress['total'] = len(doc.paragraphs)
         for para in doc.paragraphs:
-            text += para.text + "\n"
+            progress['done'] += 1
+            yield para.text + "\n"
     else:
         raise ValueError(f"Unsupported file format: {file_extension}")
-        
-    return text
 
-def create_chunks(text, chunk_size=500, overlap=1):
+@traced('extract_text_from_file')
+def extract_text_from_file(file_obj):
+    """Extracts text from a file based on its extension"""
+    return "".join(iter_text_from_file(file_obj))
+
+def iter_chunks(text_parts, chunk_size=500, overlap=1):
     """
-    Create overlapping chunks of full sentences from the text.
-    Preprocessing includes normalization, extra space removal, and dash handling.
+    Streaming version of create_chunks: yields overlapping chunks of full
+    sentences as soon as they are complete.
     """
-    # Normalize and clean text
-    text = text.replace('\n', ' ').replace('\r', '')
-    text = re.sub(r'\s*[-–—]+\s*', ' ', text)
-    text = ' '.join(text.split())
-
-    # Split text into sentences
-    sentences = re.split(r'(?<=[.!?]) +', text)
-
-    chunks = []
     current_chunk = []
     current_length = 0
 
-    for sentence in sentences:
+    for sentence in iter_sentences(text_parts):
         sentence = sentence.strip()
         if not sentence:
             continue
@@ -54,7 +218,7 @@ def create_chunks(text, chunk_size=500, overlap=1):
         else:
             # Commit current chunk
             if current_chunk:
-                chunks.append(' '.join(current_chunk))
+                yield ' '.join(current_chunk)
 
                 # Handle overlap (by sentence count)
                 current_chunk = current_chunk[-overlap:] if overlap > 0 else []
@@ -65,66 +229,176 @@ def create_chunks(text, chunk_size=500, overlap=1):
 
     # Add any leftover
     if current_chunk:
-        chunks.append(' '.join(current_chunk))
+        yield ' '.join(current_chunk)
+
+@traced('create_chunks')
+def create_chunks(text, chunk_size=500, overlap=1):
+    """
+    Create overlapping chunks of full sentences from the text.
+    Preprocessing includes normalization, extra space removal, and dash handling.
+    """
+    return list(iter_chunks([text], chunk_size=chunk_size, overlap=overlap))
+
+def numbered_chunks(items, text_of=None):
+    """
+    Yields (chunk_index, item) for the chunks that are stored, skipping very
+    small ones; indexes count stored chunks only. Uploads, update_cv and the
+    bulk import all number chunks with it, so re-ingestion matches a stored
+    chunk to its position whichever path stored it. text_of maps an item to
+    its chunk text (by default the item is the text).
+    """
+    index = 0
+    for item in items:
+        chunk_text = item if text_of is None else text_of(item)
+        if len(chunk_text.strip()) < MIN_CHUNK_CHARS:
+            continue
+        yield index, item
+        index += 1
+
+def iter_embedded_chunks(chunks, batch_size=DEFAULT_BATCH_SIZE, timings=None, on_batch=None):
+    """
+    Embeds a stream of chunks batch by batch, yielding (chunk_text, embedding).
+    Seconds spent encoding are added to timings['embed'] when given, and
+    on_batch() is called after each batch is encoded.
+    """
+    def embed(batch):
+        started = time.perf_counter()
+        embeddings = generate_embeddings(batch, batch_size=batch_size)
+        if timings is not None:
+            timings['embed'] += time.perf_counter() - started
+        if on_batch:
+            on_batch()
+        return zip(batch, embeddings)
+
+    batch = []
+    for _, chunk_text in numbered_chunks(chunks):
+        batch.append(chunk_text)
+        if len(batch) >= batch_size:
+            yield from embed(batch)
+            batch = []
+    if batch:
+        yield from embed(batch)
+
+def _record_stream_spans(timings):
+    """Records the extraction and chunking time of a streamed ingestion as trace spans"""
+    record_span('extract_text_from_file', timings['extract'])
+    record_span('create_chunks', timings['chunk'])
+
+def _timed(iterable, timings, stage):
+    """Adds the time spent producing each item of iterable to timings[stage]"""
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timings[stage] += time.perf_counter() - started
+            return
+        timings[stage] += time.perf_counter() - started
+        yield item
+
+
+def choose_cv_storage():
+    """
+    Picks the vector storage for a new CV from the configured backend.
+    Returns (collection_name, storage_layout); per-CV collections are not created yet.
+    """
+    return get_vector_store().new_cv_storage()
 
-    return chunks
 
+def reset_cv_storage(cv):
+    """Clears any chunks stored for the CV and makes sure its vector storage exists"""
+    invalidate_cv_answers(cv)
+    invalidate_cv_matrix(cv.id)
+    remove_cv_from_index(cv)
+    CVChunk.objects.filter(cv=cv).delete()
+    get_vector_store(cv).reset_cv(cv)
 
-def store_cv_chunks(name, collection_name, chunks_with_embeddings):
+
+def _write_chunks(cv, store, chunk_records, embeddings):
+    """Stores a batch of unsaved chunk records and their embeddings"""
+    if not chunk_records:
+        return
+    # Store vectors (Qdrant points, or embeddings on the records for pgvector)
+    with span('upsert_points'):
+        store.add_chunks(cv, chunk_records, embeddings)
+    # Store in DB, then add the saved chunks to the lexical index
+    term_counts = count_terms(chunk_records)
+    with span('db_write'):
+        CVChunk.objects.bulk_create(chunk_records)
+        index_chunks(chunk_records, term_counts)
+
+
+def _store_chunks(cv, chunks_with_embeddings, batch_size=STORE_BATCH_SIZE, timings=None, on_flush=None):
+    """
+    Writes chunks and their embeddings for an existing CV to the vector store
+    and the database, flushing every batch_size chunks so an iterator input is
+    never held in memory as a whole. on_flush() is called after each written batch.
+    """
+    store = get_vector_store(cv)
+    chunk_records = []
+    embeddings = []
+
+    def flush():
+        if not chunk_records:
+            return
+        started = time.perf_counter()
+        _write_chunks(cv, store, chunk_records, embeddings)
+        chunk_records.clear()
+        embeddings.clear()
+        if timings is not None:
+            timings['store'] += time.perf_counter() - started
+        if on_flush:
+            on_flush()
+
+    for i, (chunk_text, embedding) in numbered_chunks(chunks_with_embeddings, text_of=lambda item: item[0]):
+        # Prepare DB chunk record; its point ID also identifies the Qdrant point
+        chunk_records.append(
+            CVChunk(
+                cv=cv,
+                chunk_index=i,
+                chunk_text=chunk_text,
+                qdrant_point_id=str(uuid.uuid4()),
+                content_hash=chunk_hash(chunk_text)
+            )
+        )
+        embeddings.append(embedding)
+
+        if len(chunk_records) >= batch_size:
+            flush()
+
+    flush()
+
+def _discard_cv(cv):
+    """Removes a partially stored CV from the database and the vector store"""
+    try:
+        get_vector_store(cv).delete_cv(cv)
+    except Exception as e:
+        print(f"Error cleaning up vectors of CV {cv.id}: {str(e)}")
+    remove_cv_from_index(cv)
+    cv.delete()
+
+
+def store_cv_chunks(name, collection_name, chunks_with_embeddings, storage_layout=CV.LAYOUT_PER_CV):
     """
     Store preprocessed CV chunks and their embeddings into Qdrant and the database.
 
     Parameters:
     - name: Name of the CV owner.
     - collection_name: The name of the pre-created Qdrant collection.
-    - chunks_with_embeddings: A list of tuples (chunk_text, embedding).
+    - chunks_with_embeddings: A list of tuples (chunk_text, embedding), where the
+      embedding is a list of floats or a row of a NumPy matrix.
+    - storage_layout: CV.LAYOUT_PER_CV or CV.LAYOUT_SHARED.
     """
     try:
         # Create CV record in database
         cv = CV.objects.create(
             name=name,
-            qdrant_collection_name=collection_name
+            qdrant_collection_name=collection_name,
+            storage_layout=storage_layout
         )
 
-        points = []
-        chunk_records = []
-
-        for i, (chunk_text, embedding) in enumerate(chunks_with_embeddings):
-            if len(chunk_text.strip()) < 20:
-                continue
-
-            point_id = str(uuid.uuid4())
-
-            # Prepare point for Qdrant
-            points.append(
-                qdrant_models.PointStruct(
-                    id=point_id,
-                    vector=embedding,
-                    payload={"text": chunk_text, "chunk_index": i}
-                )
-            )
-
-            # Prepare DB chunk record
-            chunk_records.append(
-                CVChunk(
-                    cv=cv,
-                    chunk_index=i,
-                    chunk_text=chunk_text,
-                    qdrant_point_id=point_id
-                )
-            )
-
-        # Store in Qdrant
-        if points:
-            client = get_qdrant_client()
-            client.upsert(
-                collection_name=collection_name,
-                points=points
-            )
-
-        # Store in DB
-        if chunk_records:
-            CVChunk.objects.bulk_create(chunk_records)
+        _store_chunks(cv, chunks_with_embeddings)
 
         return cv
 
@@ -133,31 +407,200 @@ def store_cv_chunks(name, collection_name, chunks_with_embeddings):
         raise
 
 def process_and_store_cv(name, file_obj):
-    """Process and store a CV file with its embeddings"""
+    """
+    Process and store a CV file with its embeddings.
+
+    Extraction, chunking, embedding and storage run as one streaming
+    pipeline: early pages are chunked and embedded while later ones are still
+    being parsed, and chunks are written in batches of STORE_BATCH_SIZE, so
+    memory use does not grow with the document size.
+    """
     try:
-        # Extract text from the file
-        text = extract_text_from_file(file_obj)
-        
-        # Create a collection in Qdrant
-        collection_name = generate_collection_name()
-        create_collection(collection_name)
-        
-        # Create chunks
-        chunks = create_chunks(text)
-        
-        # Generate embeddings for each chunk
-        chunks_with_embeddings = []
-        for chunk_text in chunks:
-            if len(chunk_text.strip()) < 20:  # Skip very small chunks
-                continue
-            embedding = generate_embedding(chunk_text)
-            chunks_with_embeddings.append((chunk_text, embedding))
+        validate_file_type(file_obj)
+        validate_upload_size(file_obj)
+
+        # Use the configured vector store (shared collection, per-CV collection or pgvector)
+        collection_name, storage_layout = choose_cv_storage()
+
+        # Create CV record in database; it is not searchable until every chunk is stored
+        with span('db_write'):
+            cv = CV.objects.create(
+                name=name,
+                qdrant_collection_name=collection_name,
+                storage_layout=storage_layout,
+                content_hash=file_content_hash(file_obj),
+                status=CV.STATUS_PROCESSING,
+                progress=0
+            )
         
-        # Store the CV and chunks
-        cv = store_cv_chunks(name, collection_name, chunks_with_embeddings)
+        timings = defaultdict(float)
+        try:
+            get_vector_store(cv).create_cv_storage(cv)
+            with open_upload(file_obj) as upload:
+                text_parts = _timed(iter_text_from_file(upload), timings, 'extract')
+                chunks = _timed(iter_chunks(text_parts), timings, 'chunk')
+                _store_chunks(cv, iter_embedded_chunks(chunks))
+        except Exception:
+            _discard_cv(cv)
+            raise
+        timings['chunk'] -= timings['extract']
+        _record_stream_spans(timings)
+
+        cv.status = CV.STATUS_READY
+        cv.progress = 100
+        with span('db_write'):
+            cv.save(update_fields=['status', 'progress'])
         
         return cv
         
     except Exception as e:
         print(f"Error processing CV: {str(e)}")
         raise
+
+def ingest_cv(cv, file_obj, on_stage=None):
+    """
+    Runs extraction, chunking, embedding and storage for an existing CV record.
+    Safe to re-run: chunks left by a previous attempt are replaced.
+
+    The stages run as the same streaming pipeline as process_and_store_cv.
+    on_stage(stage, seconds, progress) is called with the time spent so far
+    in the stage as each batch is embedded ('embed') and stored ('store');
+    progress goes from 10 to 99 with the share of pages (or paragraphs) read.
+    Once the pipeline has finished it is called for every stage, with the
+    time spent in that stage alone, ending with ('store', ..., 100).
+    """
+    timings = defaultdict(float)
+    parts = {}
+    reported = {"progress": 0}
+
+    def report(stage):
+        if not on_stage:
+            return
+        if parts.get('total'):
+            reported["progress"] = max(reported["progress"], 10 + 89 * parts['done'] // parts['total'])
+        on_stage(stage, timings[stage], reported["progress"])
+
+    started = time.perf_counter()
+    reset_cv_storage(cv)
+    timings['store'] += time.perf_counter() - started
+
+    with open_upload(file_obj) as upload:
+        text_parts = _timed(iter_text_from_file(upload, progress=parts), timings, 'extract')
+        # Time spent in chunking includes pulling pages from the extractor
+        chunks = _timed(iter_chunks(text_parts), timings, 'chunk')
+        embedded = iter_embedded_chunks(chunks, timings=timings, on_batch=lambda: report('embed'))
+        _store_chunks(cv, embedded, timings=timings, on_flush=lambda: report('store'))
+    timings['chunk'] -= timings['extract']
+    _record_stream_spans(timings)
+    cv.content_hash = file_content_hash(file_obj)
+    cv.save(update_fields=['content_hash'])
+
+    if on_stage:
+        for stage in ('extract', 'chunk', 'embed'):
+            on_stage(stage, timings[stage], reported["progress"])
+        on_stage('store', timings['store'], 100)
+
+    return cv
+
+def update_cv(cv, file_obj, batch_size=STORE_BATCH_SIZE):
+    """
+    Re-ingests an updated file for an existing CV, embedding only new chunks.
+
+    Chunks whose text hash matches a stored chunk keep their embedding and
+    vector store point (only their chunk_index is updated if they moved),
+    new chunks are embedded and stored, and chunks no longer in the document
+    are deleted. Uploading the same bytes again does nothing. Runs in one
+    transaction holding a lock on the CV row; on failure the rows are rolled
+    back and the points already written removed, so it is safe to re-run.
+    Returns counts of the work done and skipped.
+    """
+    validate_file_type(file_obj)
+    validate_upload_size(file_obj)
+    content_hash = file_content_hash(file_obj)
+    store = get_vector_store(cv)
+    # Points written to the vector store, removed again if the update fails
+    written = []
+    try:
+        with transaction.atomic():
+            return _update_cv(cv, file_obj, content_hash, store, written, batch_size)
+    except Exception:
+        if written:
+            try:
+                store.delete_chunks(cv, written)
+            except Exception as e:
+                print(f"Error cleaning up vectors of CV {cv.id}: {str(e)}")
+        raise
+
+def _update_cv(cv, file_obj, content_hash, store, written, batch_size):
+    # Locks the CV row, so concurrent updates of one CV run one after the
+    # other, and re-reads its hash under the lock
+    stored_hash = CV.objects.select_for_update().filter(pk=cv.pk).values_list('content_hash', flat=True).get()
+    if content_hash == stored_hash:
+        cv.content_hash = stored_hash
+        chunk_count = CVChunk.objects.filter(cv=cv).count()
+        return {"unchanged": True, "chunks": chunk_count, "embedded": 0, "reused": chunk_count,
+                "deleted": 0, "embeddings_skipped": chunk_count}
+
+    existing = defaultdict(list)
+    for chunk in CVChunk.objects.filter(cv=cv).defer('embedding').order_by('chunk_index'):
+        # Chunks stored before content hashes existed are hashed here
+        existing[chunk.content_hash or chunk_hash(chunk.chunk_text)].append(chunk)
+
+    moved = []
+    new_records = []
+    new_texts = []
+    reused = embedded = 0
+
+    def flush():
+        nonlocal embedded
+        if new_records:
+            written.extend(record.qdrant_point_id for record in new_records)
+            _write_chunks(cv, store, new_records, generate_embeddings(new_texts, batch_size=batch_size))
+            embedded += len(new_records)
+        new_records.clear()
+        new_texts.clear()
+
+    with open_upload(file_obj) as upload:
+        for i, chunk_text in numbered_chunks(iter_chunks(iter_text_from_file(upload))):
+            digest = chunk_hash(chunk_text)
+            if existing.get(digest):
+                chunk = existing[digest].pop(0)
+                reused += 1
+                if chunk.chunk_index != i or not chunk.content_hash:
+                    chunk.chunk_index = i
+                    chunk.content_hash = digest
+                    moved.append(chunk)
+                continue
+            new_records.append(CVChunk(
+                cv=cv, chunk_index=i, chunk_text=chunk_text,
+                qdrant_point_id=str(uuid.uuid4()), content_hash=digest
+            ))
+            new_texts.append(chunk_text)
+            if len(new_records) >= batch_size:
+                flush()
+    flush()
+
+    if moved:
+        CVChunk.objects.bulk_update(moved, ['chunk_index', 'content_hash'], batch_size=500)
+
+    stale = [chunk for chunks in existing.values() for chunk in chunks]
+    if stale:
+        remove_chunks_from_index(chunk.id for chunk in stale)
+        CVChunk.objects.filter(id__in=[chunk.id for chunk in stale]).delete()
+
+    invalidate_cv_answers(cv)
+    cv.content_hash = content_hash
+    cv.save(update_fields=['content_hash'])
+
+    def update_vector_store():
+        # Only once the rows are committed: a rolled back update keeps them
+        # pointing at the points they had
+        if moved:
+            store.update_chunk_indexes(cv, moved)
+        if stale:
+            store.delete_chunks(cv, [chunk.qdrant_point_id for chunk in stale])
+        invalidate_cv_matrix(cv.id)
+    transaction.on_commit(update_vector_store)
+
+    return {"unchanged": False, "chunks": reused + embedded, "embedded": embedded, "reused": reused,
+            "deleted": len(stale), "embeddings_skipped": reused}
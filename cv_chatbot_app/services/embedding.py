@@ -1,14 +1,317 @@
-from sentence_transformers import SentenceTransformer
+import os
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .tracing import traced
+
+EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')
+
+EMBEDDING_BACKENDS = ('torch', 'torch-int8', 'onnx', 'onnx-int8', 'openvino')
+# Runtime of the embedding model on CPU: stock PyTorch, PyTorch with int8
+# dynamically quantized Linear layers, ONNX Runtime (fp32 or an int8 file of
+# the model repository) or OpenVINO. The ONNX and OpenVINO runtimes need
+# `pip install sentence-transformers[onnx]` / `[openvino]`.
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+# ONNX file loaded by the onnx-int8 backend (pick the one matching the CPU)
+EMBEDDING_ONNX_INT8_FILE = os.getenv('EMBEDDING_ONNX_INT8_FILE', 'onnx/model_quint8_avx2.onnx')
+# Intra-op threads of the runtime; 0 keeps the library default (all cores),
+# set it to cores / workers when several workers share a host
+EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', '0'))
+# At server start (see services/startup.py): 'true' loads and exercises the
+# model, 'load' only loads the weights (the gunicorn master with preload_app,
+# see gunicorn.conf.py), 'false' leaves it to the first request
+EMBEDDING_WARMUP = os.getenv('EMBEDDING_WARMUP', 'true').lower()
+
+# Number of texts handed to a single SentenceTransformer.encode call
+DEFAULT_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '32'))
+
+# Query embedding cache: in-process LRU, plus an optional SQLite file shared
+# by every worker on the host
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '1024'))
+QUERY_CACHE_PATH = os.getenv('QUERY_EMBEDDING_CACHE_PATH')
+# Rows kept in the SQLite file; the least recently used are deleted beyond it
+QUERY_CACHE_SHARED_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SHARED_SIZE', '100000'))
+
+# Threads running encode() for async callers, off the event loop
+EMBEDDING_EXECUTOR_WORKERS = int(os.getenv('EMBEDDING_EXECUTOR_WORKERS', '2'))
+_embedding_executor = None
 
 # Initialize the embedding model (singleton pattern)
 _embedding_model = None
 
+def load_embedding_model(backend=EMBEDDING_BACKEND, threads=EMBEDDING_THREADS):
+    """Loads EMBEDDING_MODEL_NAME on the CPU with the given runtime backend"""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}. Use one of {', '.join(EMBEDDING_BACKENDS)}")
+
+    # Imported here: sentence-transformers pulls in torch and transformers,
+    # seconds of import time that processes not embedding anything skip
+    from sentence_transformers import SentenceTransformer
+    if backend.startswith('torch'):
+        import torch
+        if threads:
+            torch.set_num_threads(threads)
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME, device='cpu')  # 384 dimensions
+        if backend == 'torch-int8':
+            import warnings
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                from torch.ao.quantization import quantize_dynamic
+                quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        return model
+
+    model_kwargs = {}
+    if backend == 'onnx-int8':
+        model_kwargs["file_name"] = EMBEDDING_ONNX_INT8_FILE
+    if threads and backend.startswith('onnx'):
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        model_kwargs["session_options"] = session_options
+    elif threads:
+        model_kwargs["ov_config"] = {"INFERENCE_NUM_THREADS": str(threads)}
+    return SentenceTransformer(
+        EMBEDDING_MODEL_NAME, device='cpu', backend=backend.split('-')[0], model_kwargs=model_kwargs
+    )
+
 def get_embedding_model():
     global _embedding_model
     if _embedding_model is None:
-        _embedding_model = SentenceTransformer('all-MiniLM-L6-v2')  # 384 dimensions
+        _embedding_model = load_embedding_model()
     return _embedding_model
 
+def warmup_embedding_model():
+    """
+    Loads the model and runs a first query and a first batch, so the first
+    request of a worker does not pay for the model load and lazy runtime
+    initialization. Returns the seconds spent.
+    """
+    started = time.perf_counter()
+    model = get_embedding_model()
+    model.encode("warmup query")
+    model.encode(["warmup chunk of a CV"] * 4, batch_size=DEFAULT_BATCH_SIZE)
+    elapsed = time.perf_counter() - started
+    print(f"Embedding model warmed up ({EMBEDDING_BACKEND}) in {elapsed:.2f}s")
+    return elapsed
+
+@traced('generate_embedding')
 def generate_embedding(text):
     model = get_embedding_model()
-    return model.encode(text).tolist()
\ No newline at end of file
+    return model.encode(text).tolist()
+
+@traced('generate_embeddings')
+def generate_embeddings(texts, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Encode many texts in batched encode calls.
+
+    Returns a contiguous float32 matrix of shape (len(texts), dimension),
+    one row per input text in the same order.
+    """
+    model = get_embedding_model()
+    if not texts:
+        return np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+    embeddings = model.encode(
+        list(texts),
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+def normalize_query(text):
+    """Case- and whitespace-insensitive form of a query used as cache key"""
+    return ' '.join(text.lower().split())
+
+class QueryEmbeddingCache:
+    """
+    Two-tier cache of query embeddings keyed on (model name, normalized text).
+
+    The first tier is a bounded in-process LRU. The optional second tier is a
+    SQLite file shared between gunicorn workers; entries found there are
+    promoted into the LRU. The file keeps about shared_size rows: every
+    shared_size / 10 writes, each process deletes the least recently used
+    rows beyond it.
+    """
+    def __init__(self, max_size=QUERY_CACHE_SIZE, path=QUERY_CACHE_PATH, model_name=None,
+                 shared_size=QUERY_CACHE_SHARED_SIZE):
+        self.max_size = max_size
+        self.path = path
+        self.shared_size = shared_size
+        self._prune_every = max(1, shared_size // 10)
+        self._shared_writes = 0
+        if model_name is None:
+            # Other runtimes give slightly different vectors: never mix them
+            model_name = EMBEDDING_MODEL_NAME if EMBEDDING_BACKEND == 'torch' else f"{EMBEDDING_MODEL_NAME}/{EMBEDDING_BACKEND}"
+        self.model_name = model_name
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0, "shared_evictions": 0}
+
+    def key(self, text):
+        raw = f"{self.model_name}\x00{normalize_query(text)}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _shared_connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, used_at REAL NOT NULL DEFAULT 0)"
+            )
+            try:
+                # Files written before entries were evicted
+                connection.execute("ALTER TABLE query_embeddings ADD COLUMN used_at REAL NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass
+            connection.execute("CREATE INDEX IF NOT EXISTS query_embeddings_used_at ON query_embeddings (used_at)")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _shared_get(self, key):
+        try:
+            connection = self._shared_connection()
+            row = connection.execute(
+                "SELECT vector FROM query_embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row:
+                with connection:
+                    connection.execute("UPDATE query_embeddings SET used_at = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.Error as e:
+            print(f"Error reading embedding cache: {str(e)}")
+            return None
+        return np.frombuffer(row[0], dtype=np.float32) if row else None
+
+    def _shared_put(self, key, vector):
+        try:
+            connection = self._shared_connection()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, vector, used_at) VALUES (?, ?, ?)",
+                    (key, vector.tobytes(), time.time())
+                )
+            with self._lock:
+                self._shared_writes += 1
+                prune = self._shared_writes % self._prune_every == 0
+            if prune:
+                self._prune_shared(connection)
+        except sqlite3.Error as e:
+            print(f"Error writing embedding cache: {str(e)}")
+
+    def _prune_shared(self, connection):
+        """Deletes the least recently used rows beyond shared_size"""
+        with connection:
+            excess = connection.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0] - self.shared_size
+            if excess > 0:
+                connection.execute(
+                    "DELETE FROM query_embeddings WHERE key IN "
+                    "(SELECT key FROM query_embeddings ORDER BY used_at LIMIT ?)", (excess,)
+                )
+        if excess > 0:
+            with self._lock:
+                self.stats["shared_evictions"] += excess
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get(self, text):
+        key = self.key(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return vector
+
+        if self.path:
+            vector = self._shared_get(key)
+            if vector is not None:
+                with self._lock:
+                    self.stats["shared_hits"] += 1
+                self._remember(key, vector)
+                return vector
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, text, vector):
+        key = self.key(text)
+        vector = np.ascontiguousarray(vector, dtype=np.float32)
+        self._remember(key, vector)
+        if self.path:
+            self._shared_put(key, vector)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            size = len(self._entries)
+            stats = dict(self.stats)
+        return dict(stats, size=size, max_size=self.max_size, shared=bool(self.path),
+                    shared_size=self.shared_size if self.path else None, model=self.model_name)
+
+_query_cache = QueryEmbeddingCache()
+
+@traced('generate_embedding')
+def generate_query_embedding(text):
+    """Embeds a search query, reusing cached embeddings of identical questions"""
+    return _embed_query(text)
+
+def _embed_query(text):
+    vector = _query_cache.get(text)
+    if vector is None:
+        vector = np.ascontiguousarray(get_embedding_model().encode(text), dtype=np.float32)
+        _query_cache.put(text, vector)
+    return vector.tolist()
+
+def generate_query_embeddings(texts, batch_size=DEFAULT_BATCH_SIZE):
+    """Embeds several queries, encoding the ones not in the cache in one batched call"""
+    vectors = [_query_cache.get(text) for text in texts]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        encoded = generate_embeddings([texts[i] for i in missing], batch_size=batch_size)
+        for i, vector in zip(missing, encoded):
+            vector = np.ascontiguousarray(vector)
+            _query_cache.put(texts[i], vector)
+            vectors[i] = vector
+    return [vector.tolist() for vector in vectors]
+
+def _get_embedding_executor():
+    global _embedding_executor
+    if _embedding_executor is None:
+        _embedding_executor = ThreadPoolExecutor(
+            max_workers=EMBEDDING_EXECUTOR_WORKERS, thread_name_prefix='embedding'
+        )
+    return _embedding_executor
+
+@traced('generate_embedding')
+async def agenerate_query_embedding(text):
+    """
+    Async variant of generate_query_embedding. The whole lookup runs in a
+    worker thread: besides encoding, the cache may read and write its SQLite
+    file and the first call loads the model.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_embedding_executor(), _embed_query, text)
+
+def get_query_cache_stats():
+    """Returns hit/miss/eviction counters of the query embedding cache"""
+    return _query_cache.get_stats()
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+from ..models import CVChunk
+from .vector_store import get_vector_store
+
+# Load environment variables
+load_dotenv()
+
+# 'store' searches the CV's vector store, 'exact' searches in-process with NumPy
+SEARCH_ENGINE = os.getenv('SEARCH_ENGINE', 'store')
+EXACT_SEARCH_CACHE_MB = float(os.getenv('EXACT_SEARCH_CACHE_MB', '256'))
+# Bounds how long another worker's re-ingestion can go unnoticed
+EXACT_SEARCH_CACHE_TTL = int(os.getenv('EXACT_SEARCH_CACHE_TTL', '300'))  # seconds
+
+def use_exact_search():
+    """Whether per-CV retrieval runs in-process instead of in the vector store"""
+    return SEARCH_ENGINE == 'exact'
+
+class CVMatrix:
+    """L2-normalized float32 embedding matrix of one CV with its chunk metadata"""
+    def __init__(self, cv_id, point_ids, chunk_indexes, texts, matrix):
+        self.cv_id = cv_id
+        self.point_ids = point_ids
+        self.chunk_indexes = chunk_indexes
+        self.texts = texts
+        self.matrix = matrix
+        self.loaded_at = time.monotonic()
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes + sum(len(text) for text in self.texts)
+
+    def search(self, query_vector, limit):
+        """Exact cosine top-k: one matrix-vector product plus argpartition"""
+        from qdrant_client.http import models as qdrant_models
+        count = len(self.point_ids)
+        if count == 0 or limit <= 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = self.matrix @ query
+
+        if limit < count:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(count)
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        return [
+            qdrant_models.ScoredPoint(
+                id=self.point_ids[i],
+                version=0,
+                score=float(scores[i]),
+                payload={"text": self.texts[i], "chunk_index": self.chunk_indexes[i], "cv_id": self.cv_id}
+            )
+            for i in top
+        ]
+
+def load_cv_matrix(cv):
+    """Loads a CV's chunk embeddings from the database (or its vector store)"""
+    rows = list(
+        CVChunk.objects
+        .filter(cv_id=cv.id)
+        .order_by('chunk_index')
+        .values_list('qdrant_point_id', 'chunk_index', 'chunk_text', 'embedding')
+    )
+    missing = [point_id for point_id, _, _, embedding in rows if embedding is None]
+    fetched = get_vector_store(cv).fetch_vectors(cv, missing) if missing else {}
+
+    point_ids, chunk_indexes, texts, vectors = [], [], [], []
+    for point_id, chunk_index, chunk_text, embedding in rows:
+        vector = embedding if embedding is not None else fetched.get(point_id)
+        if vector is None:
+            continue
+        point_ids.append(point_id)
+        chunk_indexes.append(chunk_index)
+        texts.append(chunk_text)
+        vectors.append(vector)
+
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    if len(vectors):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1.0, norms)
+    return CVMatrix(cv.id, point_ids, chunk_indexes, texts, np.ascontiguousarray(matrix))
+
+class CVMatrixCache:
+    """LRU of per-CV matrices bounded by their total size in bytes"""
+    def __init__(self, max_bytes=int(EXACT_SEARCH_CACHE_MB * 1024 * 1024), ttl=EXACT_SEARCH_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, cv):
+        with self._lock:
+            entry = self._entries.get(cv.id)
+            if entry is not None and time.monotonic() - entry.loaded_at < self.ttl:
+                self._entries.move_to_end(cv.id)
+                self.stats["hits"] += 1
+                return entry
+            self.stats["misses"] += 1
+
+        entry = load_cv_matrix(cv)
+        with self._lock:
+            self._discard(cv.id)
+            self._entries[cv.id] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.stats["evictions"] += 1
+        return entry
+
+    def _discard(self, cv_id):
+        entry = self._entries.pop(cv_id, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    def invalidate(self, cv_id):
+        with self._lock:
+            self._discard(cv_id)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, cvs=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes)
+
+_matrix_cache = CVMatrixCache()
+
+def exact_search(cv, query_vector, limit=5):
+    """Exact top-k search over the CV's chunks, in the same shape as search_points"""
+    return _matrix_cache.get(cv).search(query_vector, limit)
+
+def invalidate_cv_matrix(cv_id):
+    """Drops the cached matrix of a CV after its chunks changed"""
+    _matrix_cache.invalidate(cv_id)
+
+def get_exact_search_stats():
+    return _matrix_cache.get_stats()
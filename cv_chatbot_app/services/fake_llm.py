@@ -0,0 +1,245 @@
+import os
+import asyncio
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Seconds to wait before the first token and between tokens
+FAKE_LLM_FIRST_TOKEN_DELAY = float(os.getenv('FAKE_LLM_FIRST_TOKEN_DELAY', '0.05'))
+FAKE_LLM_TOKEN_DELAY = float(os.getenv('FAKE_LLM_TOKEN_DELAY', '0.01'))
+
+class FakeGroqClient:
+    """
+    Local stand-in for groq.Client used in tests and benchmarks.
+
+    Implements client.chat.completions.create() for both plain and
+    stream=True calls, answering with a deterministic echo of the question.
+    """
+    def __init__(self, first_token_delay=FAKE_LLM_FIRST_TOKEN_DELAY, token_delay=FAKE_LLM_TOKEN_DELAY):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def answer_for(self, messages):
+        question = messages[-1]["content"].rsplit("Q:", 1)[-1].replace("A:", "").strip()
+        return f"Based on the CV, here is what it says about: {question}"
+
+    def _tokens(self, text):
+        words = text.split(' ')
+        return [word if i == 0 else ' ' + word for i, word in enumerate(words)]
+
+    def _create(self, model, messages, stream=False, **kwargs):
+        answer = self.answer_for(messages)
+        if stream:
+            return self._stream(answer)
+        time.sleep(self.first_token_delay + self.token_delay * len(self._tokens(answer)))
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=answer))]
+        )
+
+    def _stream(self, answer):
+        time.sleep(self.first_token_delay)
+        for i, token in enumerate(self._tokens(answer)):
+            if i:
+                time.sleep(self.token_delay)
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=token))]
+            )
+
+
+class FakeAsyncGroqClient(FakeGroqClient):
+    """Async counterpart of FakeGroqClient mirroring groq.AsyncClient"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._acreate))
+
+    async def _acreate(self, model, messages, stream=False, **kwargs):
+        answer = self.answer_for(messages)
+        if stream:
+            return self._astream(answer)
+        await asyncio.sleep(self.first_token_delay + self.token_delay * len(self._tokens(answer)))
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=answer))]
+        )
+
+    async def close(self):
+        pass
+
+    async def _astream(self, answer):
+        await asyncio.sleep(self.first_token_delay)
+        for i, token in enumerate(self._tokens(answer)):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=token))]
+            )
+
+
+class FakeLLMServer:
+    """
+    Local HTTP server speaking the OpenAI/Groq chat completions API, for
+    exercising the real client and the LLM gateway without network access.
+
+    Point the app at it with GROQ_BASE_URL=http://127.0.0.1:<port>. Latency
+    and failures are injected per request: error_rate answers 500,
+    rate_limit_rate answers 429, and tail_rate adds tail_latency seconds to
+    a request (for testing timeouts and hedging). GET /stats returns counters.
+    """
+    def __init__(self, host='127.0.0.1', port=0, first_token_delay=FAKE_LLM_FIRST_TOKEN_DELAY,
+                 token_delay=FAKE_LLM_TOKEN_DELAY, error_rate=0.0, rate_limit_rate=0.0,
+                 tail_rate=0.0, tail_latency=5.0, seed=None):
+        self.responder = FakeGroqClient(first_token_delay=0, token_delay=0)
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.random = random.Random(seed)
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "tail": 0}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip('/') == '/stats':
+                    self._send_json(200, server.stats)
+                else:
+                    self._send_json(404, {"error": {"message": "Not found"}})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    request = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    self._send_json(400, {"error": {"message": "Invalid JSON"}})
+                    return
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._send_json(404, {"error": {"message": "Not found"}})
+                    return
+                try:
+                    server.handle_completion(self, request)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up (e.g. its timeout fired) before the answer was sent
+                    self.close_connection = True
+
+        return Handler
+
+    def handle_completion(self, handler, request):
+        self.stats["requests"] += 1
+        roll = self.random.random()
+        if roll < self.error_rate:
+            self.stats["errors"] += 1
+            time.sleep(self.first_token_delay)
+            handler._send_json(500, {"error": {"message": "Injected server error", "type": "server_error"}})
+            return
+        if roll < self.error_rate + self.rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            handler._send_json(429, {"error": {"message": "Injected rate limit", "type": "rate_limit"}},
+                               headers={"Retry-After": "0"})
+            return
+
+        delay = self.first_token_delay
+        if self.random.random() < self.tail_rate:
+            self.stats["tail"] += 1
+            delay += self.tail_latency
+
+        model = request.get("model", "fake")
+        answer = self.responder.answer_for(request.get("messages") or [{"content": ""}])
+        tokens = self.responder._tokens(answer)
+        created = int(time.time())
+        if not request.get("stream"):
+            time.sleep(delay + self.token_delay * len(tokens))
+            handler._send_json(200, {
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": answer}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+            })
+            return
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Connection', 'close')
+        handler.end_headers()
+        time.sleep(delay)
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.token_delay)
+            chunk = {
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            handler.wfile.flush()
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+        handler.close_connection = True
+
+    def start(self):
+        """Serves in a background thread; returns the base URL"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Runs the fake OpenAI/Groq-compatible LLM server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--first-token-delay', type=float, default=FAKE_LLM_FIRST_TOKEN_DELAY)
+    parser.add_argument('--token-delay', type=float, default=FAKE_LLM_TOKEN_DELAY)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--tail-rate', type=float, default=0.0)
+    parser.add_argument('--tail-latency', type=float, default=5.0)
+    options = parser.parse_args()
+
+    fake_server = FakeLLMServer(
+        host=options.host, port=options.port, first_token_delay=options.first_token_delay,
+        token_delay=options.token_delay, error_rate=options.error_rate,
+        rate_limit_rate=options.rate_limit_rate, tail_rate=options.tail_rate,
+        tail_latency=options.tail_latency,
+    )
+    print(f"Fake LLM server listening on {fake_server.url}")
+    try:
+        fake_server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        fake_server.stop()
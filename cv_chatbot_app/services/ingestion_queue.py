@@ -0,0 +1,248 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from dotenv import load_dotenv
+from ..models import CV, IngestionJob
+from .cv_upload import (
+    MappedFile, choose_cv_storage, ingest_cv, validate_file_type, validate_upload_size,
+)
+
+# Load environment variables
+load_dotenv()
+
+# 'sync' processes uploads inside the request, 'queued' hands them to the workers
+CV_INGESTION_MODE = os.getenv('CV_INGESTION_MODE', 'sync')
+# Directory shared by the web and worker processes for uploaded files
+INGESTION_SPOOL_DIR = os.getenv(
+    'INGESTION_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'cv_ingestion')
+)
+INGESTION_MAX_ATTEMPTS = int(os.getenv('INGESTION_MAX_ATTEMPTS', '3'))
+INGESTION_RETRY_BACKOFF = float(os.getenv('INGESTION_RETRY_BACKOFF', '5'))  # seconds
+# Running jobs older than this are assumed to belong to a dead worker
+INGESTION_LEASE_SECONDS = int(os.getenv('INGESTION_LEASE_SECONDS', '600'))
+# Seconds between two sweeps of each worker for such jobs
+INGESTION_SWEEP_INTERVAL = float(os.getenv('INGESTION_SWEEP_INTERVAL', '60'))
+
+def use_ingestion_queue():
+    """Whether uploads are processed by the background queue by default"""
+    return CV_INGESTION_MODE == 'queued'
+
+def _spool_upload(file_obj):
+    """Copies the uploaded file to the spool directory and returns its path"""
+    os.makedirs(INGESTION_SPOOL_DIR, exist_ok=True)
+    extension = os.path.splitext(file_obj.name)[1].lower()
+    path = os.path.join(INGESTION_SPOOL_DIR, f"{uuid.uuid4().hex}{extension}")
+    with open(path, 'wb') as destination:
+        if hasattr(file_obj, 'chunks'):
+            for chunk in file_obj.chunks():
+                destination.write(chunk)
+        else:
+            shutil.copyfileobj(file_obj, destination)
+    return path
+
+def _remove_spooled_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def remove_cv_uploads(cv):
+    """Deletes the spooled files of a CV's ingestion jobs (when the CV is deleted)"""
+    for path in IngestionJob.objects.filter(cv=cv).values_list('file_path', flat=True):
+        _remove_spooled_file(path)
+
+def enqueue_cv(name, file_obj):
+    """Creates a pending CV and a queued ingestion job for it"""
+    validate_file_type(file_obj)
+    validate_upload_size(file_obj)
+    collection_name, storage_layout = choose_cv_storage()
+    file_path = _spool_upload(file_obj)
+
+    with transaction.atomic():
+        cv = CV.objects.create(
+            name=name,
+            qdrant_collection_name=collection_name,
+            storage_layout=storage_layout,
+            status=CV.STATUS_PENDING,
+            progress=0
+        )
+        job = IngestionJob.objects.create(
+            cv=cv,
+            file_path=file_path,
+            original_name=file_obj.name,
+            max_attempts=INGESTION_MAX_ATTEMPTS
+        )
+    return cv, job
+
+def claim_next_job():
+    """
+    Locks the oldest runnable job and marks it running.
+    Uses SELECT ... FOR UPDATE SKIP LOCKED so several workers can poll the same table.
+    """
+    with transaction.atomic():
+        job = (
+            IngestionJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=IngestionJob.STATUS_QUEUED, run_after__lte=timezone.now())
+            .order_by('run_after', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = IngestionJob.STATUS_RUNNING
+        job.attempts += 1
+        job.started_at = timezone.now()
+        job.stage_timings = {}
+        job.save(update_fields=['status', 'attempts', 'started_at', 'stage_timings', 'updated_at'])
+    CV.objects.filter(id=job.cv_id).update(status=CV.STATUS_PROCESSING, progress=0)
+    return job
+
+def requeue_stale_jobs():
+    """
+    Puts jobs left running by a crashed worker back in the queue, or marks
+    them failed and deletes their upload when they used their last attempt.
+    Returns (requeued, failed) counts.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=INGESTION_LEASE_SECONDS)
+    with transaction.atomic():
+        stale = list(
+            IngestionJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=IngestionJob.STATUS_RUNNING, started_at__lt=cutoff)
+        )
+        requeued = [job for job in stale if job.attempts < job.max_attempts]
+        failed = [job for job in stale if job.attempts >= job.max_attempts]
+        if requeued:
+            IngestionJob.objects.filter(id__in=[job.id for job in requeued]).update(
+                status=IngestionJob.STATUS_QUEUED, run_after=now
+            )
+            CV.objects.filter(id__in=[job.cv_id for job in requeued]).update(status=CV.STATUS_PENDING, progress=0)
+        if failed:
+            IngestionJob.objects.filter(id__in=[job.id for job in failed]).update(
+                status=IngestionJob.STATUS_FAILED, finished_at=now,
+                last_error=f"Worker lease of {INGESTION_LEASE_SECONDS}s expired on the last attempt"
+            )
+            CV.objects.filter(id__in=[job.cv_id for job in failed]).update(status=CV.STATUS_FAILED)
+    for job in failed:
+        print(f"Ingestion job {job.id} failed: worker lease expired (attempt {job.attempts})")
+        _remove_spooled_file(job.file_path)
+    return len(requeued), len(failed)
+
+def run_job(job):
+    """Processes one claimed job, scheduling a retry if it fails"""
+    cv = job.cv
+
+    def on_stage(stage, seconds, progress):
+        job.stage_timings[stage] = round(seconds, 4)
+        job.save(update_fields=['stage_timings', 'updated_at'])
+        CV.objects.filter(id=cv.id).update(progress=progress)
+
+    try:
+        with MappedFile(job.file_path, job.original_name) as file_obj:
+            ingest_cv(cv, file_obj, on_stage=on_stage)
+    except Exception as e:
+        print(f"Ingestion job {job.id} failed (attempt {job.attempts}): {str(e)}")
+        job.last_error = traceback.format_exc()
+        # ValueError means the document itself is unusable: retrying cannot help
+        if job.attempts < job.max_attempts and not isinstance(e, ValueError):
+            job.status = IngestionJob.STATUS_QUEUED
+            job.run_after = timezone.now() + timedelta(
+                seconds=INGESTION_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            )
+            CV.objects.filter(id=cv.id).update(status=CV.STATUS_PENDING, progress=0)
+        else:
+            job.status = IngestionJob.STATUS_FAILED
+            job.finished_at = timezone.now()
+            CV.objects.filter(id=cv.id).update(status=CV.STATUS_FAILED)
+            # No attempt left to read it
+            _remove_spooled_file(job.file_path)
+        job.save()
+        return False
+
+    job.status = IngestionJob.STATUS_SUCCEEDED
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at', 'updated_at'])
+    CV.objects.filter(id=cv.id).update(status=CV.STATUS_READY, progress=100)
+    _remove_spooled_file(job.file_path)
+    return True
+
+def run_worker(stop_event=None, poll_interval=1.0, once=False):
+    """
+    Polls the job table until stop_event is set (or the queue is empty when
+    once=True), sweeping for stale jobs every INGESTION_SWEEP_INTERVAL seconds
+    """
+    next_sweep = 0.0
+    while stop_event is None or not stop_event.is_set():
+        close_old_connections()
+        if time.monotonic() >= next_sweep:
+            requeue_stale_jobs()
+            next_sweep = time.monotonic() + INGESTION_SWEEP_INTERVAL
+        job = claim_next_job()
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+    close_old_connections()
+
+def run_worker_pool(workers=2, poll_interval=1.0, once=False):
+    """Runs several worker threads sharing this process's embedding model"""
+    stop_event = threading.Event()
+    threads = [
+        threading.Thread(
+            target=run_worker,
+            kwargs={"stop_event": stop_event, "poll_interval": poll_interval, "once": once},
+            name=f"ingestion-worker-{i}",
+            daemon=True
+        )
+        for i in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=0.5)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+
+def queue_stats(recent=100):
+    """Returns queue depth per status and average per-stage timings of recent jobs"""
+    counts = dict(
+        IngestionJob.objects.values_list('status').annotate(count=Count('id')).order_by()
+    )
+    oldest = IngestionJob.objects.filter(
+        status=IngestionJob.STATUS_QUEUED
+    ).aggregate(oldest=Min('created_at'))['oldest']
+
+    totals = {}
+    finished = IngestionJob.objects.filter(
+        status=IngestionJob.STATUS_SUCCEEDED
+    ).order_by('-finished_at').values_list('stage_timings', flat=True)[:recent]
+    for timings in finished:
+        for stage, seconds in timings.items():
+            total, count = totals.get(stage, (0.0, 0))
+            totals[stage] = (total + seconds, count + 1)
+
+    return {
+        "depth": counts.get(IngestionJob.STATUS_QUEUED, 0),
+        "running": counts.get(IngestionJob.STATUS_RUNNING, 0),
+        "succeeded": counts.get(IngestionJob.STATUS_SUCCEEDED, 0),
+        "failed": counts.get(IngestionJob.STATUS_FAILED, 0),
+        "oldest_queued_seconds": (timezone.now() - oldest).total_seconds() if oldest else 0,
+        "avg_stage_seconds": {
+            stage: round(total / count, 4) for stage, (total, count) in totals.items()
+        },
+    }
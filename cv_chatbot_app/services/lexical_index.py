@@ -0,0 +1,179 @@
+import os
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from django.db.models import Avg, Count, F
+from dotenv import load_dotenv
+from ..models import CVChunk, LexicalPosting, LexicalTerm
+from .tracing import traced
+
+# Load environment variables
+load_dotenv()
+
+# BM25 parameters
+BM25_K1 = float(os.getenv('BM25_K1', '1.2'))
+BM25_B = float(os.getenv('BM25_B', '0.75'))
+# Seconds the corpus statistics (chunk count, average length) are reused
+LEXICAL_STATS_TTL = float(os.getenv('LEXICAL_STATS_TTL', '60'))
+
+MAX_TERM_LENGTH = 64
+
+# Keeps tokens like "c++", "c#", "node.js", "az-104" and "ci/cd" whole
+_TOKEN_RE = re.compile(r"[a-z0-9](?:[a-z0-9+#./-]*[a-z0-9+#])?")
+
+STOP_WORDS = frozenset("""
+a an and are as at be been but by for from has have he her his i in is it its
+of on or our she that the their them they this to was we were what which who
+will with you your
+""".split())
+
+_stats = None
+_stats_at = 0.0
+_stats_lock = threading.Lock()
+
+def tokenize(text):
+    """Lowercased index terms of text, in order, without stop words"""
+    return [
+        token for token in _TOKEN_RE.findall(text.lower())
+        if token not in STOP_WORDS and len(token) <= MAX_TERM_LENGTH
+    ]
+
+def _term_ids(terms):
+    """Returns {term: id}, creating missing LexicalTerm rows"""
+    LexicalTerm.objects.bulk_create(
+        [LexicalTerm(term=term) for term in terms], ignore_conflicts=True
+    )
+    return dict(LexicalTerm.objects.filter(term__in=terms).values_list('term', 'id'))
+
+def _add_doc_freq(increments):
+    """Applies {term_id: delta} to LexicalTerm.doc_freq with one UPDATE per distinct delta"""
+    by_delta = defaultdict(list)
+    for term_id, delta in increments.items():
+        by_delta[delta].append(term_id)
+    for delta, term_ids in by_delta.items():
+        LexicalTerm.objects.filter(id__in=term_ids).update(doc_freq=F('doc_freq') + delta)
+
+def count_terms(chunk_records):
+    """
+    Tokenizes unsaved chunk records, setting their token_count, and returns
+    one Counter of terms per record.
+    """
+    counts = []
+    for record in chunk_records:
+        terms = Counter(tokenize(record.chunk_text))
+        record.token_count = sum(terms.values())
+        counts.append(terms)
+    return counts
+
+def index_chunks(chunk_records, term_counts):
+    """Adds saved chunks to the inverted index; term_counts comes from count_terms"""
+    vocabulary = set()
+    for terms in term_counts:
+        vocabulary.update(terms)
+    if not vocabulary:
+        return
+
+    term_ids = _term_ids(vocabulary)
+    postings = []
+    doc_freq = Counter()
+    for record, terms in zip(chunk_records, term_counts):
+        for term, freq in terms.items():
+            term_id = term_ids[term]
+            postings.append(LexicalPosting(
+                term_id=term_id, chunk_id=record.id, cv_id=record.cv_id,
+                term_freq=min(freq, 32767)
+            ))
+            doc_freq[term_id] += 1
+    LexicalPosting.objects.bulk_create(postings)
+    _add_doc_freq(doc_freq)
+
+def _remove_postings(postings):
+    """Deletes postings and decrements the document frequencies of their terms"""
+    doc_freq = dict(
+        postings.values_list('term_id').annotate(count=Count('id')).order_by()
+    )
+    if not doc_freq:
+        return
+    _add_doc_freq({term_id: -count for term_id, count in doc_freq.items()})
+    postings.delete()
+
+def remove_cv_from_index(cv):
+    """
+    Removes the CV's postings and decrements the document frequencies of its
+    terms. Call before the CV's chunks are deleted. Terms left with a zero
+    doc_freq are kept (and ignored by searches) so concurrent uploads never
+    lose a term row they are about to reference.
+    """
+    _remove_postings(LexicalPosting.objects.filter(cv_id=cv.id))
+
+def remove_chunks_from_index(chunk_ids):
+    """Like remove_cv_from_index, for some chunks only"""
+    _remove_postings(LexicalPosting.objects.filter(chunk_id__in=list(chunk_ids)))
+
+def corpus_stats():
+    """Returns (indexed chunk count, average chunk length), cached for LEXICAL_STATS_TTL"""
+    global _stats, _stats_at
+    with _stats_lock:
+        if _stats is None or time.monotonic() - _stats_at > LEXICAL_STATS_TTL:
+            stats = CVChunk.objects.filter(token_count__gt=0).aggregate(
+                count=Count('id'), avg_length=Avg('token_count')
+            )
+            _stats = (stats['count'], stats['avg_length'] or 1.0)
+            _stats_at = time.monotonic()
+        return _stats
+
+def bm25_scores(cv, query):
+    """Returns {chunk_id: BM25 score} for the chunks of the CV matching the query"""
+    terms = set(tokenize(query))
+    if not terms:
+        return {}
+    doc_freq = dict(
+        LexicalTerm.objects.filter(term__in=terms, doc_freq__gt=0).values_list('id', 'doc_freq')
+    )
+    if not doc_freq:
+        return {}
+
+    count, avg_length = corpus_stats()
+    # The cached count can lag behind new uploads; a term's df is always current
+    count = max(count, max(doc_freq.values()))
+    idf = {
+        term_id: math.log(1 + (count - df + 0.5) / (df + 0.5))
+        for term_id, df in doc_freq.items()
+    }
+
+    scores = defaultdict(float)
+    postings = LexicalPosting.objects.filter(
+        term_id__in=list(doc_freq), cv_id=cv.id
+    ).values_list('chunk_id', 'term_id', 'term_freq', 'chunk__token_count')
+    for chunk_id, term_id, freq, length in postings:
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+        scores[chunk_id] += idf[term_id] * freq * (BM25_K1 + 1) / (freq + norm)
+    return scores
+
+@traced('lexical_search')
+def lexical_search(cv, query, limit=5):
+    """
+    BM25 search over the CV's chunks. Returns ScoredPoint objects shaped like
+    the vector store results (id is the chunk's qdrant_point_id).
+    """
+    from qdrant_client.http import models as qdrant_models
+    scores = bm25_scores(cv, query)
+    top = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    chunks = CVChunk.objects.only(
+        'id', 'cv_id', 'chunk_index', 'chunk_text', 'qdrant_point_id'
+    ).in_bulk([chunk_id for chunk_id, _ in top])
+    return [
+        qdrant_models.ScoredPoint(
+            id=chunks[chunk_id].qdrant_point_id,
+            version=0,
+            score=score,
+            payload={
+                "text": chunks[chunk_id].chunk_text,
+                "chunk_index": chunks[chunk_id].chunk_index,
+                "cv_id": chunks[chunk_id].cv_id,
+            }
+        )
+        for chunk_id, score in top if chunk_id in chunks
+    ]
@@ -0,0 +1,392 @@
+import os
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Seconds allowed for one LLM request, and for a call including its retries
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '20'))
+LLM_DEADLINE = float(os.getenv('LLM_DEADLINE', '45'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+# Full-jitter exponential backoff between retries, in seconds
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', '0.25'))
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', '4'))
+# Send a second, hedged request when the first has not answered after this
+# many seconds (0 disables hedging)
+LLM_HEDGE_AFTER = float(os.getenv('LLM_HEDGE_AFTER', '0'))
+# LLM requests in flight per process, and how long a call waits for a slot
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', '5'))
+# Consecutive failures that open the circuit, and seconds before a trial call
+LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', '5'))
+LLM_BREAKER_RESET = float(os.getenv('LLM_BREAKER_RESET', '30'))
+
+class LLMError(Exception):
+    """An LLM call failed; status_code is the HTTP status to answer with"""
+    status_code = 502
+
+class LLMTimeoutError(LLMError):
+    status_code = 504
+
+class LLMUnavailableError(LLMError):
+    """The call was not attempted: circuit open or no free concurrency slot"""
+    status_code = 503
+
+def is_retryable(error):
+    """Timeouts, connection errors, rate limiting and 5xx responses are worth retrying"""
+    if isinstance(error, (LLMTimeoutError, TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    # groq.APIConnectionError / APITimeoutError, without importing groq here
+    if type(error).__name__ in ('APIConnectionError', 'APITimeoutError'):
+        return True
+    status_code = getattr(error, 'status_code', None)
+    return status_code == 429 or (isinstance(status_code, int) and status_code >= 500)
+
+def _as_llm_error(error):
+    if isinstance(error, LLMError):
+        return error
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError)) or type(error).__name__ == 'APITimeoutError':
+        return LLMTimeoutError(f"LLM request timed out: {error}")
+    return LLMError(f"LLM request failed: {error}")
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for
+    `reset_after` seconds, then lets a single trial call through (half-open):
+    its success closes the circuit, its failure opens it again. A trial that
+    ends without either (stream closed early, task cancelled) is released so
+    the next call becomes the trial.
+    """
+    def __init__(self, threshold=LLM_BREAKER_THRESHOLD, reset_after=LLM_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._trial = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """
+        Returns False when the call is rejected, else a token to pass to
+        release() once the call is over, however it ended
+        """
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                self._trial = object()
+                return self._trial
+            return False
+
+    def release(self, token):
+        """Frees the trial slot of a call whose outcome was never recorded"""
+        with self._lock:
+            if token is not None and token is self._trial:
+                self._trial = None
+                self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+class LLMGateway:
+    """
+    Runs chat completions against one OpenAI-style client with a deadline per
+    call, retries with jittered backoff, optional hedged requests, a
+    process-wide concurrency cap and a circuit breaker. Failures raise
+    LLMError subclasses. Blocking and async calls (from any thread or event
+    loop) share the same max_concurrency slots.
+
+    get_client/get_async_client return the (shared) clients to use; they are
+    called per request so clients can be swapped, e.g. by set_llm_client.
+    """
+    def __init__(self, get_client, get_async_client=None, name='llm', timeout=LLM_TIMEOUT,
+                 deadline=LLM_DEADLINE, max_retries=LLM_MAX_RETRIES, hedge_after=LLM_HEDGE_AFTER,
+                 max_concurrency=LLM_MAX_CONCURRENCY, queue_timeout=LLM_QUEUE_TIMEOUT, breaker=None):
+        self.get_client = get_client
+        self.get_async_client = get_async_client
+        self.name = name
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.hedge_after = hedge_after
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "retries": 0, "hedges": 0,
+                      "hedge_wins": 0, "rejected": 0, "timeouts": 0}
+
+    # Shared helpers
+
+    def _backoff(self, attempt, remaining):
+        delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+        return min(delay, max(0.0, remaining))
+
+    def _check_breaker(self):
+        """Returns the breaker token to release when the call ends"""
+        token = self.breaker.allow()
+        if not token:
+            self.stats["rejected"] += 1
+            raise LLMUnavailableError(f"{self.name}: circuit open after repeated failures")
+        return token
+
+    def _finish(self, error=None):
+        if error is None:
+            self.stats["successes"] += 1
+            self.breaker.record_success()
+            return
+        self.stats["failures"] += 1
+        if isinstance(error, LLMTimeoutError):
+            self.stats["timeouts"] += 1
+        # Only upstream trouble opens the circuit, not e.g. a rejected prompt
+        if is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def get_stats(self):
+        return dict(self.stats, name=self.name, circuit=self.breaker.state,
+                    consecutive_failures=self.breaker.failures, max_concurrency=self.max_concurrency)
+
+    # Blocking calls
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # Room for the hedged requests and for slow losers still finishing
+                self._pool = ThreadPoolExecutor(max_workers=2 * self.max_concurrency,
+                                                thread_name_prefix=f'{self.name}-llm')
+            return self._pool
+
+    def _request(self, model, messages, timeout):
+        completion = self.get_client().chat.completions.create(
+            model=model, messages=messages, timeout=timeout
+        )
+        return completion.choices[0].message.content.strip()
+
+    def _attempt(self, model, messages, timeout):
+        """One attempt, hedged with a second request if the first is slow"""
+        if not self.hedge_after or self.hedge_after >= timeout:
+            return self._request(model, messages, timeout)
+
+        pool = self._get_pool()
+        primary = pool.submit(self._request, model, messages, timeout)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        # Only hedge when a spare slot is free, so hedging cannot exceed the cap
+        if done or not self._slots.acquire(blocking=False):
+            return primary.result()
+
+        self.stats["hedges"] += 1
+        hedge = pool.submit(self._request, model, messages, timeout - self.hedge_after)
+        hedge.add_done_callback(lambda _: self._slots.release())
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self.stats["hedge_wins"] += 1
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def complete(self, model, messages):
+        """Returns the answer text, or raises LLMError"""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.stats["rejected"] += 1
+            raise LLMUnavailableError(f"{self.name}: too many LLM requests in flight")
+        token = None
+        try:
+            token = self._check_breaker()
+            self.stats["calls"] += 1
+            deadline = time.monotonic() + self.deadline
+            attempt = 0
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        raise LLMTimeoutError(f"{self.name}: deadline of {self.deadline}s exceeded")
+                    answer = self._attempt(model, messages, min(self.timeout, remaining))
+                    self._finish()
+                    return answer
+                except Exception as e:
+                    error = _as_llm_error(e)
+                    retry = attempt < self.max_retries and is_retryable(e) and remaining > 0
+                    if not retry:
+                        self._finish(error)
+                        raise error from e
+                    print(f"{self.name} call failed (attempt {attempt + 1}), retrying: {str(e)}")
+                    self.stats["retries"] += 1
+                    time.sleep(self._backoff(attempt, deadline - time.monotonic()))
+                    attempt += 1
+        finally:
+            self.breaker.release(token)
+            self._slots.release()
+
+    def stream(self, model, messages):
+        """
+        Yields answer deltas. Retries apply until the stream is opened; an
+        error after the first delta is raised as LLMError.
+        """
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.stats["rejected"] += 1
+            raise LLMUnavailableError(f"{self.name}: too many LLM requests in flight")
+        token = None
+        try:
+            token = self._check_breaker()
+            self.stats["calls"] += 1
+            deadline = time.monotonic() + self.deadline
+            attempt = 0
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        raise LLMTimeoutError(f"{self.name}: deadline of {self.deadline}s exceeded")
+                    chunks = self.get_client().chat.completions.create(
+                        model=model, messages=messages, stream=True, timeout=min(self.timeout, remaining)
+                    )
+                    break
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_retryable(e) or remaining <= 0:
+                        error = _as_llm_error(e)
+                        self._finish(error)
+                        raise error from e
+                    self.stats["retries"] += 1
+                    time.sleep(self._backoff(attempt, deadline - time.monotonic()))
+                    attempt += 1
+
+            try:
+                for chunk in chunks:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        yield delta
+            except Exception as e:
+                error = _as_llm_error(e)
+                self._finish(error)
+                raise error from e
+            self._finish()
+        finally:
+            # Also reached when the consumer closes the stream early (GeneratorExit)
+            self.breaker.release(token)
+            self._slots.release()
+
+    # Async calls
+
+    async def _aacquire_slot(self):
+        """
+        Takes one of the slots the blocking calls use. The thread semaphore
+        cannot be awaited, so it is polled with a growing sleep, without
+        blocking the event loop, until queue_timeout.
+        """
+        deadline = time.monotonic() + self.queue_timeout
+        delay = 0.001
+        while not self._slots.acquire(blocking=False):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        return True
+
+    async def _arequest(self, model, messages, timeout):
+        completion = await asyncio.wait_for(
+            self.get_async_client().chat.completions.create(
+                model=model, messages=messages, timeout=timeout
+            ),
+            timeout
+        )
+        return completion.choices[0].message.content.strip()
+
+    async def _aattempt(self, model, messages, timeout):
+        if not self.hedge_after or self.hedge_after >= timeout:
+            return await self._arequest(model, messages, timeout)
+
+        primary = asyncio.ensure_future(self._arequest(model, messages, timeout))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        # Only hedge when a spare slot is free, as in _attempt
+        if not self._slots.acquire(blocking=False):
+            return await primary
+
+        self.stats["hedges"] += 1
+        hedge = asyncio.ensure_future(self._arequest(model, messages, timeout - self.hedge_after))
+        hedge.add_done_callback(lambda _: self._slots.release())
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            # The slower request is no longer needed
+            for task in pending:
+                task.cancel()
+
+    async def acomplete(self, model, messages):
+        """Async variant of complete using the async client"""
+        if not await self._aacquire_slot():
+            self.stats["rejected"] += 1
+            raise LLMUnavailableError(f"{self.name}: too many LLM requests in flight")
+        token = None
+        try:
+            token = self._check_breaker()
+            self.stats["calls"] += 1
+            deadline = time.monotonic() + self.deadline
+            attempt = 0
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        raise LLMTimeoutError(f"{self.name}: deadline of {self.deadline}s exceeded")
+                    answer = await self._aattempt(model, messages, min(self.timeout, remaining))
+                    self._finish()
+                    return answer
+                except Exception as e:
+                    error = _as_llm_error(e)
+                    retry = attempt < self.max_retries and is_retryable(e) and remaining > 0
+                    if not retry:
+                        self._finish(error)
+                        raise error from e
+                    print(f"{self.name} call failed (attempt {attempt + 1}), retrying: {str(e)}")
+                    self.stats["retries"] += 1
+                    await asyncio.sleep(self._backoff(attempt, deadline - time.monotonic()))
+                    attempt += 1
+        finally:
+            # Also reached when the task is cancelled
+            self.breaker.release(token)
+            self._slots.release()
@@ -0,0 +1,313 @@
+import os
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+from .async_clients import LoopBoundClient
+from .llm_gateway import LLMGateway, LLMError, LLM_TIMEOUT, LLM_DEADLINE
+from .metrics import get_histogram
+
+# Load environment variables
+load_dotenv()
+
+LLM_ROUTING_POLICIES = ('priority', 'latency', 'cost')
+# 'priority' tries providers in LLM_PROVIDERS order, 'latency' fastest first
+# (moving average of recent calls), 'cost' cheapest first
+LLM_ROUTING_POLICY = os.getenv('LLM_ROUTING_POLICY', 'priority')
+# Providers whose average latency exceeds this many seconds are tried after
+# the others, whatever the policy (0 disables)
+LLM_LATENCY_BUDGET = float(os.getenv('LLM_LATENCY_BUDGET', '0'))
+# Seconds after which a provider demoted as slow is tried first again, to re-measure it
+LLM_SLOW_PROBE_INTERVAL = float(os.getenv('LLM_SLOW_PROBE_INTERVAL', '30'))
+# Weight of the latest call in the latency moving average
+LLM_LATENCY_EWMA_ALPHA = float(os.getenv('LLM_LATENCY_EWMA_ALPHA', '0.2'))
+# Routing decisions kept for the stats endpoint
+LLM_RECENT_DECISIONS = int(os.getenv('LLM_RECENT_DECISIONS', '50'))
+
+LLM_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+def provider_setting(name, key, default=None):
+    """Reads LLM_<NAME>_<KEY>, e.g. LLM_OPENAI_BASE_URL"""
+    return os.getenv(f"LLM_{name.upper()}_{key}", default)
+
+class LLMAnswer:
+    """An answer and the provider that produced it"""
+    def __init__(self, text, provider, model, latency, fallback=False, cacheable=True):
+        self.text = text
+        self.provider = provider
+        self.model = model
+        self.latency = latency
+        # True when a preferred provider failed before this one answered
+        self.fallback = fallback
+        self.cacheable = cacheable
+
+class LLMProvider:
+    """
+    A model served through an LLMGateway, with its routing cost and the
+    latency observed for it. cacheable is False for providers whose answers
+    must not be reused from the answer cache (the local fallback).
+    """
+    def __init__(self, name, model, gateway, cost=1.0, cacheable=True):
+        self.name = name
+        self.model = model
+        self.gateway = gateway
+        self.cost = cost
+        self.cacheable = cacheable
+        self.latency = get_histogram(
+            'llm_latency_seconds', 'Latency of successful completions per provider', LLM_LATENCY_BUCKETS,
+            labels={"provider": name}
+        )
+        self.average_latency = None
+        self.last_routed = 0.0
+        self.stats = {"routed": 0, "answered": 0, "failed": 0, "fallback_answers": 0}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        self.latency.observe(seconds)
+        with self._lock:
+            if self.average_latency is None:
+                self.average_latency = seconds
+            else:
+                self.average_latency += LLM_LATENCY_EWMA_ALPHA * (seconds - self.average_latency)
+
+    def is_open(self):
+        return self.gateway.breaker.state == 'open'
+
+    def is_slow(self, latency_budget, probe_interval, now):
+        if not latency_budget or self.average_latency is None:
+            return False
+        # Give slow providers a request now and then so their average can recover
+        return self.average_latency > latency_budget and now - self.last_routed < probe_interval
+
+    def get_stats(self):
+        return dict(
+            self.stats, model=self.model, cost=self.cost, cacheable=self.cacheable,
+            average_latency=round(self.average_latency, 4) if self.average_latency is not None else None,
+            latency=self.latency.summary(), gateway=self.gateway.get_stats(),
+        )
+
+class LLMRouter:
+    """
+    Sends each completion to the best provider under the routing policy and
+    falls back to the next one when it fails. Providers with an open circuit
+    or (with a latency budget) a slow average are tried last.
+    """
+    def __init__(self, providers, policy=LLM_ROUTING_POLICY, latency_budget=LLM_LATENCY_BUDGET,
+                 probe_interval=LLM_SLOW_PROBE_INTERVAL):
+        if not providers:
+            raise ValueError("At least one LLM provider is required")
+        if policy not in LLM_ROUTING_POLICIES:
+            raise ValueError(f"Unknown routing policy: {policy}. Use one of {', '.join(LLM_ROUTING_POLICIES)}")
+        self.providers = list(providers)
+        self.policy = policy
+        self.latency_budget = latency_budget
+        self.probe_interval = probe_interval
+        self.recent = deque(maxlen=LLM_RECENT_DECISIONS)
+        self.stats = {"requests": 0, "fallbacks": 0, "failures": 0}
+
+    @property
+    def model_id(self):
+        """Identifies the models whose answers may be cached"""
+        return '+'.join(provider.model for provider in self.providers if provider.cacheable)
+
+    def route(self):
+        """Returns the providers in the order they should be tried"""
+        now = time.monotonic()
+        priority = {provider.name: i for i, provider in enumerate(self.providers)}
+
+        def key(provider):
+            if self.policy == 'latency':
+                # Unmeasured providers first, so every provider gets measured
+                preference = provider.average_latency or 0.0
+            elif self.policy == 'cost':
+                preference = provider.cost
+            else:
+                preference = 0
+            demoted = provider.is_open() or provider.is_slow(self.latency_budget, self.probe_interval, now)
+            return (demoted, preference, priority[provider.name])
+
+        return sorted(self.providers, key=key)
+
+    def _record(self, order, provider=None, failed=(), latency=None):
+        self.stats["requests"] += 1
+        if provider is None:
+            self.stats["failures"] += 1
+        elif failed:
+            self.stats["fallbacks"] += 1
+        self.recent.append({
+            "at": time.time(),
+            "policy": self.policy,
+            "order": [candidate.name for candidate in order],
+            "provider": provider.name if provider else None,
+            "failed": list(failed),
+            "latency": round(latency, 4) if latency is not None else None,
+        })
+
+    def _answered(self, order, provider, failed, started, text):
+        latency = time.monotonic() - started
+        provider.observe(latency)
+        provider.stats["answered"] += 1
+        if failed:
+            provider.stats["fallback_answers"] += 1
+        self._record(order, provider, failed, latency)
+        return LLMAnswer(text, provider.name, provider.model, latency,
+                         fallback=bool(failed), cacheable=provider.cacheable)
+
+    def _failed(self, provider, error, failed):
+        print(f"LLM provider {provider.name} failed: {str(error)}")
+        provider.stats["failed"] += 1
+        failed.append(provider.name)
+
+    def complete(self, messages):
+        """Returns an LLMAnswer, or raises the last provider's LLMError"""
+        order = self.route()
+        failed = []
+        error = None
+        for provider in order:
+            provider.stats["routed"] += 1
+            provider.last_routed = time.monotonic()
+            started = time.monotonic()
+            try:
+                text = provider.gateway.complete(provider.model, messages)
+            except LLMError as e:
+                self._failed(provider, e, failed)
+                error = e
+                continue
+            return self._answered(order, provider, failed, started, text)
+        self._record(order, failed=failed)
+        raise error
+
+    async def acomplete(self, messages):
+        """Async variant of complete"""
+        order = self.route()
+        failed = []
+        error = None
+        for provider in order:
+            provider.stats["routed"] += 1
+            provider.last_routed = time.monotonic()
+            started = time.monotonic()
+            try:
+                text = await provider.gateway.acomplete(provider.model, messages)
+            except LLMError as e:
+                self._failed(provider, e, failed)
+                error = e
+                continue
+            return self._answered(order, provider, failed, started, text)
+        self._record(order, failed=failed)
+        raise error
+
+    def stream(self, messages):
+        return StreamedAnswer(self, messages)
+
+    def get_stats(self):
+        return dict(
+            self.stats,
+            policy=self.policy,
+            latency_budget=self.latency_budget,
+            route=[provider.name for provider in self.route()],
+            providers={provider.name: provider.get_stats() for provider in self.providers},
+            recent=list(self.recent),
+        )
+
+class StreamedAnswer:
+    """
+    Iterator of answer deltas from the routed provider. A provider failing
+    before its first delta is replaced by the next one; provider, model and
+    cacheable are set once a provider has started answering.
+    """
+    def __init__(self, router, messages):
+        self.router = router
+        self.messages = messages
+        self.provider = None
+        self.model = None
+        self.fallback = False
+        self.cacheable = False
+        self._deltas = self._generate()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._deltas)
+
+    def _generate(self):
+        router = self.router
+        order = router.route()
+        failed = []
+        error = None
+        for provider in order:
+            provider.stats["routed"] += 1
+            provider.last_routed = time.monotonic()
+            started = time.monotonic()
+            deltas = provider.gateway.stream(provider.model, self.messages)
+            try:
+                first = next(deltas, None)
+            except LLMError as e:
+                router._failed(provider, e, failed)
+                error = e
+                continue
+
+            self.provider, self.model = provider.name, provider.model
+            self.fallback, self.cacheable = bool(failed), provider.cacheable
+            if first is not None:
+                yield first
+                yield from deltas
+            router._answered(order, provider, failed, started, None)
+            return
+        router._record(order, failed=failed)
+        raise error
+
+
+class _OpenAICompatibleClients:
+    """Process-wide sync client and per-event-loop async client for one endpoint"""
+    def __init__(self, base_url, api_key, timeout):
+        self.options = {"base_url": base_url, "api_key": api_key, "timeout": timeout}
+        self._client = None
+        self._client_pid = None
+        self._async_client = LoopBoundClient(self._build_async_client)
+        self._lock = threading.Lock()
+
+    def get(self):
+        from .openai_compatible import OpenAICompatibleClient
+        with self._lock:
+            if self._client is None or self._client_pid != os.getpid():
+                self._client = OpenAICompatibleClient(**self.options)
+                self._client_pid = os.getpid()
+            return self._client
+
+    def _build_async_client(self):
+        from .openai_compatible import AsyncOpenAICompatibleClient
+        return AsyncOpenAICompatibleClient(**self.options)
+
+    def aget(self):
+        return self._async_client.get()[0]
+
+def _gateway_options(name):
+    return {
+        "timeout": float(provider_setting(name, 'TIMEOUT', LLM_TIMEOUT)),
+        "deadline": float(provider_setting(name, 'DEADLINE', LLM_DEADLINE)),
+    }
+
+def provider_from_env(name):
+    """
+    Builds the 'local' provider (see local_llm) or an OpenAI-compatible one
+    configured by LLM_<NAME>_BASE_URL, _API_KEY, _MODEL, _COST, _TIMEOUT and
+    _DEADLINE.
+    """
+    if name == 'local':
+        from .local_llm import LocalLLMClient, AsyncLocalLLMClient, LOCAL_LLM_MODEL
+        client, async_client = LocalLLMClient(), AsyncLocalLLMClient()
+        # Nothing to retry or hedge on a local model
+        gateway = LLMGateway(lambda: client, lambda: async_client, name=name, max_retries=0,
+                             hedge_after=0, **_gateway_options(name))
+        return LLMProvider(name, LOCAL_LLM_MODEL or 'extractive', gateway,
+                           cost=float(provider_setting(name, 'COST', '0')), cacheable=False)
+
+    base_url = provider_setting(name, 'BASE_URL')
+    model = provider_setting(name, 'MODEL')
+    if not base_url or not model:
+        raise ValueError(f"LLM provider {name} needs LLM_{name.upper()}_BASE_URL and LLM_{name.upper()}_MODEL")
+    options = _gateway_options(name)
+    clients = _OpenAICompatibleClients(base_url, provider_setting(name, 'API_KEY'), options["timeout"])
+    gateway = LLMGateway(clients.get, clients.aget, name=name, **options)
+    return LLMProvider(name, model, gateway, cost=float(provider_setting(name, 'COST', '1')))
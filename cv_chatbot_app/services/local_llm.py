@@ -0,0 +1,133 @@
+import os
+import asyncio
+import math
+import threading
+from collections import Counter
+from types import SimpleNamespace
+from dotenv import load_dotenv
+from .lexical_index import tokenize
+from .text import iter_sentences
+
+# Load environment variables
+load_dotenv()
+
+# Hugging Face causal LM run on CPU; empty uses the extractive answerer,
+# which needs no model download
+LOCAL_LLM_MODEL = os.getenv('LOCAL_LLM_MODEL', '')
+LOCAL_LLM_MAX_NEW_TOKENS = int(os.getenv('LOCAL_LLM_MAX_NEW_TOKENS', '256'))
+# Sentences quoted by the extractive answerer
+LOCAL_LLM_MAX_SENTENCES = int(os.getenv('LOCAL_LLM_MAX_SENTENCES', '3'))
+
+NOT_MENTIONED = "The CV does not mention this."
+
+_model = None
+_tokenizer = None
+# One generation at a time: the model already uses every CPU core
+_generate_lock = threading.Lock()
+
+def split_prompt(messages):
+    """Returns (CV text, question) from the messages built by ai_service.build_messages"""
+    content = messages[-1]["content"]
+    context, _, question = content.rpartition("\n\nQ: ")
+    if context.startswith("CV:\n"):
+        context = context[len("CV:\n"):]
+    return context, question.rsplit("\nA:", 1)[0].strip()
+
+def _terms(text):
+    # Crude plural folding so "certifications" matches "certification"
+    return {
+        term[:-1] if len(term) > 3 and term.endswith('s') and not term.endswith('ss') else term
+        for term in tokenize(text)
+    }
+
+def extractive_answer(context, question, max_sentences=LOCAL_LLM_MAX_SENTENCES):
+    """
+    Answers with the CV sentences sharing the most (IDF-weighted) terms with
+    the question, in CV order.
+    """
+    # Chunks are split separately so sentences never run across them
+    sentences = [
+        sentence.strip() for chunk in context.split("\n\n")
+        for sentence in iter_sentences([chunk]) if sentence.strip()
+    ]
+    terms = _terms(question)
+    if not sentences or not terms:
+        return NOT_MENTIONED
+
+    sentence_terms = [_terms(sentence) for sentence in sentences]
+    doc_freq = Counter(term for found in sentence_terms for term in found & terms)
+    scores = [
+        sum(math.log(1 + len(sentences) / doc_freq[term]) for term in found & terms)
+        for found in sentence_terms
+    ]
+    best = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])
+    if not best:
+        return NOT_MENTIONED
+    return ' '.join(sentences[i] for i in sorted(best[:max_sentences]))
+
+def _load_model():
+    global _model, _tokenizer
+    if _model is None:
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        _tokenizer = AutoTokenizer.from_pretrained(LOCAL_LLM_MODEL)
+        _model = AutoModelForCausalLM.from_pretrained(LOCAL_LLM_MODEL)
+        _model.eval()
+    return _model, _tokenizer
+
+def _generate(messages, streamer=None):
+    import torch
+    model, tokenizer = _load_model()
+    inputs = tokenizer.apply_chat_template(
+        messages, add_generation_prompt=True, return_tensors='pt', return_dict=True
+    )
+    with _generate_lock, torch.inference_mode():
+        output = model.generate(
+            **inputs, max_new_tokens=LOCAL_LLM_MAX_NEW_TOKENS, do_sample=False, streamer=streamer
+        )
+    return tokenizer.decode(output[0][inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+
+def _words(text):
+    words = text.split(' ')
+    return [word if i == 0 else ' ' + word for i, word in enumerate(words)]
+
+class LocalLLMClient:
+    """
+    CPU-only stand-in for a remote LLM with the client.chat.completions.create()
+    interface of the groq client. Runs LOCAL_LLM_MODEL with transformers, or
+    the extractive answerer when no model is configured.
+    """
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def answer(self, messages):
+        if not LOCAL_LLM_MODEL:
+            return extractive_answer(*split_prompt(messages))
+        return _generate(messages)
+
+    def _create(self, model, messages, stream=False, **kwargs):
+        if stream:
+            return self._stream(messages)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.answer(messages)))]
+        )
+
+    def _stream(self, messages):
+        if LOCAL_LLM_MODEL:
+            from transformers import TextIteratorStreamer
+            streamer = TextIteratorStreamer(_load_model()[1], skip_prompt=True, skip_special_tokens=True)
+            threading.Thread(target=_generate, args=(messages, streamer), daemon=True).start()
+            deltas = streamer
+        else:
+            deltas = _words(extractive_answer(*split_prompt(messages)))
+        for delta in deltas:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+
+class AsyncLocalLLMClient(LocalLLMClient):
+    """Async counterpart of LocalLLMClient; generation runs in a worker thread"""
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._acreate))
+
+    async def _acreate(self, model, messages, **kwargs):
+        answer = await asyncio.to_thread(self.answer, messages)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=answer))])
@@ -0,0 +1,290 @@
+import os
+import re
+import glob
+import json
+import atexit
+import threading
+import time
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Directory shared by the worker processes of one server. When set, every
+# process writes its metrics to a file there and the exposition merges the
+# files of all processes, so a scrape covers the whole server and not just the
+# worker that answered it. It must be emptied when the server starts
+# (gunicorn.conf.py does).
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', '')
+# Seconds between two writes of a process's metrics file
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '1.0'))
+
+# Default latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Thread-safe cumulative histogram of observed values"""
+    kind = 'histogram'
+
+    def __init__(self, name, description='', buckets=DEFAULT_BUCKETS, labels=None):
+        self.name = name
+        self.description = description
+        self.labels = dict(labels or {})
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * len(self.buckets)
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._count += 1
+            self._sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+
+    def state(self):
+        with self._lock:
+            return {"buckets": list(self.buckets), "counts": list(self._counts), "count": self._count, "sum": self._sum}
+
+    def merge(self, state):
+        """Adds the state of the same histogram in another process"""
+        if tuple(state["buckets"]) != self.buckets:
+            print(f"Skipping {self.name} from another process: its buckets differ")
+            return
+        with self._lock:
+            self._counts = [mine + theirs for mine, theirs in zip(self._counts, state["counts"])]
+            self._count += state["count"]
+            self._sum += state["sum"]
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._counts = [0] * len(self.buckets)
+        self._count = 0
+        self._sum = 0.0
+
+    def summary(self):
+        with self._lock:
+            return {
+                "count": self._count,
+                "sum": round(self._sum, 6),
+                "avg": round(self._sum / self._count, 6) if self._count else 0.0,
+                "buckets": {str(bound): count for bound, count in zip(self.buckets, self._counts)},
+            }
+
+    def samples(self):
+        """Returns (suffix, extra labels, value) tuples in the Prometheus layout"""
+        with self._lock:
+            counts, count, total = list(self._counts), self._count, self._sum
+        samples = [('_bucket', {"le": _format_value(bound)}, value) for bound, value in zip(self.buckets, counts)]
+        samples.append(('_bucket', {"le": "+Inf"}, count))
+        samples.append(('_sum', {}, total))
+        samples.append(('_count', {}, count))
+        return samples
+
+class Counter:
+    """Thread-safe monotonically increasing counter"""
+    kind = 'counter'
+
+    def __init__(self, name, description='', labels=None):
+        self.name = name
+        self.description = description
+        self.labels = dict(labels or {})
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        with self._lock:
+            return self._value
+
+    def state(self):
+        return {"value": self.value}
+
+    def merge(self, state):
+        """Adds the state of the same counter in another process"""
+        self.inc(state["value"])
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._value = 0.0
+
+    def samples(self):
+        return [('', {}, self.value)]
+
+# Metrics by (name, labels); one name may hold several label sets of one kind
+_metrics = {}
+_registry_lock = threading.Lock()
+
+def _register(metric_class, name, labels, **options):
+    key = (name, tuple(sorted((labels or {}).items())))
+    with _registry_lock:
+        metric = _metrics.get(key)
+        if metric is None:
+            metric = metric_class(name, labels=labels, **options)
+            _metrics[key] = metric
+        elif not isinstance(metric, metric_class):
+            raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+        _start_flusher()
+        return metric
+
+def get_histogram(name, description='', buckets=DEFAULT_BUCKETS, labels=None):
+    """Returns the histogram registered under name and labels, creating it on first use"""
+    return _register(Histogram, name, labels, description=description, buckets=buckets)
+
+def get_counter(name, description='', labels=None):
+    """Returns the counter registered under name and labels, creating it on first use"""
+    return _register(Counter, name, labels, description=description)
+
+def _registered():
+    with _registry_lock:
+        return list(_metrics.values())
+
+def _metrics_file(pid):
+    return os.path.join(METRICS_MULTIPROC_DIR, f'metrics_{pid}.json')
+
+def _entry(metric):
+    return {"name": metric.name, "kind": metric.kind, "description": metric.description,
+            "labels": metric.labels, **metric.state()}
+
+def _flush():
+    """Writes this process's metrics to its file in METRICS_MULTIPROC_DIR"""
+    global _last_flushed
+    data = json.dumps([_entry(metric) for metric in _registered()])
+    if data == _last_flushed:
+        return
+    path = _metrics_file(os.getpid())
+    try:
+        with open(path + '.tmp', 'w') as f:
+            f.write(data)
+        # Readers never see a half-written file
+        os.replace(path + '.tmp', path)
+        _last_flushed = data
+    except OSError as e:
+        print(f"Error writing metrics file: {str(e)}")
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        _flush()
+
+_flusher_pid = None
+_last_flushed = None
+
+def _start_flusher():
+    global _flusher_pid
+    if not METRICS_MULTIPROC_DIR or _flusher_pid == os.getpid():
+        return
+    _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+
+def _after_fork_in_child():
+    # The child starts from zero: what the parent observed is in the parent's file
+    global _registry_lock, _last_flushed
+    _registry_lock = threading.Lock()
+    _last_flushed = None
+    for metric in _metrics.values():
+        metric.reset()
+    if _metrics:
+        _start_flusher()
+
+if METRICS_MULTIPROC_DIR:
+    os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+    atexit.register(_flush)
+
+def _collected():
+    """
+    Returns the registered metrics, merged with the files the other processes
+    wrote to METRICS_MULTIPROC_DIR (including processes that have exited,
+    whose counts still belong to the totals)
+    """
+    metrics = _registered()
+    if not METRICS_MULTIPROC_DIR:
+        return metrics
+
+    merged = {}
+    def add(entry):
+        key = (entry["name"], tuple(sorted(entry["labels"].items())))
+        metric = merged.get(key)
+        if metric is None:
+            metric_class = Histogram if entry["kind"] == Histogram.kind else Counter
+            options = {"buckets": entry["buckets"]} if metric_class is Histogram else {}
+            metric = metric_class(entry["name"], entry["description"], labels=entry["labels"], **options)
+            merged[key] = metric
+        elif metric.kind != entry["kind"]:
+            return
+        metric.merge(entry)
+
+    for metric in metrics:
+        add(_entry(metric))
+    own_file = _metrics_file(os.getpid())
+    for path in sorted(glob.glob(os.path.join(METRICS_MULTIPROC_DIR, 'metrics_*.json'))):
+        if path == own_file:
+            continue
+        try:
+            with open(path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for entry in entries:
+            add(entry)
+    return list(merged.values())
+
+def _display_name(metric):
+    if not metric.labels:
+        return metric.name
+    return metric.name + '{' + ','.join(f'{key}={value}' for key, value in sorted(metric.labels.items())) + '}'
+
+def histogram_summaries():
+    """Returns a summary of every registered histogram"""
+    return {_display_name(metric): metric.summary() for metric in _collected() if isinstance(metric, Histogram)}
+
+def counter_values():
+    """Returns the value of every registered counter"""
+    return {_display_name(metric): metric.value for metric in _collected() if isinstance(metric, Counter)}
+
+def _format_value(value):
+    value = float(value)
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if value.is_integer() and abs(value) < 1e15 else repr(value)
+
+def _metric_name(name):
+    return re.sub(r'[^a-zA-Z0-9_:]', '_', name)
+
+def _escape(text, quote=False):
+    text = text.replace('\\', '\\\\').replace('\n', '\\n')
+    return text.replace('"', '\\"') if quote else text
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    pairs = (f'{_metric_name(key)}="{_escape(str(value), quote=True)}"' for key, value in labels.items())
+    return '{' + ','.join(pairs) + '}'
+
+def render_prometheus():
+    """
+    Renders every registered metric in the Prometheus text exposition format,
+    summed over the processes of the server when METRICS_MULTIPROC_DIR is set
+    """
+    families = {}
+    for metric in _collected():
+        families.setdefault(_metric_name(metric.name), []).append(metric)
+
+    lines = []
+    for name in sorted(families):
+        metrics = sorted(families[name], key=lambda metric: sorted(metric.labels.items()))
+        description = next((metric.description for metric in metrics if metric.description), '')
+        if description:
+            lines.append(f"# HELP {name} {_escape(description)}")
+        lines.append(f"# TYPE {name} {metrics[0].kind}")
+        for metric in metrics:
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{name}{suffix}{_label_text({**metric.labels, **labels})} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
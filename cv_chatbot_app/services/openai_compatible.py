@@ -0,0 +1,106 @@
+import json
+from types import SimpleNamespace
+import httpx
+
+class OpenAICompatibleError(Exception):
+    """Error response from an OpenAI-compatible endpoint"""
+    def __init__(self, status_code, message):
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+
+def _completion(body):
+    return SimpleNamespace(choices=[
+        SimpleNamespace(message=SimpleNamespace(content=choice["message"].get("content") or ""))
+        for choice in body.get("choices", [])
+    ])
+
+def _chunk(line):
+    """Parses one server-sent event line; returns None for everything but data chunks"""
+    if not line.startswith('data:'):
+        return None
+    data = line[len('data:'):].strip()
+    if not data or data == '[DONE]':
+        return None
+    body = json.loads(data)
+    return SimpleNamespace(choices=[
+        SimpleNamespace(delta=SimpleNamespace(content=choice.get("delta", {}).get("content")))
+        for choice in body.get("choices", [])
+    ])
+
+def _raise_for_status(response):
+    if response.status_code >= 400:
+        response.read()
+        raise OpenAICompatibleError(response.status_code, response.text[:500])
+
+def _translate(error):
+    # Map transport errors to the builtins the LLM gateway retries
+    if isinstance(error, httpx.TimeoutException):
+        return TimeoutError(str(error) or "Request timed out")
+    if isinstance(error, httpx.TransportError):
+        return ConnectionError(str(error) or "Connection failed")
+    return error
+
+class OpenAICompatibleClient:
+    """
+    Minimal client for the /chat/completions endpoint of OpenAI-compatible
+    servers (OpenAI, vLLM, llama.cpp, Ollama, Together...), mirroring
+    client.chat.completions.create() of the groq client so it can be used by
+    LLMGateway.
+    """
+    def __init__(self, base_url, api_key=None, timeout=20.0):
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.http = httpx.Client(base_url=base_url.rstrip('/'), headers=headers, timeout=timeout)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, stream=False, timeout=None, **kwargs):
+        payload = dict(kwargs, model=model, messages=messages, stream=stream)
+        try:
+            if stream:
+                request = self.http.build_request('POST', '/chat/completions', json=payload,
+                                                  timeout=timeout or httpx.USE_CLIENT_DEFAULT)
+                response = self.http.send(request, stream=True)
+                try:
+                    _raise_for_status(response)
+                except Exception:
+                    response.close()
+                    raise
+                return self._stream(response)
+            response = self.http.post('/chat/completions', json=payload,
+                                      timeout=timeout or httpx.USE_CLIENT_DEFAULT)
+            _raise_for_status(response)
+            return _completion(response.json())
+        except httpx.HTTPError as e:
+            raise _translate(e) from e
+
+    def _stream(self, response):
+        try:
+            for line in response.iter_lines():
+                chunk = _chunk(line)
+                if chunk is not None:
+                    yield chunk
+        except httpx.HTTPError as e:
+            raise _translate(e) from e
+        finally:
+            response.close()
+
+
+class AsyncOpenAICompatibleClient:
+    """Async counterpart of OpenAICompatibleClient (non-streaming calls only)"""
+    def __init__(self, base_url, api_key=None, timeout=20.0):
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.http = httpx.AsyncClient(base_url=base_url.rstrip('/'), headers=headers, timeout=timeout)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._acreate))
+
+    async def _acreate(self, model, messages, timeout=None, **kwargs):
+        payload = dict(kwargs, model=model, messages=messages)
+        try:
+            response = await self.http.post('/chat/completions', json=payload,
+                                            timeout=timeout or httpx.USE_CLIENT_DEFAULT)
+        except httpx.HTTPError as e:
+            raise _translate(e) from e
+        if response.status_code >= 400:
+            raise OpenAICompatibleError(response.status_code, response.text[:500])
+        return _completion(response.json())
+
+    async def close(self):
+        await self.http.aclose()
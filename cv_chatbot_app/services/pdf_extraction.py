@@ -0,0 +1,12 @@
+import io
+import PyPDF2
+
+# Runs in the spawned processes of the extraction pool (see cv_upload), which
+# import this module in a fresh interpreter: it must not import Django models
+
+def extract_pdf_pages(source, start, stop):
+    """Extracts the text of pages [start, stop) of a PDF, from a path or the raw bytes"""
+    stream = open(source, 'rb') if isinstance(source, str) else io.BytesIO(source)
+    with stream:
+        pdf_reader = PyPDF2.PdfReader(stream)
+        return [pdf_reader.pages[i].extract_text() + "\n" for i in range(start, stop)]
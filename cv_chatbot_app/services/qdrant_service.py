@@ -1,8 +1,8 @@
 import os
-from qdrant_client import QdrantClient
-from qdrant_client.http import models as qdrant_models
+import threading
 import uuid
 from dotenv import load_dotenv
+from .async_clients import LoopBoundClient
 
 # Load environment variables
 load_dotenv()
@@ -10,25 +10,210 @@ load_dotenv()
 # Initialize Qdrant client
 QDRANT_API_KEY = os.getenv('Qdrant_API_KEY')
 QDRANT_URL = os.getenv('Qdrant_client_url')
+# Local mode: ":memory:" or a directory path; takes precedence over QDRANT_URL
+QDRANT_PATH = os.getenv('QDRANT_PATH')
+QDRANT_PREFER_GRPC = os.getenv('QDRANT_PREFER_GRPC', 'false').lower() == 'true'
+QDRANT_TIMEOUT = int(os.getenv('QDRANT_TIMEOUT', '10'))
+QDRANT_POOL_MAXSIZE = int(os.getenv('QDRANT_POOL_MAXSIZE', '20'))
+# 'per_cv' creates one collection per uploaded CV, 'shared' stores every
+# chunk in QDRANT_SHARED_COLLECTION with an indexed cv_id payload field
+QDRANT_STORAGE_MODE = os.getenv('QDRANT_STORAGE_MODE', 'per_cv')
+QDRANT_SHARED_COLLECTION = os.getenv('QDRANT_SHARED_COLLECTION', 'cv_chunks')
+# Vector storage of new collections: 'none' keeps float32 vectors in RAM;
+# 'int8' (scalar) or 'binary' quantization keeps the quantized vectors in RAM
+# and the float32 originals on disk, used to rescore the candidates
+QDRANT_QUANTIZATION = os.getenv('QDRANT_QUANTIZATION', 'none')
+# Share of the values int8 quantization covers; outliers beyond it are clipped
+QDRANT_QUANTILE = float(os.getenv('QDRANT_QUANTILE', '0.99'))
+# Candidates fetched with the quantized vectors per requested result
+QDRANT_OVERSAMPLING = float(os.getenv('QDRANT_OVERSAMPLING', '2.0'))
+QDRANT_RESCORE = os.getenv('QDRANT_RESCORE', 'true').lower() == 'true'
+# 'full' stores chunk text and index in point payloads; 'ids' stores only
+# cv_id, and search results are filled in from CVChunk rows
+QDRANT_PAYLOAD_MODE = os.getenv('QDRANT_PAYLOAD_MODE', 'full')
 
-def get_qdrant_client():
-    """Returns a configured Qdrant client"""
-    return QdrantClient(
+# Process-wide client, rebuilt after fork (gunicorn workers)
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_client_stats = {"created": 0, "reused": 0, "forks_detected": 0}
+_shared_collection_ready = False
+
+# Async client for the ASGI chat path, bound to the event loop that created it
+_async_client = LoopBoundClient(lambda: _build_client(asynchronous=True))
+
+def _build_client(asynchronous=False):
+    # Imported here: qdrant_client takes a noticeable share of startup, and
+    # management commands that never search should not pay for it
+    import httpx
+    from qdrant_client import AsyncQdrantClient, QdrantClient
+    client_class = AsyncQdrantClient if asynchronous else QdrantClient
+    if QDRANT_PATH:
+        if QDRANT_PATH == ':memory:':
+            return client_class(location=':memory:')
+        return client_class(path=QDRANT_PATH)
+    return client_class(
         url=QDRANT_URL,
         api_key=QDRANT_API_KEY,
+        prefer_grpc=QDRANT_PREFER_GRPC,
+        timeout=QDRANT_TIMEOUT,
+        # Keep-alive pool shared by every request in this process
+        limits=httpx.Limits(
+            max_connections=QDRANT_POOL_MAXSIZE,
+            max_keepalive_connections=QDRANT_POOL_MAXSIZE,
+        ),
     )
 
+def get_qdrant_client():
+    """Returns the process-wide Qdrant client, creating it on first use"""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        _client_stats["reused"] += 1
+        return _client
+
+    with _client_lock:
+        if _client is not None and _client_pid != pid:
+            # Inherited from the parent process: never share its sockets
+            _client_stats["forks_detected"] += 1
+            _client = None
+        if _client is None:
+            _client = _build_client()
+            _client_pid = pid
+            _client_stats["created"] += 1
+        else:
+            _client_stats["reused"] += 1
+        return _client
+
+def get_async_qdrant_client():
+    """Returns the async Qdrant client for the running event loop"""
+    client, created = _async_client.get()
+    _client_stats["created" if created else "reused"] += 1
+    return client
+
+def reset_qdrant_client():
+    """Drops the cached clients so the next call builds new ones"""
+    global _client, _client_pid
+    with _client_lock:
+        _client = None
+        _client_pid = None
+    _async_client.reset()
+
+def get_client_stats():
+    """Returns connection reuse counters for the current process"""
+    return dict(_client_stats, pid=os.getpid(), transport=_transport_name())
+
+def _transport_name():
+    if QDRANT_PATH:
+        return 'local'
+    return 'grpc' if QDRANT_PREFER_GRPC else 'http'
+
+def _reset_after_fork():
+    """Children must not reuse a connection pool opened by the parent"""
+    global _client, _client_pid, _client_lock
+    _client_lock = threading.Lock()
+    if _client is not None:
+        _client_stats["forks_detected"] += 1
+    _client = None
+    _client_pid = None
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def quantization_config():
+    """Returns the quantization of new collections, per QDRANT_QUANTIZATION"""
+    from qdrant_client.http import models as qdrant_models
+    if QDRANT_QUANTIZATION == 'int8':
+        return qdrant_models.ScalarQuantization(scalar=qdrant_models.ScalarQuantizationConfig(
+            type=qdrant_models.ScalarType.INT8, quantile=QDRANT_QUANTILE, always_ram=True
+        ))
+    if QDRANT_QUANTIZATION == 'binary':
+        return qdrant_models.BinaryQuantization(binary=qdrant_models.BinaryQuantizationConfig(always_ram=True))
+    if QDRANT_QUANTIZATION != 'none':
+        raise ValueError(f"Unknown QDRANT_QUANTIZATION: {QDRANT_QUANTIZATION}. Use none, int8 or binary")
+    return None
+
+def search_params():
+    """Search parameters rescoring quantized candidates with the original vectors"""
+    from qdrant_client.http import models as qdrant_models
+    if QDRANT_QUANTIZATION == 'none':
+        return None
+    # Ignored by collections created without quantization
+    return qdrant_models.SearchParams(quantization=qdrant_models.QuantizationSearchParams(
+        rescore=QDRANT_RESCORE, oversampling=QDRANT_OVERSAMPLING
+    ))
+
+def chunk_payload(cv_id, chunk_index, text):
+    """Payload of a chunk's point, per QDRANT_PAYLOAD_MODE"""
+    if QDRANT_PAYLOAD_MODE == 'ids':
+        return {"cv_id": cv_id}
+    return {"text": text, "chunk_index": chunk_index, "cv_id": cv_id}
+
 def create_collection(collection_name, vector_size=384):
     """Creates a new collection in Qdrant"""
+    from qdrant_client.http import models as qdrant_models
     client = get_qdrant_client()
+    quantization = quantization_config()
     client.create_collection(
         collection_name=collection_name,
         vectors_config=qdrant_models.VectorParams(
             size=vector_size,
-            distance=qdrant_models.Distance.COSINE
-        )
+            distance=qdrant_models.Distance.COSINE,
+            # Only the quantized vectors need to stay in RAM
+            on_disk=True if quantization else None
+        ),
+        quantization_config=quantization
+    )
+
+def collection_exists(collection_name):
+    """Checks whether a collection exists in Qdrant"""
+    client = get_qdrant_client()
+    existing = client.get_collections().collections
+    return any(collection.name == collection_name for collection in existing)
+
+def use_shared_collection():
+    """Whether new CVs are stored in the shared multi-tenant collection"""
+    return QDRANT_STORAGE_MODE == 'shared'
+
+def ensure_shared_collection(vector_size=384):
+    """Creates the shared collection and its cv_id payload index if missing"""
+    global _shared_collection_ready
+    from qdrant_client.http import models as qdrant_models
+    if _shared_collection_ready:
+        return QDRANT_SHARED_COLLECTION
+
+    client = get_qdrant_client()
+    if not collection_exists(QDRANT_SHARED_COLLECTION):
+        create_collection(QDRANT_SHARED_COLLECTION, vector_size=vector_size)
+    client.create_payload_index(
+        collection_name=QDRANT_SHARED_COLLECTION,
+        field_name="cv_id",
+        field_schema=qdrant_models.PayloadSchemaType.INTEGER,
+    )
+    _shared_collection_ready = True
+    return QDRANT_SHARED_COLLECTION
+
+def cv_filter(cv_id):
+    """Builds a filter matching the points of a single CV"""
+    from qdrant_client.http import models as qdrant_models
+    return qdrant_models.Filter(
+        must=[
+            qdrant_models.FieldCondition(
+                key="cv_id",
+                match=qdrant_models.MatchValue(value=cv_id)
+            )
+        ]
     )
-    
+
+def delete_cv_points(collection_name, cv_id):
+    """Deletes all points of a CV from a shared collection"""
+    from qdrant_client.http import models as qdrant_models
+    client = get_qdrant_client()
+    client.delete(
+        collection_name=collection_name,
+        points_selector=qdrant_models.FilterSelector(filter=cv_filter(cv_id))
+    )
+
 def delete_collection(collection_name):
     """Deletes a collection from Qdrant"""
     client = get_qdrant_client()
@@ -42,15 +227,46 @@ def upsert_points(collection_name, points):
         points=points
     )
 
-def search_points(collection_name, query_vector, limit=5):
+def search_points(collection_name, query_vector, limit=5, query_filter=None):
     """Searches for points in a Qdrant collection"""
     client = get_qdrant_client()
     return client.search(
         collection_name=collection_name,
         query_vector=query_vector,
+        query_filter=query_filter,
+        search_params=search_params(),
+        limit=limit
+    )
+
+def search_points_batch(collection_name, query_vectors, limit=5, query_filter=None):
+    """Runs several searches in one request; returns one result list per vector"""
+    from qdrant_client.http import models as qdrant_models
+    client = get_qdrant_client()
+    return client.search_batch(
+        collection_name=collection_name,
+        requests=[
+            qdrant_models.SearchRequest(
+                vector=query_vector,
+                filter=query_filter,
+                params=search_params(),
+                limit=limit,
+                with_payload=True
+            )
+            for query_vector in query_vectors
+        ]
+    )
+
+async def async_search_points(collection_name, query_vector, limit=5, query_filter=None):
+    """Async variant of search_points using the async Qdrant client"""
+    client = get_async_qdrant_client()
+    return await client.search(
+        collection_name=collection_name,
+        query_vector=query_vector,
+        query_filter=query_filter,
+        search_params=search_params(),
         limit=limit
     )
 
 def generate_collection_name():
     """Generates a unique collection name"""
-    return f"cv_{uuid.uuid4().hex}"
\ No newline at end of file
+    return f"cv_{uuid.uuid4().hex}"
@@ -0,0 +1,72 @@
+import os
+import time
+from contextlib import contextmanager
+
+# Phases recorded in this process; a forked worker inherits the master's
+_phases = []
+_process_started = time.time()
+
+def current_rss_mb():
+    """Returns the resident set size of this process in MiB (Linux, else 0)"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+@contextmanager
+def startup_phase(name):
+    """Records the seconds and RSS growth of one import/initialization phase"""
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        rss = current_rss_mb()
+        _phases.append({
+            "phase": name,
+            "pid": os.getpid(),
+            "seconds": round(elapsed, 3),
+            "rss_mb": round(rss, 1),
+            "rss_delta_mb": round(rss - rss_before, 1),
+        })
+        print(f"Startup {name}: {elapsed:.2f}s, RSS {rss:.0f} MiB ({rss - rss_before:+.0f} MiB)")
+
+def get_startup_report():
+    """Returns the phases recorded so far, in order, and their total"""
+    return {
+        "pid": os.getpid(),
+        "process_started": _process_started,
+        "phases": list(_phases),
+        "total_seconds": round(sum(phase["seconds"] for phase in _phases), 3),
+        "rss_mb": round(current_rss_mb(), 1),
+    }
+
+def prepare_application(warmup=None):
+    """
+    Does the work the first requests would otherwise pay for: imports the
+    views and the services behind them, and loads the embedding model per
+    warmup ('load' loads the weights, 'true' also runs a first inference;
+    EMBEDDING_WARMUP by default). Run from gunicorn's hooks (gunicorn.conf.py)
+    or, with PREPARE_ON_IMPORT=true, when wsgi.py/asgi.py are imported.
+    """
+    with startup_phase('import_views'):
+        from django.urls import get_resolver
+        get_resolver().url_patterns
+
+    from .embedding import EMBEDDING_WARMUP, get_embedding_model, warmup_embedding_model
+    warmup = EMBEDDING_WARMUP if warmup is None else warmup
+    try:
+        if warmup == 'load':
+            with startup_phase('load_embedding_model'):
+                get_embedding_model()
+        elif warmup == 'true':
+            with startup_phase('warmup_embedding_model'):
+                warmup_embedding_model()
+    except Exception as e:
+        # Requests will retry the load; the worker should still come up
+        print(f"Error loading embedding model: {str(e)}")
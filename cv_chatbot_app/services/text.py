@@ -0,0 +1,24 @@
+import re
+
+def normalize_text(text):
+    """Joins lines, turns dashes into spaces and collapses whitespace"""
+    text = text.replace('\n', ' ').replace('\r', '')
+    text = re.sub(r'\s*[-–—]+\s*', ' ', text)
+    return ' '.join(text.split())
+
+def iter_sentences(text_parts):
+    """
+    Yields normalized sentences from a stream of text parts. The last sentence
+    of each part is held back until the next part shows whether it continues.
+    """
+    pending = ''
+    for part in text_parts:
+        text = normalize_text(part)
+        if not text:
+            continue
+        text = f"{pending} {text}" if pending else text
+        sentences = re.split(r'(?<=[.!?]) +', text)
+        pending = sentences.pop()
+        yield from sentences
+    if pending:
+        yield pending
@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import random
+import threading
+import time
+import functools
+import inspect
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from .metrics import get_histogram, get_counter
+
+# Load environment variables
+load_dotenv()
+
+# Spans feed the stage histograms; requests slower than this many seconds are
+# logged with their stage breakdown (0 disables the slow-request log)
+TRACE_SLOW_REQUEST_SECONDS = float(os.getenv('TRACE_SLOW_REQUEST_SECONDS', '2.0'))
+# Optional JSON-lines file the slow-request log is appended to
+TRACE_SLOW_LOG_PATH = os.getenv('TRACE_SLOW_LOG_PATH')
+# Slow and profiled requests kept in memory for the traces endpoint
+TRACE_RECENT = int(os.getenv('TRACE_RECENT', '50'))
+# Share of requests run under the sampling profiler (0 disables it)
+TRACE_PROFILE_SAMPLE_RATE = float(os.getenv('TRACE_PROFILE_SAMPLE_RATE', '0'))
+# Seconds between two stack samples of a profiled request
+TRACE_PROFILE_INTERVAL = float(os.getenv('TRACE_PROFILE_INTERVAL', '0.005'))
+# Functions reported per profile
+TRACE_PROFILE_TOP = int(os.getenv('TRACE_PROFILE_TOP', '20'))
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Trace of the request being handled; asgiref copies it into the threads
+# running sync code for async views and vice versa
+_current_trace = ContextVar('current_trace', default=None)
+_current_depth = ContextVar('current_depth', default=0)
+
+_recent_slow = deque(maxlen=TRACE_RECENT)
+_recent_profiled = deque(maxlen=TRACE_RECENT)
+_slow_log_lock = threading.Lock()
+
+def _stage_histogram(stage):
+    return get_histogram('stage_duration_seconds', 'Time spent in each request pipeline stage',
+                         STAGE_BUCKETS, labels={"stage": stage})
+
+class Trace:
+    """The spans recorded while handling one request"""
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.view = None
+        self.status = None
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        # Threads that ran code of this request, for the sampling profiler
+        self.threads = {threading.get_ident()}
+        self.profile = None
+        self._lock = threading.Lock()
+
+    def add_span(self, stage, start, duration, depth, error=None):
+        with self._lock:
+            self.spans.append({
+                "stage": stage,
+                "start": round(start - self.started, 6),
+                "duration": round(duration, 6),
+                "depth": depth,
+                **({"error": error} if error else {}),
+            })
+
+    def stages(self):
+        """Returns the total seconds per stage, in order of first appearance"""
+        totals = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span["stage"]] = totals.get(span["stage"], 0.0) + span["duration"]
+        return {stage: round(seconds, 6) for stage, seconds in totals.items()}
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start"])
+        return {
+            "method": self.method,
+            "path": self.path,
+            "view": self.view,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration": round(self.duration, 6) if self.duration is not None else None,
+            "stages": self.stages(),
+            "spans": spans,
+            **({"profile": self.profile} if self.profile else {}),
+        }
+
+def get_current_trace():
+    return _current_trace.get()
+
+def record_span(stage, seconds, error=None):
+    """Records a stage timed by the caller (e.g. accumulated over a stream)"""
+    _stage_histogram(stage).observe(seconds)
+    if error:
+        get_counter('stage_errors_total', 'Pipeline stages that raised', labels={"stage": stage}).inc()
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(stage, time.perf_counter() - seconds, seconds, _current_depth.get(), error)
+
+@contextmanager
+def span(stage):
+    """Times the enclosed block as one stage of the current request"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.threads.add(threading.get_ident())
+    depth_token = _current_depth.set(_current_depth.get() + 1)
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        _current_depth.reset(depth_token)
+        record_span(stage, elapsed, error)
+
+def traced(stage):
+    """Decorator running a function (sync or async) inside span(stage)"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the threads running a request every interval
+    seconds from a background thread, and reports the functions most often
+    on top of the stack (self), with how often they were anywhere in it
+    (total). Under ASGI
+    the event loop thread is shared with concurrent requests.
+    """
+    def __init__(self, trace, interval=TRACE_PROFILE_INTERVAL):
+        self.trace = trace
+        self.interval = interval
+        self.samples = 0
+        self.self_counts = Counter()
+        self.total_counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='trace-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in list(self.trace.threads):
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                self.samples += 1
+                self.self_counts[_frame_label(frame)] += 1
+                seen = set()
+                while frame is not None:
+                    seen.add(_frame_label(frame))
+                    frame = frame.f_back
+                self.total_counts.update(seen)
+
+    def stop(self, top=TRACE_PROFILE_TOP):
+        self._stop.set()
+        self._thread.join()
+        return {
+            "samples": self.samples,
+            "interval": self.interval,
+            # Ranked by self samples: every sample also counts for the frames
+            # at the root of the stack
+            "top": [
+                {"function": function, "self": count, "total": self.total_counts[function],
+                 "self_share": round(count / self.samples, 4)}
+                for function, count in self.self_counts.most_common(top)
+            ],
+        }
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def start_trace(method, path):
+    """
+    Starts the trace of a request; returns (trace, token, profiler). The
+    request is profiled with probability TRACE_PROFILE_SAMPLE_RATE.
+    """
+    trace = Trace(method, path)
+    token = _current_trace.set(trace)
+    profiler = None
+    if TRACE_PROFILE_SAMPLE_RATE and random.random() < TRACE_PROFILE_SAMPLE_RATE:
+        profiler = SamplingProfiler(trace).start()
+    return trace, token, profiler
+
+def finish_trace(trace, token, profiler, view, status):
+    """Ends a request trace: records its metrics, profile and slow-request log entry"""
+    trace.duration = time.perf_counter() - trace.started
+    trace.view = view
+    trace.status = status
+    _current_trace.reset(token)
+
+    get_histogram('http_request_duration_seconds', 'Time to produce the response of each view',
+                  STAGE_BUCKETS, labels={"view": view}).observe(trace.duration)
+    get_counter('http_requests_total', 'Requests handled',
+                labels={"view": view, "status": str(status)}).inc()
+
+    if profiler is not None:
+        trace.profile = profiler.stop()
+        _recent_profiled.append(trace.to_dict())
+
+    if TRACE_SLOW_REQUEST_SECONDS and trace.duration >= TRACE_SLOW_REQUEST_SECONDS:
+        get_counter('http_slow_requests_total', 'Requests slower than TRACE_SLOW_REQUEST_SECONDS',
+                    labels={"view": view}).inc()
+        _log_slow_request(trace)
+
+def _log_slow_request(trace):
+    entry = trace.to_dict()
+    _recent_slow.append(entry)
+    breakdown = ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in entry["stages"].items())
+    print(f"Slow request {trace.method} {trace.path} ({trace.status}) took {trace.duration:.3f}s: "
+          f"{breakdown or 'no traced stages'}")
+    if TRACE_SLOW_LOG_PATH:
+        try:
+            with _slow_log_lock, open(TRACE_SLOW_LOG_PATH, 'a') as log:
+                log.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"Error writing slow request log: {str(e)}")
+
+def get_recent_traces():
+    """Returns the recent slow and profiled request traces of this worker"""
+    return {
+        "slow_request_seconds": TRACE_SLOW_REQUEST_SECONDS,
+        "profile_sample_rate": TRACE_PROFILE_SAMPLE_RATE,
+        "slow": list(_recent_slow),
+        "profiled": list(_recent_profiled),
+    }
@@ -0,0 +1,303 @@
+import os
+from abc import ABC, abstractmethod
+from asgiref.sync import sync_to_async
+from dotenv import load_dotenv
+from pgvector.django import CosineDistance
+from ..models import CV, CVChunk
+from .qdrant_service import (
+    get_qdrant_client, async_search_points, search_points, search_points_batch,
+    generate_collection_name,
+    create_collection, collection_exists, delete_collection, delete_cv_points,
+    use_shared_collection, ensure_shared_collection, cv_filter, chunk_payload,
+)
+
+# Load environment variables
+load_dotenv()
+
+# Backend storing the chunk embeddings of new CVs: 'qdrant' or 'pgvector'
+VECTOR_STORE_BACKEND = os.getenv('VECTOR_STORE_BACKEND', 'qdrant')
+
+_HYDRATE_FIELDS = ('id', 'cv_id', 'chunk_index', 'chunk_text', 'qdrant_point_id')
+
+def _missing_text(points):
+    return [point for point in points if "text" not in (point.payload or {})]
+
+def _fill_payloads(points, chunks):
+    """Sets the payload of points from their CVChunk rows; drops points whose row is gone"""
+    filled = []
+    for point in points:
+        if "text" not in (point.payload or {}):
+            chunk = chunks.get(str(point.id))
+            if chunk is None:
+                continue
+            point.payload = {"text": chunk.chunk_text, "chunk_index": chunk.chunk_index, "cv_id": chunk.cv_id}
+        filled.append(point)
+    return filled
+
+def hydrate_payloads(points):
+    """
+    Fills in the text and chunk_index of search results whose payload only
+    holds IDs (QDRANT_PAYLOAD_MODE=ids), with one in_bulk query for all of them.
+    """
+    missing = _missing_text(points)
+    if not missing:
+        return points
+    chunks = CVChunk.objects.only(*_HYDRATE_FIELDS).in_bulk(
+        [str(point.id) for point in missing], field_name='qdrant_point_id'
+    )
+    return _fill_payloads(points, chunks)
+
+async def ahydrate_payloads(points):
+    """Async variant of hydrate_payloads"""
+    missing = _missing_text(points)
+    if not missing:
+        return points
+    chunks = await CVChunk.objects.only(*_HYDRATE_FIELDS).ain_bulk(
+        [str(point.id) for point in missing], field_name='qdrant_point_id'
+    )
+    return _fill_payloads(points, chunks)
+
+class VectorStore(ABC):
+    """
+    Interface of the backends that store chunk embeddings and answer
+    similarity searches for a CV. Search results are Qdrant ScoredPoint
+    objects whose payload holds "text", "chunk_index" and "cv_id".
+    """
+    @abstractmethod
+    def new_cv_storage(self):
+        """Returns (qdrant_collection_name, storage_layout) for a new CV"""
+
+    def create_cv_storage(self, cv):
+        """Creates the storage of a new CV, if the backend needs any"""
+
+    @abstractmethod
+    def reset_cv(self, cv):
+        """Removes stored vectors of the CV and makes sure its storage exists"""
+
+    @abstractmethod
+    def add_chunks(self, cv, chunk_records, embeddings):
+        """
+        Stores the embeddings of chunk_records (unsaved CVChunk objects), which
+        the caller saves with bulk_create right after.
+        """
+
+    def update_chunk_indexes(self, cv, chunk_records):
+        """Updates the stored chunk_index of chunks that moved within the CV"""
+
+    def delete_chunks(self, cv, point_ids):
+        """Deletes the vectors of some chunks of the CV"""
+
+    def add_chunks_many(self, batches):
+        """
+        Stores the chunks of several CVs: batches is a list of
+        (cv, chunk_records, embeddings) tuples, as passed to add_chunks.
+        """
+        for cv, chunk_records, embeddings in batches:
+            self.add_chunks(cv, chunk_records, embeddings)
+
+    @abstractmethod
+    def search(self, cv, query_vector, limit=5):
+        """Returns the CV's limit chunks closest to query_vector, closest first"""
+
+    def search_batch(self, cv, query_vectors, limit=5):
+        """Searches for several query vectors; returns one result list per vector"""
+        return [self.search(cv, query_vector, limit) for query_vector in query_vectors]
+
+    @abstractmethod
+    def fetch_vectors(self, cv, point_ids):
+        """Returns {point_id: vector} for stored chunks of the CV"""
+
+    async def asearch(self, cv, query_vector, limit=5):
+        return await sync_to_async(self.search, thread_sensitive=False)(cv, query_vector, limit)
+
+    @abstractmethod
+    def delete_cv(self, cv):
+        """Deletes every stored vector of the CV"""
+
+class QdrantVectorStore(VectorStore):
+    """Stores vectors in Qdrant, one collection per CV or a shared collection"""
+    def new_cv_storage(self):
+        if use_shared_collection():
+            return ensure_shared_collection(), CV.LAYOUT_SHARED
+        return generate_collection_name(), CV.LAYOUT_PER_CV
+
+    def create_cv_storage(self, cv):
+        if not cv.uses_shared_collection:
+            create_collection(cv.qdrant_collection_name)
+
+    def reset_cv(self, cv):
+        if cv.uses_shared_collection:
+            ensure_shared_collection()
+            delete_cv_points(cv.qdrant_collection_name, cv.id)
+        else:
+            if collection_exists(cv.qdrant_collection_name):
+                delete_collection(cv.qdrant_collection_name)
+            create_collection(cv.qdrant_collection_name)
+
+    def _points(self, cv, chunk_records, embeddings):
+        from qdrant_client.http import models as qdrant_models
+        return [
+            qdrant_models.PointStruct(
+                id=record.qdrant_point_id,
+                vector=embedding.tolist() if hasattr(embedding, 'tolist') else embedding,
+                payload=chunk_payload(cv.id, record.chunk_index, record.chunk_text)
+            )
+            for record, embedding in zip(chunk_records, embeddings)
+        ]
+
+    def add_chunks(self, cv, chunk_records, embeddings):
+        points = self._points(cv, chunk_records, embeddings)
+        if points:
+            client = get_qdrant_client()
+            client.upsert(
+                collection_name=cv.qdrant_collection_name,
+                points=points
+            )
+
+    def add_chunks_many(self, batches):
+        # One upsert per collection: a single one for CVs in the shared collection
+        points_by_collection = {}
+        for cv, chunk_records, embeddings in batches:
+            points_by_collection.setdefault(cv.qdrant_collection_name, []).extend(
+                self._points(cv, chunk_records, embeddings)
+            )
+        client = get_qdrant_client()
+        for collection_name, points in points_by_collection.items():
+            if points:
+                client.upsert(collection_name=collection_name, points=points)
+
+    def update_chunk_indexes(self, cv, chunk_records):
+        from qdrant_client.http import models as qdrant_models
+        # Also run for text-free payloads: older points of the CV may carry an index
+        if chunk_records:
+            client = get_qdrant_client()
+            client.batch_update_points(
+                collection_name=cv.qdrant_collection_name,
+                update_operations=[
+                    qdrant_models.SetPayloadOperation(set_payload=qdrant_models.SetPayload(
+                        payload={"chunk_index": record.chunk_index},
+                        points=[record.qdrant_point_id]
+                    ))
+                    for record in chunk_records
+                ]
+            )
+
+    def delete_chunks(self, cv, point_ids):
+        from qdrant_client.http import models as qdrant_models
+        if point_ids:
+            client = get_qdrant_client()
+            client.delete(
+                collection_name=cv.qdrant_collection_name,
+                points_selector=qdrant_models.PointIdsList(points=list(point_ids))
+            )
+
+    def _filter(self, cv):
+        return cv_filter(cv.id) if cv.uses_shared_collection else None
+
+    def search(self, cv, query_vector, limit=5):
+        return hydrate_payloads(search_points(
+            collection_name=cv.qdrant_collection_name,
+            query_vector=query_vector,
+            limit=limit,
+            query_filter=self._filter(cv)
+        ))
+
+    def search_batch(self, cv, query_vectors, limit=5):
+        results = search_points_batch(
+            collection_name=cv.qdrant_collection_name,
+            query_vectors=query_vectors,
+            limit=limit,
+            query_filter=self._filter(cv)
+        )
+        # One query for the texts of every result list
+        hydrate_payloads([point for points in results for point in points])
+        return [[point for point in points if "text" in point.payload] for points in results]
+
+    async def asearch(self, cv, query_vector, limit=5):
+        return await ahydrate_payloads(await async_search_points(
+            collection_name=cv.qdrant_collection_name,
+            query_vector=query_vector,
+            limit=limit,
+            query_filter=self._filter(cv)
+        ))
+
+    def fetch_vectors(self, cv, point_ids):
+        client = get_qdrant_client()
+        records = client.retrieve(
+            collection_name=cv.qdrant_collection_name,
+            ids=list(point_ids),
+            with_payload=False,
+            with_vectors=True
+        )
+        return {str(record.id): record.vector for record in records}
+
+    def delete_cv(self, cv):
+        if cv.uses_shared_collection:
+            delete_cv_points(cv.qdrant_collection_name, cv.id)
+        else:
+            delete_collection(cv.qdrant_collection_name)
+
+class PgVectorStore(VectorStore):
+    """
+    Stores vectors in CVChunk.embedding (pgvector, HNSW index), so ingestion
+    and search never leave Postgres.
+    """
+    def new_cv_storage(self):
+        return '', CV.LAYOUT_PGVECTOR
+
+    def reset_cv(self, cv):
+        # Vectors live on the CVChunk rows, which the caller deletes
+        pass
+
+    def add_chunks(self, cv, chunk_records, embeddings):
+        for record, embedding in zip(chunk_records, embeddings):
+            record.embedding = embedding
+
+    def _to_points(self, chunks):
+        from qdrant_client.http import models as qdrant_models
+        return [
+            qdrant_models.ScoredPoint(
+                id=chunk.qdrant_point_id,
+                version=0,
+                score=1.0 - chunk.distance,
+                payload={"text": chunk.chunk_text, "chunk_index": chunk.chunk_index, "cv_id": chunk.cv_id}
+            )
+            for chunk in chunks
+        ]
+
+    def _queryset(self, cv, query_vector, limit):
+        return (
+            CVChunk.objects
+            .filter(cv_id=cv.id)
+            .annotate(distance=CosineDistance('embedding', query_vector))
+            .order_by('distance')
+            .only('id', 'cv_id', 'chunk_index', 'chunk_text', 'qdrant_point_id')[:limit]
+        )
+
+    def search(self, cv, query_vector, limit=5):
+        return self._to_points(self._queryset(cv, query_vector, limit))
+
+    async def asearch(self, cv, query_vector, limit=5):
+        return self._to_points([chunk async for chunk in self._queryset(cv, query_vector, limit)])
+
+    def fetch_vectors(self, cv, point_ids):
+        return dict(
+            CVChunk.objects
+            .filter(cv_id=cv.id, qdrant_point_id__in=list(point_ids))
+            .values_list('qdrant_point_id', 'embedding')
+        )
+
+    def delete_cv(self, cv):
+        # Vectors are deleted with the CVChunk rows (on_delete=CASCADE)
+        pass
+
+_stores = {
+    'qdrant': QdrantVectorStore(),
+    'pgvector': PgVectorStore(),
+}
+
+def get_vector_store(cv=None):
+    """Returns the backend holding the CV's vectors, or the default backend for new CVs"""
+    if cv is not None:
+        return _stores['pgvector' if cv.storage_layout == CV.LAYOUT_PGVECTOR else 'qdrant']
+    return _stores[VECTOR_STORE_BACKEND]
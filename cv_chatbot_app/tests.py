@@ -1,3 +1,1632 @@
-from django.test import TestCase
+import asyncio
+import importlib.util
+import io
+import json
+import os
+import runpy
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import threading
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+import docx
+import groq
+import numpy as np
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.test import SimpleTestCase
+from django.utils import timezone
+from benchmarks import end_to_end
+from benchmarks.common import percentile
+from benchmarks.corpus import write_pdf
+from qdrant_client.http import models as qdrant_models
+from rest_framework.test import APIRequestFactory
+from . import views
+from .models import CV, CVChunk, IngestionJob
+from .services import (
+    ai_service, answer_cache, async_clients, batch_chat, bulk_import, candidate_ranking, context_builder, cv_search, cv_upload, exact_search, ingestion_queue,
+    llm_gateway, metrics, qdrant_service, startup, tracing, vector_store,
+)
+from .services.embedding import QueryEmbeddingCache, load_embedding_model
+from .services.fake_llm import FakeAsyncGroqClient, FakeGroqClient, FakeLLMServer
+from .services.lexical_index import tokenize
+from .services.llm_gateway import CircuitBreaker, LLMError, LLMGateway, LLMTimeoutError, LLMUnavailableError
+from .services.llm_router import LLMAnswer, LLMProvider, LLMRouter
 
-# Create your tests here.
+# Packages each embedding backend needs beyond sentence-transformers
+_BACKEND_PACKAGES = {
+    'torch-int8': [],
+    'onnx': ['optimum', 'onnxruntime'],
+    'onnx-int8': ['optimum', 'onnxruntime'],
+    'openvino': ['optimum', 'openvino'],
+}
+# Lowest cosine similarity accepted between a backend's vectors and PyTorch's
+_MIN_COSINE = {
+    'torch-int8': 0.98,
+    'onnx': 0.999,
+    'onnx-int8': 0.98,
+    'openvino': 0.999,
+}
+
+_TEXTS = [
+    "Senior Python developer with eight years of Django and PostgreSQL experience.",
+    "Led the migration of the payments platform to Kubernetes on AWS.",
+    "Does the candidate hold a cloud certification?",
+    "Built a recommendation system using PyTorch and Spark for 2 million users.",
+    "Fluent in English and German; B2 level in Spanish.",
+]
+
+
+class EmbeddingBackendParityTests(SimpleTestCase):
+    """Optimized embedding runtimes must produce the vectors stored CVs were indexed with"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        try:
+            cls.reference = load_embedding_model('torch').encode(_TEXTS, normalize_embeddings=True)
+        except Exception as e:
+            # No model files (offline, no cache) or no working torch install
+            raise unittest.SkipTest(f"PyTorch embedding model unavailable: {str(e)}")
+
+    def test_backends_match_pytorch(self):
+        for backend, packages in _BACKEND_PACKAGES.items():
+            with self.subTest(backend=backend):
+                missing = [name for name in packages if importlib.util.find_spec(name) is None]
+                if missing:
+                    self.skipTest(f"{backend} needs {', '.join(missing)}")
+                vectors = load_embedding_model(backend).encode(_TEXTS, normalize_embeddings=True)
+                self.assertEqual(vectors.shape, self.reference.shape)
+                cosine = np.sum(vectors * self.reference, axis=1)
+                self.assertGreaterEqual(float(cosine.min()), _MIN_COSINE[backend])
+
+
+class WhitespaceTokenizer:
+    """Counts one token per word, so token budgets are predictable without a model"""
+    def __call__(self, text, add_special_tokens=False, verbose=False):
+        return {"input_ids": text.split()}
+
+def scored_point(point_id, text, chunk_index=0, score=1.0):
+    return qdrant_models.ScoredPoint(id=point_id, version=0, score=score,
+                                     payload={"text": text, "chunk_index": chunk_index})
+
+
+class BatchChatTests(SimpleTestCase):
+    """A question whose LLM call fails must not lose the other answers"""
+
+    def test_failed_question_keeps_other_answers(self):
+        cv = CV(id=7, name="Candidate", status=CV.STATUS_READY)
+
+        def generate(context, question):
+            if question == "Which languages?":
+                raise LLMUnavailableError("LLM circuit open")
+            return LLMAnswer(f"Answer to {question}", 'groq', 'model', 0.01)
+
+        results = [[scored_point(f"00000000-0000-0000-0000-00000000000{i}", f"Sentence number {i}.")]
+                   for i in range(2)]
+        with mock.patch.object(context_builder, '_tokenizer', WhitespaceTokenizer()), \
+                mock.patch.object(views.CV.objects, 'get', return_value=cv), \
+                mock.patch.object(batch_chat, 'search_cv_batch', return_value=results), \
+                mock.patch.object(batch_chat, 'get_cached_answers', return_value={}), \
+                mock.patch.object(batch_chat, 'generate_answer', side_effect=generate), \
+                mock.patch.object(batch_chat, 'answer_cache_key', side_effect=lambda cv_id, q, r: q), \
+                mock.patch.object(batch_chat.Conversation.objects, 'bulk_create') as bulk_create:
+            request = APIRequestFactory().post('/api/chat/batch/', {
+                "cv_id": 7, "questions": ["Which languages?", "Which degree?"],
+            }, format='json')
+            response = views.chat_batch(request)
+
+        self.assertEqual(response.status_code, 200)
+        answers = json.loads(response.content)["results"]
+        self.assertEqual(answers[0], {"question": "Which languages?", "error": "LLM circuit open", "cached": False})
+        self.assertEqual(answers[1]["response"], "Answer to Which degree?")
+        self.assertIn("prompt_tokens", answers[1])
+        # Only the answered question is saved
+        self.assertEqual(len(bulk_create.call_args[0][0]), 1)
+
+
+class IngestProgressTests(SimpleTestCase):
+    """Queued ingestion reports progress while batches stream through, not only at the end"""
+
+    def test_progress_is_reported_per_batch(self):
+        upload = docx_upload(f"Paragraph {i} describes a project built with Python and Django. " * 4
+                             for i in range(300))
+
+        cv = CV(id=3, name="Candidate")
+        reports = []
+        with mock.patch.object(cv_upload, 'reset_cv_storage'), \
+                mock.patch.object(cv_upload, 'get_vector_store'), \
+                mock.patch.object(cv_upload, '_write_chunks'), \
+                mock.patch.object(cv_upload, 'generate_embeddings',
+                                  side_effect=lambda batch, batch_size: np.zeros((len(batch), 4))), \
+                mock.patch.object(cv, 'save'):
+            cv_upload.ingest_cv(cv, upload, on_stage=lambda stage, seconds, progress: reports.append((stage, progress)))
+
+        streamed = [progress for stage, progress in reports[:-4]]
+        self.assertGreater(len(streamed), 2)
+        self.assertTrue(all(10 <= progress < 100 for progress in streamed))
+        self.assertEqual(streamed, sorted(streamed))
+        self.assertLess(streamed[0], streamed[-1])
+        self.assertEqual([stage for stage, _ in reports[-4:]], ['extract', 'chunk', 'embed', 'store'])
+        self.assertEqual(reports[-1], ('store', 100))
+
+
+class PercentileTests(SimpleTestCase):
+    """Nearest-rank percentiles used by the benchmark reports"""
+
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([15, 20, 35, 40, 50], 30), 20)
+        self.assertEqual(percentile([15, 20, 35, 40, 50], 40), 20)
+        self.assertEqual(percentile([15, 20, 35, 40, 50], 50), 35)
+
+    def test_bounds(self):
+        self.assertEqual(percentile([], 50), 0.0)
+        self.assertEqual(percentile([3.0], 99), 3.0)
+        self.assertEqual(percentile([2, 1], 0), 1)
+        self.assertEqual(percentile([1, 2, 3], 100), 3)
+
+
+class QueryEmbeddingCacheTests(SimpleTestCase):
+    """Repeated questions reuse their embedding from the LRU or the shared SQLite tier"""
+
+    def test_lru_evicts_least_recently_used(self):
+        cache = QueryEmbeddingCache(max_size=2, path=None, model_name='model')
+        cache.put("first question", np.ones(4))
+        cache.put("second question", np.zeros(4))
+        self.assertIsNotNone(cache.get("First   QUESTION"))
+        cache.put("third question", np.ones(4))
+
+        self.assertIsNone(cache.get("second question"))
+        np.testing.assert_array_equal(cache.get("first question"), np.ones(4, dtype=np.float32))
+        stats = cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"], stats["size"]), (2, 1, 1, 2))
+
+    def test_shared_tier_is_keyed_by_model(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'embeddings.sqlite3')
+            QueryEmbeddingCache(max_size=4, path=path, model_name='model').put("a question", np.arange(4))
+
+            # Another worker process: empty LRU, same SQLite file
+            worker = QueryEmbeddingCache(max_size=4, path=path, model_name='model')
+            np.testing.assert_array_equal(worker.get("a question"), np.arange(4, dtype=np.float32))
+            self.assertEqual(worker.get_stats()["shared_hits"], 1)
+            worker.get("a question")
+            self.assertEqual(worker.get_stats()["hits"], 1)
+
+            other_model = QueryEmbeddingCache(max_size=4, path=path, model_name='other-model')
+            self.assertIsNone(other_model.get("a question"))
+
+    def test_shared_tier_evicts_least_recently_used_rows(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        path = os.path.join(directory, 'embeddings.sqlite3')
+        clock = iter(range(1000))
+        with mock.patch('time.time', side_effect=lambda: float(next(clock))):
+            cache = QueryEmbeddingCache(max_size=1, path=path, model_name='model', shared_size=10)
+            for i in range(10):
+                cache.put(f"question {i}", np.full(4, i))
+            # Read back from the file: question 0 becomes the most recently used
+            QueryEmbeddingCache(max_size=1, path=path, model_name='model').get("question 0")
+            for i in range(10, 15):
+                cache.put(f"question {i}", np.full(4, i))
+
+        self.assertEqual(cache.get_stats()["shared_evictions"], 5)
+        reader = QueryEmbeddingCache(max_size=1, path=path, model_name='model')
+        with sqlite3.connect(path) as connection:
+            self.assertEqual(connection.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0], 10)
+        self.assertIsNotNone(reader.get("question 0"))
+        self.assertIsNone(reader.get("question 5"))
+        self.assertIsNotNone(reader.get("question 6"))
+        self.assertIsNotNone(reader.get("question 14"))
+
+
+class AnswerCacheTests(SimpleTestCase):
+    """Cached answers are reused only for the same question, chunks, prompt and models"""
+
+    def setUp(self):
+        patcher = mock.patch.object(answer_cache, 'get_model_id', return_value='llama3-8b-8192')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.results = [scored_point("00000000-0000-0000-0000-000000000001", "Python developer."),
+                        scored_point("00000000-0000-0000-0000-000000000002", "Django developer.")]
+
+    def test_key_normalizes_the_question(self):
+        self.assertEqual(answer_cache.answer_cache_key(1, "Which languages?", self.results),
+                         answer_cache.answer_cache_key(1, "  which   LANGUAGES? ", self.results))
+
+    def test_key_changes_with_what_the_answer_depends_on(self):
+        key = answer_cache.answer_cache_key(1, "Which languages?", self.results)
+        self.assertNotEqual(key, answer_cache.answer_cache_key(2, "Which languages?", self.results))
+        self.assertNotEqual(key, answer_cache.answer_cache_key(1, "Which degree?", self.results))
+        self.assertNotEqual(key, answer_cache.answer_cache_key(1, "Which languages?", self.results[:1]))
+        with mock.patch.object(answer_cache, 'PROMPT_VERSION', 'next'):
+            self.assertNotEqual(key, answer_cache.answer_cache_key(1, "Which languages?", self.results))
+        answer_cache.get_model_id.return_value = 'other-model'
+        self.assertNotEqual(key, answer_cache.answer_cache_key(1, "Which languages?", self.results))
+
+    def test_lookup_only_returns_answers_within_the_ttl(self):
+        with mock.patch.object(answer_cache.Conversation, 'objects') as objects:
+            answer_cache.get_cached_answer('key')
+        cutoff = objects.filter.call_args.kwargs["timestamp__gte"]
+        expected = timezone.now() - timedelta(seconds=answer_cache.ANSWER_CACHE_TTL)
+        self.assertLess(abs((cutoff - expected).total_seconds()), 5)
+        self.assertEqual(objects.filter.call_args.kwargs["cache_key"], 'key')
+
+    def test_disabled_cache_skips_the_lookup(self):
+        with mock.patch.object(answer_cache, 'ANSWER_CACHE_ENABLED', False), \
+                mock.patch.object(answer_cache.Conversation, 'objects') as objects:
+            self.assertIsNone(answer_cache.get_cached_answer('key'))
+            self.assertEqual(answer_cache.get_cached_answers(['key']), {})
+        objects.filter.assert_not_called()
+
+
+def cv_matrix(cv_id, rows, dimensions=16, seed=0):
+    """A CVMatrix of random unit vectors, as load_cv_matrix builds it"""
+    matrix = np.random.default_rng(seed).standard_normal((rows, dimensions)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return exact_search.CVMatrix(cv_id, [f"point-{i}" for i in range(rows)], list(range(rows)),
+                                 [f"Chunk {i}" for i in range(rows)], matrix)
+
+
+class ExactSearchTests(SimpleTestCase):
+    """In-process search returns the true cosine top-k, in the shape of a vector store search"""
+
+    def test_matches_brute_force_ranking(self):
+        entry = cv_matrix(1, 200)
+        query = np.random.default_rng(1).standard_normal(16) * 3
+        expected = np.argsort(-(entry.matrix @ (query / np.linalg.norm(query))))[:5]
+
+        results = entry.search(query.tolist(), limit=5)
+        self.assertEqual([result.id for result in results], [f"point-{i}" for i in expected])
+        self.assertEqual([result.payload["chunk_index"] for result in results], list(expected))
+        self.assertEqual([result.score for result in results], sorted((result.score for result in results), reverse=True))
+        self.assertAlmostEqual(results[0].score, float(entry.matrix[expected[0]] @ query / np.linalg.norm(query)), places=5)
+
+    def test_limit_larger_than_the_cv(self):
+        self.assertEqual(len(cv_matrix(1, 3).search(np.ones(16), limit=10)), 3)
+        self.assertEqual(cv_matrix(1, 3).search(np.ones(16), limit=0), [])
+
+    def test_cache_evicts_least_recently_used_beyond_its_byte_budget(self):
+        entries = {cv_id: cv_matrix(cv_id, 10) for cv_id in (1, 2, 3)}
+        cache = exact_search.CVMatrixCache(max_bytes=2 * entries[1].nbytes, ttl=300)
+        with mock.patch.object(exact_search, 'load_cv_matrix', side_effect=lambda cv: entries[cv.id]) as load:
+            for cv_id in (1, 2, 1, 3):
+                cache.get(CV(id=cv_id))
+            self.assertEqual(load.call_count, 3)
+            cache.get(CV(id=1))
+            self.assertEqual(load.call_count, 3)
+            cache.get(CV(id=2))
+            self.assertEqual(load.call_count, 4)
+            cache.invalidate(2)
+            cache.get(CV(id=2))
+            self.assertEqual(load.call_count, 5)
+
+
+class HybridSearchTests(SimpleTestCase):
+    """Hybrid search fuses the vector and BM25 rankings with reciprocal rank fusion"""
+
+    def setUp(self):
+        self.points = {name: scored_point(f"00000000-0000-0000-0000-00000000000{i}", f"Chunk {name}.", i)
+                       for i, name in enumerate("abcd", start=1)}
+
+    def ranking(self, names):
+        return [self.points[name] for name in names]
+
+    def test_rrf_favours_chunks_ranked_well_by_both(self):
+        fused = cv_search.reciprocal_rank_fusion([self.ranking("abc"), self.ranking("cdb")], limit=10, k=60)
+        self.assertEqual([result.payload["text"] for result in fused], ["Chunk c.", "Chunk b.", "Chunk a.", "Chunk d."])
+        self.assertAlmostEqual(fused[0].score, 1 / 63 + 1 / 61)
+        self.assertAlmostEqual(fused[-1].score, 1 / 62)
+        self.assertEqual(len(cv_search.reciprocal_rank_fusion([self.ranking("abc")], limit=2)), 2)
+
+    def test_hybrid_mode_fuses_both_searches(self):
+        with mock.patch.object(cv_search, 'generate_query_embedding', return_value=[0.0] * 4), \
+                mock.patch.object(cv_search, '_vector_search', return_value=self.ranking("ab")) as vector, \
+                mock.patch.object(cv_search, 'lexical_search', return_value=self.ranking("db")) as lexical:
+            results = cv_search.search_cv(CV(id=1), "kubernetes c++", limit=2, mode='hybrid')
+        self.assertEqual([result.payload["text"] for result in results], ["Chunk b.", "Chunk a."])
+        candidates = 2 * cv_search.HYBRID_CANDIDATES
+        self.assertEqual(vector.call_args.args[2], candidates)
+        self.assertEqual(lexical.call_args.kwargs["limit"], candidates)
+
+    def test_tokenize_keeps_technical_terms(self):
+        self.assertEqual(tokenize("Worked with C++, C#, Node.js and CI/CD at the AZ-104 level."),
+                         ["worked", "c++", "c#", "node.js", "ci/cd", "az-104", "level"])
+
+
+def docx_upload(paragraphs, name='cv.docx'):
+    document = docx.Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    upload = io.BytesIO()
+    document.save(upload)
+    upload.seek(0)
+    upload.name = name
+    return upload
+
+
+class IncrementalReingestionTests(SimpleTestCase):
+    """Re-uploading a CV embeds only the chunks whose text changed"""
+
+    paragraphs = [f"Role {i}: built a data platform with Python, Kafka and Spark for {i + 2} years. "
+                  f"Mentored {i + 3} engineers and ran the on-call rotation." for i in range(40)]
+
+    def stored_chunks(self, cv, upload):
+        chunks = cv_upload.numbered_chunks(cv_upload.iter_chunks(cv_upload.iter_text_from_file(upload)))
+        return [CVChunk(id=i + 1, cv=cv, chunk_index=i, chunk_text=text, qdrant_point_id=f"point-{i}",
+                        content_hash=cv_upload.chunk_hash(text)) for i, text in chunks]
+
+    def update(self, cv, upload, stored, write_error=None):
+        embedded = []
+        committed = []
+
+        def embed(texts, batch_size):
+            # update_cv reuses (clears) the list it passes
+            embedded.extend(texts)
+            return np.zeros((len(texts), 4))
+
+        with mock.patch.object(cv_upload.CVChunk, 'objects') as objects, \
+                mock.patch.object(cv_upload.CV.objects, 'select_for_update') as select_for_update, \
+                mock.patch.object(cv_upload.transaction, 'atomic') as atomic, \
+                mock.patch.object(cv_upload.transaction, 'on_commit', side_effect=committed.append), \
+                mock.patch.object(cv_upload, 'get_vector_store') as get_store, \
+                mock.patch.object(cv_upload, '_write_chunks', side_effect=write_error) as write, \
+                mock.patch.object(cv_upload, 'generate_embeddings', side_effect=embed), \
+                mock.patch.object(cv_upload, 'remove_chunks_from_index'), \
+                mock.patch.object(cv_upload, 'invalidate_cv_answers'), \
+                mock.patch.object(cv_upload, 'invalidate_cv_matrix'), \
+                mock.patch.object(cv, 'save'):
+            self.store = get_store.return_value
+            locked = select_for_update.return_value.filter.return_value.values_list.return_value
+            locked.get.return_value = cv.content_hash
+            objects.filter.return_value.count.return_value = len(stored)
+            objects.filter.return_value.defer.return_value.order_by.return_value = stored
+            try:
+                counts = cv_upload.update_cv(cv, upload)
+            finally:
+                self.assertTrue(atomic.return_value.__enter__.called)
+                select_for_update.return_value.filter.assert_called_once_with(pk=cv.pk)
+            # The vector store changes wait for the commit
+            get_store.return_value.delete_chunks.assert_not_called()
+            for callback in committed:
+                callback()
+        return counts, embedded, get_store.return_value, write
+
+    def test_only_changed_chunks_are_embedded(self):
+        cv = CV(id=5, name="Candidate")
+        stored = self.stored_chunks(cv, docx_upload(self.paragraphs))
+        stored_texts = {chunk.chunk_text for chunk in stored}
+        edited = self.paragraphs[:-1] + ["Role 39: moved to platform engineering and led the Kubernetes migration."]
+
+        counts, embedded, store, write = self.update(cv, docx_upload(edited), stored)
+
+        self.assertFalse(counts["unchanged"])
+        self.assertGreater(counts["reused"], len(stored) - 3)
+        self.assertEqual(counts["embedded"], len(embedded))
+        self.assertTrue(embedded)
+        self.assertFalse(stored_texts & set(embedded))
+        self.assertEqual(counts["reused"] + counts["deleted"], len(stored))
+        if counts["deleted"]:
+            store.delete_chunks.assert_called_once()
+        write.assert_called()
+
+    def test_identical_upload_is_a_no_op(self):
+        upload = docx_upload(self.paragraphs)
+        cv = CV(id=5, name="Candidate", content_hash=cv_upload.file_content_hash(upload))
+        stored = self.stored_chunks(cv, upload)
+        upload.seek(0)
+
+        counts, embedded, store, write = self.update(cv, upload, stored)
+
+        self.assertTrue(counts["unchanged"])
+        self.assertEqual(counts["embeddings_skipped"], len(stored))
+        self.assertEqual(embedded, [])
+        write.assert_not_called()
+
+    def test_failed_update_removes_the_points_it_wrote(self):
+        cv = CV(id=5, name="Candidate")
+        stored = self.stored_chunks(cv, docx_upload(self.paragraphs[:20]))
+        with self.assertRaises(ConnectionError):
+            self.update(cv, docx_upload(self.paragraphs), stored, write_error=ConnectionError("Qdrant unavailable"))
+        (_, point_ids), _ = self.store.delete_chunks.call_args
+        self.assertTrue(point_ids)
+        self.assertFalse(any(point_id.startswith("point-") for point_id in point_ids))
+
+    def test_chunks_are_numbered_after_small_ones_are_dropped(self):
+        chunks = ["Ten years of Python and Django.", "Skills:", "Led the platform team of eight."]
+        self.assertEqual(list(cv_upload.numbered_chunks(chunks)), [(0, chunks[0]), (1, chunks[2])])
+        pairs = [(text, i) for i, text in enumerate(chunks)]
+        self.assertEqual(list(cv_upload.numbered_chunks(pairs, text_of=lambda pair: pair[0])),
+                         [(0, pairs[0]), (1, pairs[2])])
+
+
+class ContextBudgetTests(SimpleTestCase):
+    """Retrieved chunks are deduplicated, cut to the token budget and put back in CV order"""
+
+    def setUp(self):
+        patcher = mock.patch.object(context_builder, '_tokenizer', WhitespaceTokenizer())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_overlapping_sentences_are_kept_once(self):
+        results = [
+            scored_point("00000000-0000-0000-0000-000000000002", "Led a team of five. Shipped the API.", 2),
+            scored_point("00000000-0000-0000-0000-000000000001", "Joined in 2019. Led a team of five.", 1),
+        ]
+        context = context_builder.build_context(results, token_budget=100)
+        self.assertEqual(context.text, "Joined in 2019.\n\nLed a team of five. Shipped the API.")
+        self.assertEqual(context.dropped_sentences, 1)
+        self.assertEqual([result.payload["chunk_index"] for result in context.results], [1, 2])
+
+    def test_budget_keeps_the_most_relevant_sentences(self):
+        results = [
+            scored_point("00000000-0000-0000-0000-000000000003", "Expert in Kubernetes and Terraform.", 3),
+            scored_point("00000000-0000-0000-0000-000000000001", "Ten years of Python. Also some Perl.", 1),
+            scored_point("00000000-0000-0000-0000-000000000002", "Hobbies include chess.", 2),
+        ]
+        context = context_builder.build_context(results, token_budget=9)
+        self.assertEqual(context.text, "Ten years of Python.\n\nExpert in Kubernetes and Terraform.")
+        self.assertLessEqual(context.tokens, 9)
+        self.assertEqual(context.dropped_sentences, 2)
+        self.assertGreater(context.candidate_tokens, context.tokens)
+
+
+class ScriptedClient:
+    """OpenAI-style client whose completions raise or answer in the given order"""
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, timeout, stream=False):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=outcome))])
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class LLMGatewayTests(SimpleTestCase):
+    """The gateway retries transient failures, fails fast on the others and trips its breaker"""
+
+    def setUp(self):
+        patcher = mock.patch.object(llm_gateway, 'LLM_RETRY_BASE_DELAY', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def gateway(self, client, **options):
+        return LLMGateway(lambda: client, name='test', hedge_after=0, **options)
+
+    def test_transient_errors_are_retried(self):
+        client = ScriptedClient(UpstreamError(503), TimeoutError(), " Answer ")
+        gateway = self.gateway(client, max_retries=2)
+        self.assertEqual(gateway.complete('model', []), "Answer")
+        self.assertEqual((client.calls, gateway.stats["retries"], gateway.stats["successes"]), (3, 2, 1))
+
+    def test_client_errors_are_not_retried(self):
+        client = ScriptedClient(UpstreamError(400))
+        gateway = self.gateway(client, max_retries=2)
+        with self.assertRaises(LLMError) as raised:
+            gateway.complete('model', [])
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(raised.exception.status_code, 502)
+        self.assertEqual(gateway.breaker.state, 'closed')
+
+    def test_timeouts_surface_as_504(self):
+        gateway = self.gateway(ScriptedClient(TimeoutError()), max_retries=1)
+        with self.assertRaises(LLMTimeoutError) as raised:
+            gateway.complete('model', [])
+        self.assertEqual(raised.exception.status_code, 504)
+        self.assertEqual(gateway.stats["timeouts"], 1)
+
+    def test_breaker_opens_then_lets_a_trial_call_through(self):
+        client = ScriptedClient(UpstreamError(500), UpstreamError(500), "Recovered")
+        gateway = self.gateway(client, max_retries=0, breaker=CircuitBreaker(threshold=2, reset_after=60))
+        for _ in range(2):
+            with self.assertRaises(LLMError):
+                gateway.complete('model', [])
+        with self.assertRaises(LLMUnavailableError):
+            gateway.complete('model', [])
+        self.assertEqual(client.calls, 2)
+
+        gateway.breaker.opened_at -= 60
+        self.assertEqual(gateway.breaker.state, 'half_open')
+        self.assertEqual(gateway.complete('model', []), "Recovered")
+        self.assertEqual(gateway.breaker.state, 'closed')
+
+    def test_calls_beyond_the_concurrency_cap_are_rejected(self):
+        gateway = self.gateway(ScriptedClient("Answer"), max_concurrency=1, queue_timeout=0.01)
+        gateway._slots.acquire()
+        with self.assertRaises(LLMUnavailableError):
+            gateway.complete('model', [])
+        gateway._slots.release()
+        self.assertEqual(gateway.complete('model', []), "Answer")
+        self.assertEqual(gateway.stats["rejected"], 1)
+
+    def test_async_calls_share_the_cap_with_blocking_calls(self):
+        class AsyncClient(ScriptedClient):
+            async def create(self, model, messages, timeout, stream=False):
+                return ScriptedClient.create(self, model, messages, timeout)
+
+        async_client = AsyncClient("Async answer")
+        gateway = LLMGateway(lambda: None, lambda: async_client, name='test', hedge_after=0,
+                             max_concurrency=1, queue_timeout=0.05)
+        gateway._slots.acquire()
+        with self.assertRaises(LLMUnavailableError):
+            asyncio.run(gateway.acomplete('model', []))
+        self.assertEqual(async_client.calls, 0)
+
+        # A slot freed while the async call waits is picked up
+        threading.Timer(0.01, gateway._slots.release).start()
+        self.assertEqual(asyncio.run(gateway.acomplete('model', [])), "Async answer")
+        self.assertTrue(gateway._slots.acquire(blocking=False))
+
+
+class LLMRouterTests(SimpleTestCase):
+    """The router falls back to the next provider and demotes providers with an open circuit"""
+
+    def setUp(self):
+        patcher = mock.patch.object(llm_gateway, 'LLM_RETRY_BASE_DELAY', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def provider(self, name, *outcomes, cost=1.0, cacheable=True):
+        client = ScriptedClient(*outcomes)
+        gateway = LLMGateway(lambda: client, name=name, max_retries=0, hedge_after=0,
+                             breaker=CircuitBreaker(threshold=1, reset_after=60))
+        return LLMProvider(name, f"{name}-model", gateway, cost=cost, cacheable=cacheable)
+
+    def test_falls_back_when_the_preferred_provider_fails(self):
+        router = LLMRouter([self.provider('primary', UpstreamError(503)),
+                            self.provider('local', "Local answer", cacheable=False)], policy='priority')
+        answer = router.complete([])
+        self.assertEqual((answer.text, answer.provider, answer.fallback, answer.cacheable),
+                         ("Local answer", 'local', True, False))
+        self.assertEqual(router.stats["fallbacks"], 1)
+        # The failure opened the primary's circuit: it is now tried last
+        self.assertEqual([provider.name for provider in router.route()], ['local', 'primary'])
+
+    def test_raises_the_last_error_when_every_provider_fails(self):
+        router = LLMRouter([self.provider('primary', UpstreamError(503)),
+                            self.provider('secondary', UpstreamError(400))], policy='priority')
+        with self.assertRaises(LLMError) as raised:
+            router.complete([])
+        self.assertIn("HTTP 400", str(raised.exception))
+        self.assertEqual(router.stats["failures"], 1)
+
+    def test_cost_policy_and_cacheable_model_id(self):
+        router = LLMRouter([self.provider('primary', "Paid", cost=2.0),
+                            self.provider('cheap', "Cheap", cost=0.5),
+                            self.provider('local', "Local", cost=0.0, cacheable=False)], policy='cost')
+        self.assertEqual([provider.name for provider in router.route()], ['local', 'cheap', 'primary'])
+        self.assertEqual(router.model_id, 'primary-model+cheap-model')
+
+    def test_falls_back_to_the_local_extractive_provider(self):
+        from .services import ai_service, local_llm
+        from .services.llm_router import provider_from_env
+        context = ("Maria Lopez is a backend engineer.\n\n"
+                   "She holds the AWS Solutions Architect certification. She speaks Spanish and English.")
+        messages = ai_service.build_messages(context, "Which certifications does she have?")
+        with mock.patch.object(local_llm, 'LOCAL_LLM_MODEL', ''):
+            local = provider_from_env('local')
+            router = LLMRouter([self.provider('primary', UpstreamError(503)), local], policy='priority')
+            answer = router.complete(messages)
+            streamed = router.stream(messages)
+            deltas = list(streamed)
+            async_answer = asyncio.run(router.acomplete(messages))
+
+        expected = "She holds the AWS Solutions Architect certification."
+        self.assertEqual((answer.text, answer.provider, answer.cacheable), (expected, 'local', False))
+        self.assertEqual(("".join(deltas), streamed.provider), (expected, 'local'))
+        self.assertEqual(async_answer.text, expected)
+
+
+class CandidateRankingTests(SimpleTestCase):
+    """Ranking covers every storage layout"""
+
+    def test_per_cv_collections_are_flagged_not_searched(self):
+        shared = {1: [(0.5, {"text": "A.", "chunk_index": 0}), (0.4, {"text": "A2.", "chunk_index": 1})],
+                  2: [(0.9, {"text": "B.", "chunk_index": 0}), (0.1, {"text": "B2.", "chunk_index": 1})]}
+        cvs = {1: CV(id=1, name="A"), 2: CV(id=2, name="B")}
+        with mock.patch.object(candidate_ranking, 'embed_ranking_query', return_value=[0.0] * 4), \
+                mock.patch.object(candidate_ranking, '_search_shared_collection', return_value=shared), \
+                mock.patch.object(candidate_ranking, '_search_pgvector', return_value={}), \
+                mock.patch.object(candidate_ranking.CV.objects, 'filter') as cv_filter:
+            cv_filter.return_value.in_bulk.return_value = cvs
+            cv_filter.return_value.count.return_value = 0
+            by_mean = candidate_ranking.rank_candidates("Python", 'mean', top_n=2)
+            cv_filter.return_value.count.return_value = 250
+            flagged = candidate_ranking.rank_candidates("Python", 'max', top_n=2)
+
+        self.assertEqual([(r["cv_id"], r["score"]) for r in by_mean["results"]], [(2, 0.5), (1, 0.45)])
+        self.assertFalse(by_mean["migration_required"])
+        self.assertNotIn("warning", by_mean)
+        self.assertEqual([r["cv_id"] for r in flagged["results"]], [2, 1])
+        self.assertEqual(flagged["results"][0]["matches"][0]["text"], "B.")
+        self.assertTrue(flagged["migration_required"])
+        self.assertEqual(flagged["unranked_cvs"], 250)
+        self.assertIn("migrate_to_shared_collection", flagged["warning"])
+
+    def test_pgvector_search_widens_until_enough_cvs(self):
+        # CV 1 holds the 8 nearest chunks, CVs 2 and 3 come after
+        chunks = [(1, 0.1 + i / 100, f"Chunk {i}.", i) for i in range(8)] + [(2, 0.3, "B.", 0), (3, 0.4, "C.", 0)]
+        with mock.patch.object(candidate_ranking.CV.objects, 'filter') as cv_filter, \
+                mock.patch.object(candidate_ranking, '_nearest_pgvector_chunks',
+                                  side_effect=lambda vector, limit: chunks[:limit]) as nearest:
+            cv_filter.return_value.exists.return_value = True
+            hits = candidate_ranking._search_pgvector([0.0] * 4, cv_limit=3, top_n=2)
+        self.assertEqual(sorted(hits), [1, 2, 3])
+        self.assertEqual(len(hits[1]), 2)
+        self.assertEqual([call.args[1] for call in nearest.call_args_list], [6, 12])
+
+
+class IngestionJobCleanupTests(SimpleTestCase):
+    """Spooled uploads are kept for retries and deleted once no attempt is left"""
+
+    def run_failing_job(self, attempts, error):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        path = os.path.join(directory, 'upload.docx')
+        with open(path, 'wb') as spooled:
+            spooled.write(b'not really a docx')
+        job = IngestionJob(id=1, cv=CV(id=4, name="Candidate"), file_path=path, original_name='cv.docx',
+                           attempts=attempts, max_attempts=3)
+        with mock.patch.object(ingestion_queue, 'ingest_cv', side_effect=error), \
+                mock.patch.object(ingestion_queue.CV.objects, 'filter'), \
+                mock.patch.object(job, 'save'):
+            self.assertFalse(ingestion_queue.run_job(job))
+        return job, path
+
+    def test_retried_job_keeps_its_upload(self):
+        job, path = self.run_failing_job(1, ConnectionError("Qdrant unavailable"))
+        self.assertEqual(job.status, IngestionJob.STATUS_QUEUED)
+        self.assertTrue(os.path.exists(path))
+
+    def test_final_failure_deletes_the_upload(self):
+        for attempts, error in [(3, ConnectionError("Qdrant unavailable")), (1, ValueError("Unreadable document"))]:
+            with self.subTest(error=error):
+                job, path = self.run_failing_job(attempts, error)
+                self.assertEqual(job.status, IngestionJob.STATUS_FAILED)
+                self.assertFalse(os.path.exists(path))
+
+    def test_stale_job_on_its_last_attempt_fails(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        jobs = []
+        for i, attempts in enumerate([1, 3], start=1):
+            path = os.path.join(directory, f'upload{i}.docx')
+            with open(path, 'wb') as spooled:
+                spooled.write(b'not really a docx')
+            jobs.append(IngestionJob(id=i, cv_id=10 + i, file_path=path, attempts=attempts, max_attempts=3,
+                                     status=IngestionJob.STATUS_RUNNING))
+
+        with mock.patch.object(ingestion_queue.transaction, 'atomic'), \
+                mock.patch.object(ingestion_queue.IngestionJob.objects, 'select_for_update') as select_for_update, \
+                mock.patch.object(ingestion_queue.IngestionJob.objects, 'filter') as job_filter, \
+                mock.patch.object(ingestion_queue.CV.objects, 'filter') as cv_filter:
+            select_for_update.return_value.filter.return_value = jobs
+            self.assertEqual(ingestion_queue.requeue_stale_jobs(), (1, 1))
+
+        updates = {call.kwargs["id__in"][0]: update.kwargs["status"]
+                   for call, update in zip(job_filter.call_args_list, job_filter.return_value.update.call_args_list)}
+        self.assertEqual(updates, {1: IngestionJob.STATUS_QUEUED, 2: IngestionJob.STATUS_FAILED})
+        self.assertEqual([call.kwargs["id__in"] for call in cv_filter.call_args_list], [[11], [12]])
+        self.assertIn("lease", job_filter.return_value.update.call_args_list[1].kwargs["last_error"])
+        self.assertTrue(os.path.exists(jobs[0].file_path))
+        self.assertFalse(os.path.exists(jobs[1].file_path))
+
+    def test_worker_sweeps_periodically(self):
+        stop_event = threading.Event()
+        with mock.patch.object(ingestion_queue, 'INGESTION_SWEEP_INTERVAL', 0.05), \
+                mock.patch.object(ingestion_queue, 'close_old_connections'), \
+                mock.patch.object(ingestion_queue, 'claim_next_job', return_value=None), \
+                mock.patch.object(ingestion_queue, 'requeue_stale_jobs') as sweep:
+            worker = threading.Thread(target=ingestion_queue.run_worker,
+                                      kwargs={"stop_event": stop_event, "poll_interval": 0.01})
+            worker.start()
+            time.sleep(0.3)
+            stop_event.set()
+            worker.join(5)
+        self.assertGreaterEqual(sweep.call_count, 3)
+        self.assertLessEqual(sweep.call_count, 8)
+
+
+class CircuitBreakerTrialTests(SimpleTestCase):
+    """A half-open trial that ends without an outcome must not block the circuit for good"""
+
+    def half_open_gateway(self, client=None, async_client=None):
+        gateway = LLMGateway(lambda: client, lambda: async_client, name='test', max_retries=0, hedge_after=0,
+                             breaker=CircuitBreaker(threshold=1, reset_after=60))
+        gateway.breaker.record_failure()
+        gateway.breaker.opened_at -= 60
+        self.assertEqual(gateway.breaker.state, 'half_open')
+        return gateway
+
+    def test_stream_closed_early_releases_the_trial(self):
+        gateway = self.half_open_gateway(FakeGroqClient(first_token_delay=0, token_delay=0))
+        stream = gateway.stream('model', [{"role": "user", "content": "Q: Which languages?"}])
+        self.assertEqual(next(stream), "Based")
+        stream.close()
+
+        self.assertEqual(gateway.breaker.state, 'half_open')
+        answer = gateway.complete('model', [{"role": "user", "content": "Q: Which languages?"}])
+        self.assertTrue(answer.endswith("Which languages?"))
+        self.assertEqual(gateway.breaker.state, 'closed')
+
+    def test_cancelled_trial_releases_the_trial(self):
+        gateway = self.half_open_gateway(async_client=FakeAsyncGroqClient(first_token_delay=5, token_delay=0))
+
+        async def cancel_trial():
+            task = asyncio.ensure_future(gateway.acomplete('model', [{"role": "user", "content": "Q: Degree?"}]))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_trial())
+        self.assertEqual(gateway.breaker.state, 'half_open')
+        self.assertTrue(gateway.breaker.allow())
+
+
+class GatewayHedgingTests(SimpleTestCase):
+    """A slow request is hedged with a second one, and the first answer wins"""
+
+    def test_hedge_wins_over_a_slow_primary(self):
+        class SlowFirstClient(ScriptedClient):
+            def create(self, model, messages, timeout, stream=False):
+                if self.calls == 0:
+                    self.calls += 1
+                    time.sleep(0.5)
+                    return ScriptedClient.create(self, model, messages, timeout)
+                return ScriptedClient.create(self, model, messages, timeout)
+
+        client = SlowFirstClient("Hedged answer")
+        gateway = LLMGateway(lambda: client, name='test', hedge_after=0.05, max_concurrency=2)
+        started = time.monotonic()
+        self.assertEqual(gateway.complete('model', []), "Hedged answer")
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual((gateway.stats["hedges"], gateway.stats["hedge_wins"]), (1, 1))
+
+    def test_no_hedge_without_a_spare_slot(self):
+        client = ScriptedClient("Answer")
+        gateway = LLMGateway(lambda: client, name='test', hedge_after=0.01, max_concurrency=1)
+        with mock.patch.object(client.chat.completions, 'create',
+                               side_effect=lambda **kwargs: (time.sleep(0.05), ScriptedClient.create(client, **kwargs))[1]):
+            self.assertEqual(gateway.complete('model', []), "Answer")
+        self.assertEqual(gateway.stats["hedges"], 0)
+
+
+class FakeLLMServerTests(SimpleTestCase):
+    """The real Groq client and the gateway against the local fake server"""
+
+    messages = [{"role": "user", "content": "CV:\nPython developer.\n\nQ: Which languages?\nA:"}]
+
+    def serve(self, **options):
+        server = FakeLLMServer(token_delay=0, seed=0, **options)
+        url = server.start()
+        self.addCleanup(server.stop)
+        client = groq.Client(api_key='fake', base_url=url, max_retries=0)
+        return server, client
+
+    def test_answers_and_streams(self):
+        server, client = self.serve(first_token_delay=0.01)
+        gateway = LLMGateway(lambda: client, name='fake', hedge_after=0)
+        self.assertEqual(gateway.complete('fake', self.messages),
+                         "Based on the CV, here is what it says about: Which languages?")
+        self.assertEqual("".join(gateway.stream('fake', self.messages)),
+                         "Based on the CV, here is what it says about: Which languages?")
+        self.assertEqual(server.stats["requests"], 2)
+
+    def test_slow_server_times_out(self):
+        server, client = self.serve(first_token_delay=1.0)
+        gateway = LLMGateway(lambda: client, name='fake', hedge_after=0, timeout=0.1, max_retries=0)
+        started = time.monotonic()
+        with self.assertRaises(LLMTimeoutError):
+            gateway.complete('fake', self.messages)
+        self.assertLess(time.monotonic() - started, 0.9)
+
+    def test_server_errors_are_retried_then_reported(self):
+        server, client = self.serve(first_token_delay=0, error_rate=1.0)
+        with mock.patch.object(llm_gateway, 'LLM_RETRY_BASE_DELAY', 0):
+            gateway = LLMGateway(lambda: client, name='fake', hedge_after=0, max_retries=2)
+            with self.assertRaises(LLMError) as raised:
+                gateway.complete('fake', self.messages)
+        self.assertEqual(raised.exception.status_code, 502)
+        self.assertEqual(server.stats["errors"], 3)
+        self.assertEqual(gateway.stats["retries"], 2)
+
+
+class MetricsTests(SimpleTestCase):
+    """The Prometheus exposition of the metrics registry"""
+
+    def test_render_labelled_histograms_and_counters(self):
+        for provider, seconds in [("groq", 0.04), ("groq", 3.0), ("local", 0.2)]:
+            metrics.get_histogram('test_render_seconds', 'Rendering test', (0.1, 1.0),
+                                  labels={"provider": provider}).observe(seconds)
+        metrics.get_counter('test_render_total', 'Rendering "test"\ncounter').inc(2)
+
+        lines = metrics.render_prometheus().splitlines()
+        self.assertEqual(lines.count("# TYPE test_render_seconds histogram"), 1)
+        for line in ['test_render_seconds_bucket{provider="groq",le="0.1"} 1',
+                     'test_render_seconds_bucket{provider="groq",le="+Inf"} 2',
+                     'test_render_seconds_count{provider="groq"} 2',
+                     'test_render_seconds_sum{provider="local"} 0.2',
+                     '# HELP test_render_total Rendering "test"\\ncounter',
+                     'test_render_total 2']:
+            self.assertIn(line, lines)
+        with self.assertRaisesMessage(ValueError, 'already registered as a histogram'):
+            metrics.get_counter('test_render_seconds', labels={"provider": "groq"})
+
+    def test_llm_providers_share_one_histogram(self):
+        for name in ("metrics_a", "metrics_b"):
+            LLMProvider(name, 'model', LLMGateway(lambda: None, name=name)).observe(0.3)
+        text = metrics.render_prometheus()
+        self.assertIn('llm_latency_seconds_count{provider="metrics_a"} 1', text)
+        self.assertIn('llm_latency_seconds_count{provider="metrics_b"} 1', text)
+        self.assertNotIn('llm_metrics_a_latency', text)
+
+    def test_metrics_of_other_processes_are_merged(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        child = (
+            "from cv_chatbot_app.services import metrics\n"
+            "histogram = metrics.get_histogram('test_merged_seconds', 'Merged', (0.1, 1.0))\n"
+            "histogram.observe(0.05)\nhistogram.observe(0.5)\n"
+            "metrics.get_counter('test_merged_total').inc()\n"
+        )
+        # The child writes its file when it exits
+        subprocess.run([sys.executable, '-c', child], check=True, timeout=60,
+                       env=dict(os.environ, METRICS_MULTIPROC_DIR=directory, METRICS_FLUSH_INTERVAL='60'))
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+        with mock.patch.object(metrics, 'METRICS_MULTIPROC_DIR', directory):
+            metrics.get_histogram('test_merged_seconds', 'Merged', (0.1, 1.0)).observe(2.0)
+            lines = metrics.render_prometheus().splitlines()
+            summaries = metrics.histogram_summaries()
+
+        self.assertIn('test_merged_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('test_merged_seconds_bucket{le="+Inf"} 3', lines)
+        self.assertIn('test_merged_seconds_sum 2.55', lines)
+        self.assertIn('test_merged_total 1', lines)
+        self.assertEqual(summaries["test_merged_seconds"]["count"], 3)
+
+
+class TracingTests(SimpleTestCase):
+    """Spans recorded for a request and the stage metrics they feed"""
+
+    def stage_count(self, stage):
+        return tracing._stage_histogram(stage).summary()["count"]
+
+    def test_nested_spans_are_recorded_on_the_trace(self):
+        @tracing.traced('test_async_stage')
+        async def async_stage():
+            await asyncio.sleep(0)
+            return "done"
+
+        before = self.stage_count('test_outer')
+        trace, token, profiler = tracing.start_trace('POST', '/api/chat/')
+        with tracing.span('test_outer'):
+            with tracing.span('test_inner'):
+                pass
+            tracing.record_span('test_stream', 0.01)
+        with self.assertRaises(ValueError):
+            with tracing.span('test_failing'):
+                raise ValueError("boom")
+        self.assertEqual(asyncio.run(async_stage()), "done")
+        with mock.patch.object(tracing, 'TRACE_SLOW_REQUEST_SECONDS', 0):
+            tracing.finish_trace(trace, token, profiler, 'chat_with_cv', 200)
+
+        self.assertIsNone(tracing.get_current_trace())
+        spans = {span["stage"]: span for span in trace.to_dict()["spans"]}
+        self.assertEqual(list(trace.stages()), ['test_inner', 'test_stream', 'test_outer', 'test_failing',
+                                                'test_async_stage'])
+        self.assertEqual((spans['test_outer']["depth"], spans['test_inner']["depth"]), (0, 1))
+        self.assertEqual(spans['test_stream']["duration"], 0.01)
+        self.assertEqual(spans['test_failing']["error"], 'ValueError')
+        self.assertEqual(self.stage_count('test_outer'), before + 1)
+        self.assertGreaterEqual(metrics.counter_values()['stage_errors_total{stage=test_failing}'], 1)
+        self.assertIn('http_requests_total{view="chat_with_cv",status="200"} ', metrics.render_prometheus())
+
+    def test_spans_without_a_trace_only_feed_the_metrics(self):
+        before = self.stage_count('test_untraced')
+        with tracing.span('test_untraced'):
+            pass
+        self.assertEqual(self.stage_count('test_untraced'), before + 1)
+
+
+class BulkImportTests(SimpleTestCase):
+    """Bulk import bounds the documents extracted ahead and redoes only abandoned CVs"""
+
+    def test_extraction_window_is_bounded(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        paths = []
+        for i in range(7):
+            path = os.path.join(directory, f'cv{i}.docx')
+            with open(path, 'wb') as f:
+                f.write(docx_upload([f"Candidate {i} has ten years of Python and Django experience."]).read())
+            paths.append(path)
+
+        importer = bulk_import.BulkImporter(workers=1, batch_chunks=10 ** 6, log=lambda message: None)
+        ahead = []
+
+        class CountingExecutor(ThreadPoolExecutor):
+            submitted = 0
+
+            def submit(self, fn, *args):
+                CountingExecutor.submitted += 1
+                ahead.append(CountingExecutor.submitted - len(importer._pending))
+                return super().submit(fn, *args)
+
+        flushed = []
+        with mock.patch.object(bulk_import, 'ProcessPoolExecutor', CountingExecutor), \
+                mock.patch.object(bulk_import, 'BULK_IMPORT_PREFETCH', 2), \
+                mock.patch.object(cv_upload, 'PDF_EXTRACT_WORKERS', cv_upload.PDF_EXTRACT_WORKERS), \
+                mock.patch.object(importer, '_select', return_value=[(path, f'hash{i}') for i, path in enumerate(paths)]), \
+                mock.patch.object(importer, '_flush', side_effect=lambda: flushed.extend(importer._pending)):
+            importer.run(paths)
+
+        self.assertEqual(sorted(path for path, _, _ in flushed), paths)
+        self.assertEqual(max(ahead), 2)
+        self.assertIn("Candidate 3 has ten years", dict((path, chunks) for path, _, chunks in flushed)[paths[3]][0])
+
+    def test_only_abandoned_cvs_are_discarded(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        paths = []
+        for i in range(4):
+            path = os.path.join(directory, f'cv{i}.docx')
+            with open(path, 'wb') as f:
+                f.write(f"CV {i}".encode())
+            paths.append(path)
+        hashes = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                hashes.append(cv_upload.file_content_hash(f))
+
+        now = timezone.now()
+        interrupted_import = CV(id=1, name="cv0", content_hash=hashes[0], status=CV.STATUS_PROCESSING,
+                                source=CV.SOURCE_BULK_IMPORT, uploaded_at=now)
+        upload_in_progress = CV(id=2, name="cv1", content_hash=hashes[1], status=CV.STATUS_PROCESSING,
+                                uploaded_at=now - timedelta(seconds=30))
+        stale_upload = CV(id=3, name="cv2", content_hash=hashes[2], status=CV.STATUS_PROCESSING,
+                          uploaded_at=now - timedelta(hours=2))
+        discarded = []
+        importer = bulk_import.BulkImporter(workers=1, stale_after=3600, log=lambda message: None)
+        with mock.patch.object(bulk_import.CV.objects, 'filter') as cv_filter, \
+                mock.patch.object(bulk_import, '_discard_cv', side_effect=discarded.append):
+            existing = cv_filter.return_value
+            existing.exclude.return_value.filter.return_value = [interrupted_import, upload_in_progress, stale_upload]
+            existing.values_list.side_effect = lambda *args, **kwargs: [hashes[1]]
+            selected = importer._select(paths)
+
+        self.assertEqual(discarded, [interrupted_import, stale_upload])
+        self.assertEqual(selected, [(paths[0], hashes[0]), (paths[2], hashes[2]), (paths[3], hashes[3])])
+        self.assertEqual(importer.counts['skipped'], 1)
+
+
+class AsyncQueryEmbeddingTests(SimpleTestCase):
+    """The async query embedding keeps the cache and the model off the event loop"""
+
+    def test_cache_and_encoding_run_in_the_executor(self):
+        from .services import embedding
+        threads = []
+
+        class RecordingCache(QueryEmbeddingCache):
+            def get(self, text):
+                threads.append(('get', threading.current_thread().name))
+                return super().get(text)
+
+            def put(self, text, vector):
+                threads.append(('put', threading.current_thread().name))
+                super().put(text, vector)
+
+        class Model:
+            def encode(self, text):
+                threads.append(('encode', threading.current_thread().name))
+                return np.ones(4, dtype=np.float32)
+
+        def load_model():
+            threads.append(('load', threading.current_thread().name))
+            return Model()
+
+        async def embed_twice():
+            first = await embedding.agenerate_query_embedding("Which languages does she know?")
+            second = await embedding.agenerate_query_embedding("which  languages does she know?")
+            return first, second, threading.current_thread().name
+
+        with mock.patch.object(embedding, '_query_cache', RecordingCache(max_size=8)), \
+                mock.patch.object(embedding, '_embedding_model', None), \
+                mock.patch.object(embedding, 'load_embedding_model', side_effect=load_model):
+            first, second, loop_thread = asyncio.run(embed_twice())
+
+        self.assertEqual(first, [1.0] * 4)
+        self.assertEqual(second, first)
+        self.assertEqual([step for step, _ in threads], ['get', 'load', 'encode', 'put', 'get'])
+        self.assertTrue(all(name.startswith('embedding') and name != loop_thread for _, name in threads))
+
+
+class LoopBoundClientTests(SimpleTestCase):
+    """Async clients replaced for another event loop are closed"""
+
+    class Client:
+        def __init__(self):
+            self.closed = False
+
+        async def close(self):
+            self.closed = True
+
+    def test_one_client_per_loop_closed_at_loop_shutdown(self):
+        holder = async_clients.LoopBoundClient(self.Client)
+
+        async def get_twice():
+            first, created = holder.get()
+            again, created_again = holder.get()
+            self.assertIs(again, first)
+            self.assertEqual((created, created_again), (True, False))
+            return first
+
+        first = asyncio.run(get_twice())
+        self.assertTrue(first.closed)
+        second = asyncio.run(get_twice())
+        self.assertIsNot(second, first)
+        self.assertTrue(second.closed)
+
+    def test_client_of_a_running_loop_is_closed_when_replaced(self):
+        holder = async_clients.LoopBoundClient(self.Client)
+        other_loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=other_loop.run_forever, daemon=True)
+        thread.start()
+        self.addCleanup(other_loop.close)
+        self.addCleanup(thread.join)
+        self.addCleanup(other_loop.call_soon_threadsafe, other_loop.stop)
+
+        async def get():
+            return holder.get()[0]
+
+        first = asyncio.run_coroutine_threadsafe(get(), other_loop).result(5)
+
+        async def replace():
+            client = holder.get()[0]
+            for _ in range(100):
+                if first.closed:
+                    break
+                await asyncio.sleep(0.01)
+            return client
+
+        second = asyncio.run(replace())
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+
+    def test_groq_client_is_closed_with_its_loop(self):
+        async def get():
+            return ai_service.get_async_groq_client()
+
+        with mock.patch.object(ai_service, 'LLM_BACKEND', 'fake'), \
+                mock.patch.object(ai_service, '_async_client', async_clients.LoopBoundClient(ai_service._build_async_client)), \
+                mock.patch('cv_chatbot_app.services.fake_llm.FakeAsyncGroqClient.close') as close:
+            first = asyncio.run(get())
+            second = asyncio.run(get())
+        self.assertIsNot(second, first)
+        self.assertEqual(close.await_count, 2)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "needs fork")
+    def test_forked_child_builds_its_own_clients(self):
+        holder = async_clients.LoopBoundClient(self.Client)
+        parent_loop = asyncio.new_event_loop()
+        self.addCleanup(parent_loop.close)
+
+        async def get():
+            return holder.get()[0]
+
+        inherited = parent_loop.run_until_complete(get())
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Child: report whether it got a new client and left the parent's alone
+            try:
+                client = asyncio.run(get())
+                qdrant_client = asyncio.run(self._async_qdrant_client())
+                ok = client is not inherited and not inherited.closed and qdrant_client is not None
+            except Exception:
+                ok = False
+            os.write(write_end, b'1' if ok else b'0')
+            os._exit(0)
+        os.close(write_end)
+        os.waitpid(pid, 0)
+        self.assertEqual(os.read(read_end, 1), b'1')
+        os.close(read_end)
+
+    @staticmethod
+    async def _async_qdrant_client():
+        with mock.patch.object(qdrant_service, 'QDRANT_PATH', ':memory:'):
+            return qdrant_service.get_async_qdrant_client()
+
+
+class ChatStreamTests(SimpleTestCase):
+    """chat_stream sends the answer as server-sent events, from the LLM or the answer cache"""
+
+    question = "Which languages?"
+
+    def setUp(self):
+        patcher = mock.patch.object(context_builder, '_tokenizer', WhitespaceTokenizer())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stream(self, cached=None):
+        client = FakeGroqClient(first_token_delay=0, token_delay=0)
+        router = LLMRouter([LLMProvider('fake', 'fake-model', LLMGateway(lambda: client, name='fake', hedge_after=0))])
+        results = [scored_point("00000000-0000-0000-0000-000000000001", "Ten years of Python and Go.", 0)]
+        request = APIRequestFactory().post('/api/chat/stream/', {"cv_id": 7, "question": self.question}, format='json')
+
+        async def collect():
+            response = await views.chat_stream(request)
+            return response, [chunk async for chunk in response]
+
+        with mock.patch.object(views.CV.objects, 'aget',
+                               mock.AsyncMock(return_value=CV(id=7, name="Candidate", status=CV.STATUS_READY))), \
+                mock.patch.object(views, 'asearch_cv', mock.AsyncMock(return_value=results)), \
+                mock.patch.object(views, 'aget_cached_answer', mock.AsyncMock(return_value=cached)), \
+                mock.patch.object(views, 'answer_cache_key', return_value='key'), \
+                mock.patch.object(views.Conversation.objects, 'acreate', mock.AsyncMock()) as save, \
+                mock.patch('cv_chatbot_app.services.ai_service._router', router):
+            response, chunks = asyncio.run(collect())
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b"".join(chunks).decode()
+        self.assertTrue(body.endswith("\n\n"))
+        events = []
+        for message in body[:-2].split("\n\n"):
+            lines = message.split("\n")
+            event = lines[0][len("event: "):] if lines[0].startswith("event: ") else "message"
+            self.assertTrue(lines[-1].startswith("data: "))
+            events.append((event, json.loads(lines[-1][len("data: "):])))
+        return events, save
+
+    def durations(self):
+        return views._stream_duration_histogram.summary()["count"], views._ttft_histogram.summary()["count"]
+
+    def test_llm_answer_is_streamed_token_by_token(self):
+        before = self.durations()
+        events, save = self.stream()
+        answer = f"Based on the CV, here is what it says about: {self.question}"
+        tokens = [data["token"] for event, data in events if event == "message"]
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual("".join(tokens), answer)
+        self.assertEqual(events[-1][0], "done")
+        self.assertEqual(events[-1][1]["response"], answer)
+        self.assertEqual((events[-1][1]["cached"], events[-1][1]["provider"]), (False, "fake"))
+        self.assertEqual(save.await_args.kwargs["cache_key"], 'key')
+        self.assertEqual(self.durations(), (before[0] + 1, before[1] + 1))
+
+    def test_cached_answer_is_sent_as_one_token(self):
+        before = self.durations()
+        events, save = self.stream(cached="Python and Go.")
+        self.assertEqual(events, [("message", {"token": "Python and Go."}),
+                                  ("done", {"response": "Python and Go.", "cached": True})])
+        self.assertEqual(save.await_args.kwargs["response"], "Python and Go.")
+        self.assertEqual(self.durations(), (before[0] + 1, before[1] + 1))
+
+
+class StartupTests(SimpleTestCase):
+    """Heavy clients and the embedding model load from the server's hooks, not on import"""
+
+    def test_importing_the_application_loads_no_heavy_package(self):
+        child = (
+            "import json, sys\n"
+            "import chatbot_project.asgi\n"
+            "from django.urls import get_resolver\n"
+            "get_resolver().url_patterns\n"
+            "from cv_chatbot_app.services.startup import get_startup_report\n"
+            "print(json.dumps({\n"
+            "    'loaded': [name for name in ('groq', 'qdrant_client', 'sentence_transformers', 'torch')\n"
+            "               if name in sys.modules],\n"
+            "    'phases': [phase['phase'] for phase in get_startup_report()['phases']],\n"
+            "}))\n"
+        )
+        env = {name: value for name, value in os.environ.items() if name != 'PREPARE_ON_IMPORT'}
+        result = subprocess.run([sys.executable, '-c', child], check=True, timeout=120, cwd=settings.BASE_DIR,
+                                env=env, capture_output=True, text=True)
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        self.assertEqual(report, {"loaded": [], "phases": ["django_setup"]})
+
+    def import_entrypoint(self, module, flag):
+        with mock.patch.dict(os.environ, {'PREPARE_ON_IMPORT': flag}), \
+                mock.patch.dict(sys.modules), \
+                mock.patch.object(startup, 'prepare_application') as prepare:
+            sys.modules.pop(module, None)
+            importlib.import_module(module)
+        return prepare
+
+    def test_entrypoints_prepare_only_when_asked(self):
+        for module in ('chatbot_project.wsgi', 'chatbot_project.asgi'):
+            with self.subTest(module=module):
+                self.assertFalse(self.import_entrypoint(module, 'false').called)
+                self.import_entrypoint(module, 'true').assert_called_once_with()
+
+    def test_prepare_application_loads_or_warms_the_model(self):
+        with mock.patch.object(startup, '_phases', []), \
+                mock.patch('cv_chatbot_app.services.embedding.get_embedding_model') as load, \
+                mock.patch('cv_chatbot_app.services.embedding.warmup_embedding_model') as warmup:
+            startup.prepare_application(warmup='load')
+            self.assertEqual((load.call_count, warmup.call_count), (1, 0))
+            startup.prepare_application(warmup='true')
+            self.assertEqual((load.call_count, warmup.call_count), (1, 1))
+            startup.prepare_application(warmup='false')
+            self.assertEqual((load.call_count, warmup.call_count), (1, 1))
+            phases = [phase["phase"] for phase in startup.get_startup_report()["phases"]]
+        self.assertEqual(phases, ['import_views', 'load_embedding_model', 'import_views',
+                                  'warmup_embedding_model', 'import_views'])
+
+    def test_failed_model_load_does_not_stop_startup(self):
+        with mock.patch.object(startup, '_phases', []), \
+                mock.patch('cv_chatbot_app.services.embedding.get_embedding_model', side_effect=OSError("no model")):
+            startup.prepare_application(warmup='load')
+
+    def gunicorn_hooks(self, preload):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        with mock.patch.dict(os.environ, {'GUNICORN_PRELOAD': preload, 'EMBEDDING_WARMUP': 'true',
+                                          'METRICS_MULTIPROC_DIR': directory}):
+            return runpy.run_path(os.path.join(settings.BASE_DIR, 'gunicorn.conf.py'))
+
+    def test_preloaded_master_loads_the_model_once_before_forking(self):
+        hooks = self.gunicorn_hooks('true')
+        with mock.patch.object(startup, 'prepare_application') as prepare:
+            hooks['when_ready'](None)
+            hooks['post_worker_init'](None)
+        # Workers only run the first inference (post_fork)
+        prepare.assert_called_once_with(warmup='load')
+
+    def test_each_worker_prepares_itself_without_preload(self):
+        hooks = self.gunicorn_hooks('false')
+        with mock.patch.object(startup, 'prepare_application') as prepare, \
+                mock.patch('cv_chatbot_app.services.embedding.warmup_embedding_model') as warmup:
+            hooks['when_ready'](None)
+            hooks['post_fork'](None, None)
+            hooks['post_worker_init'](None)
+        prepare.assert_called_once_with(warmup='true')
+        self.assertFalse(warmup.called)
+
+
+class PgVectorStoreTests(SimpleTestCase):
+    """The pgvector backend keeps embeddings on CVChunk rows and searches them by cosine distance"""
+
+    def test_vector_store_is_abstract(self):
+        with self.assertRaises(TypeError):
+            vector_store.VectorStore()
+
+        class NoSearch(vector_store.VectorStore):
+            def new_cv_storage(self): pass
+            def reset_cv(self, cv): pass
+            def add_chunks(self, cv, chunk_records, embeddings): pass
+            def fetch_vectors(self, cv, point_ids): pass
+            def delete_cv(self, cv): pass
+
+        with self.assertRaisesMessage(TypeError, 'search'):
+            NoSearch()
+
+    def test_new_cvs_get_the_pgvector_layout_and_keep_it(self):
+        store = vector_store.PgVectorStore()
+        self.assertEqual(store.new_cv_storage(), ('', CV.LAYOUT_PGVECTOR))
+        with mock.patch.object(vector_store, 'VECTOR_STORE_BACKEND', 'pgvector'):
+            self.assertIsInstance(vector_store.get_vector_store(), vector_store.PgVectorStore)
+        # Existing CVs stay on the backend they were stored with
+        self.assertIsInstance(vector_store.get_vector_store(CV(storage_layout=CV.LAYOUT_PGVECTOR)),
+                              vector_store.PgVectorStore)
+        self.assertIsInstance(vector_store.get_vector_store(CV(storage_layout=CV.LAYOUT_PER_CV)),
+                              vector_store.QdrantVectorStore)
+
+    def test_add_chunks_sets_the_embeddings_saved_with_the_rows(self):
+        cv = CV(id=3)
+        records = [CVChunk(cv=cv, chunk_index=i, chunk_text=f"Chunk {i}") for i in range(2)]
+        vector_store.PgVectorStore().add_chunks(cv, records, np.eye(2, 384))
+        self.assertEqual([record.embedding[i] for i, record in enumerate(records)], [1.0, 1.0])
+
+    def test_search_orders_the_cv_chunks_by_cosine_distance(self):
+        sql = str(vector_store.PgVectorStore()._queryset(CV(id=3), [0.5, 0.25], 4).query)
+        self.assertIn('"cv_id" = 3', sql)
+        self.assertIn('"embedding" <=> [0.5,0.25]', sql)
+        self.assertIn('AS "distance"', sql)
+        self.assertIn('ORDER BY 6 ASC LIMIT 4', sql)
+        self.assertNotIn('"embedding",', sql)
+
+    def chunks(self):
+        return [SimpleNamespace(qdrant_point_id=f"00000000-0000-0000-0000-00000000000{i}", cv_id=3,
+                                chunk_index=i, chunk_text=f"Chunk {i}", distance=0.1 * (i + 1))
+                for i in range(2)]
+
+    def test_results_are_scored_points_with_similarity_scores(self):
+        store = vector_store.PgVectorStore()
+        with mock.patch.object(store, '_queryset', return_value=self.chunks()) as queryset:
+            points = store.search(CV(id=3), [0.5, 0.25], limit=2)
+        queryset.assert_called_once_with(CV(id=3), [0.5, 0.25], 2)
+        self.assertEqual([round(point.score, 6) for point in points], [0.9, 0.8])
+        self.assertEqual(points[0].payload, {"text": "Chunk 0", "chunk_index": 0, "cv_id": 3})
+        self.assertEqual(str(points[1].id), "00000000-0000-0000-0000-000000000001")
+
+    def test_async_search_iterates_the_queryset(self):
+        store = vector_store.PgVectorStore()
+
+        async def rows():
+            for chunk in self.chunks():
+                yield chunk
+
+        with mock.patch.object(store, '_queryset', return_value=rows()):
+            points = asyncio.run(store.asearch(CV(id=3), [0.5, 0.25], limit=2))
+        self.assertEqual([point.payload["text"] for point in points], ["Chunk 0", "Chunk 1"])
+
+    def test_fetch_vectors_reads_the_cv_rows(self):
+        with mock.patch.object(CVChunk.objects, 'filter') as filter_:
+            filter_.return_value.values_list.return_value = [("a", [0.1]), ("b", [0.2])]
+            vectors = vector_store.PgVectorStore().fetch_vectors(CV(id=3), iter(["a", "b"]))
+        filter_.assert_called_once_with(cv_id=3, qdrant_point_id__in=["a", "b"])
+        self.assertEqual(vectors, {"a": [0.1], "b": [0.2]})
+
+
+class ParallelExtractionTests(SimpleTestCase):
+    """Large PDFs are extracted by page ranges in spawned processes, still yielded in page order"""
+
+    def test_pages_come_back_in_order_from_spawned_processes(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        path = os.path.join(directory, 'cv.pdf')
+        write_pdf(path, 7)
+        with open(path, 'rb') as file_obj:
+            sequential = list(cv_upload.iter_text_from_file(file_obj))
+
+        pools = []
+
+        def executor(*args, **kwargs):
+            pools.append(ProcessPoolExecutor(*args, **kwargs))
+            return pools[-1]
+
+        progress = {}
+        with mock.patch.object(cv_upload, 'PDF_EXTRACT_WORKERS', 2), \
+                mock.patch.object(cv_upload, 'PDF_PARALLEL_MIN_PAGES', 4), \
+                mock.patch.object(cv_upload, 'PDF_PAGES_PER_TASK', 3), \
+                mock.patch.object(cv_upload, '_extraction_pool', None), \
+                mock.patch.object(cv_upload, 'ProcessPoolExecutor', side_effect=executor) as pool_class, \
+                cv_upload.MappedFile(path) as file_obj:
+            pages = cv_upload.iter_text_from_file(file_obj, progress)
+            first = next(pages)
+            # Streaming: the first page is out before the rest is consumed
+            self.assertEqual(progress, {"done": 1, "total": 7})
+            parallel = [first] + list(pages)
+        for pool in pools:
+            pool.shutdown()
+
+        self.assertEqual(len(sequential), 7)
+        self.assertTrue(all(page.strip() for page in sequential))
+        self.assertEqual(parallel, sequential)
+        self.assertEqual(progress, {"done": 7, "total": 7})
+        self.assertEqual(pool_class.call_args.kwargs["mp_context"].get_start_method(), 'spawn')
+
+
+class MappedUploadTests(SimpleTestCase):
+    """Uploads spooled to disk are read through a memory map rather than loaded into memory"""
+
+    def write(self, data, name='cv.bin'):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        path = os.path.join(directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_reads_and_seeks_like_a_file(self):
+        with cv_upload.MappedFile(self.write(b"0123456789")) as mapped:
+            self.assertEqual((mapped.name, mapped.size), ('cv.bin', 10))
+            self.assertEqual(mapped.read(4), b"0123")
+            self.assertEqual(mapped.seek(2, io.SEEK_CUR), 6)
+            self.assertEqual(mapped.read(), b"6789")
+            self.assertEqual(mapped.read(3), b"")
+            self.assertEqual(mapped.seek(-3, io.SEEK_END), 7)
+            self.assertEqual(mapped.read(2), b"78")
+            self.assertEqual(mapped.tell(), 9)
+            mapped.seek(0)
+            self.assertEqual(mapped.read(), b"0123456789")
+        self.assertTrue(mapped.closed)
+        self.assertTrue(mapped._handle.closed)
+
+    def test_empty_file_reads_nothing(self):
+        with cv_upload.MappedFile(self.write(b"")) as mapped:
+            self.assertEqual(mapped.read(), b"")
+
+    def test_spooled_upload_is_extracted_through_the_map(self):
+        document = docx_upload(["First paragraph of the CV.", "Second paragraph."]).getvalue()
+        upload = TemporaryUploadedFile('cv.docx', 'application/octet-stream', len(document), None)
+        upload.write(document)
+        upload.flush()
+        self.addCleanup(upload.close)
+
+        with cv_upload.open_upload(upload) as opened:
+            self.assertIsInstance(opened, cv_upload.MappedFile)
+            self.assertEqual(opened.name, 'cv.docx')
+            self.assertEqual(cv_upload._pdf_source(opened), upload.temporary_file_path())
+            text = cv_upload.extract_text_from_file(opened)
+        self.assertTrue(opened.closed)
+        self.assertEqual(text, "First paragraph of the CV.\nSecond paragraph.\n")
+
+        # Small uploads Django kept in memory are used as they are
+        in_memory = SimpleUploadedFile('cv.docx', document)
+        with cv_upload.open_upload(in_memory) as opened:
+            self.assertIs(opened, in_memory)
+
+    def test_documents_over_the_limits_are_rejected(self):
+        with mock.patch.object(cv_upload, 'CV_MAX_UPLOAD_BYTES', 10), \
+                self.assertRaisesMessage(ValueError, "File is too large"), \
+                cv_upload.open_upload(SimpleUploadedFile('cv.pdf', b"x" * 11)):
+            pass
+
+        path = self.write(b"", name='cv.pdf')
+        write_pdf(path, 3)
+        with mock.patch.object(cv_upload, 'CV_MAX_PAGES', 2), \
+                cv_upload.MappedFile(path) as mapped, \
+                self.assertRaisesMessage(ValueError, "too many pages (3, maximum is 2)"):
+            cv_upload.extract_text_from_file(mapped)
+
+
+class CompactStorageTests(SimpleTestCase):
+    """Quantized collections store ID-only payloads; search results get their text from CVChunk rows"""
+
+    def setUp(self):
+        for name, value in [('QDRANT_PATH', ':memory:'), ('QDRANT_QUANTIZATION', 'int8'),
+                            ('QDRANT_PAYLOAD_MODE', 'ids')]:
+            patcher = mock.patch.object(qdrant_service, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        qdrant_service.reset_qdrant_client()
+        self.addCleanup(qdrant_service.reset_qdrant_client)
+
+        self.cv = CV(id=5, qdrant_collection_name='cv_compact', storage_layout=CV.LAYOUT_PER_CV)
+        self.chunks = [CVChunk(cv=self.cv, chunk_index=i, chunk_text=f"Chunk {i} of the CV",
+                               qdrant_point_id=f"00000000-0000-0000-0000-00000000000{i}") for i in range(3)]
+        self.store = vector_store.QdrantVectorStore()
+        self.store.create_cv_storage(self.cv)
+        self.store.add_chunks(self.cv, self.chunks, np.eye(3, 384))
+
+    def rows(self, missing=()):
+        """Patches the in_bulk lookup of chunk rows; returns the mock of CVChunk.objects.only"""
+        rows = {chunk.qdrant_point_id: chunk for chunk in self.chunks if chunk.chunk_index not in missing}
+        patcher = mock.patch.object(CVChunk.objects, 'only')
+        only = patcher.start()
+        self.addCleanup(patcher.stop)
+        only.return_value.in_bulk.side_effect = lambda ids, field_name: {i: rows[i] for i in ids if i in rows}
+
+        async def ain_bulk(ids, field_name):
+            return {i: rows[i] for i in ids if i in rows}
+
+        only.return_value.ain_bulk.side_effect = ain_bulk
+        return only
+
+    def test_collections_are_quantized_and_payloads_hold_ids_only(self):
+        client = qdrant_service.get_qdrant_client()
+        # Local mode accepts but does not keep the quantization, so check the request
+        with mock.patch.object(client, 'create_collection') as create:
+            qdrant_service.create_collection('cv_quantized')
+        quantization = create.call_args.kwargs["quantization_config"]
+        self.assertEqual(quantization.scalar.type, qdrant_models.ScalarType.INT8)
+        self.assertTrue(quantization.scalar.always_ram)
+        # Originals stay on disk, for rescoring
+        self.assertTrue(create.call_args.kwargs["vectors_config"].on_disk)
+
+        points, _ = qdrant_service.get_qdrant_client().scroll('cv_compact', with_payload=True)
+        self.assertEqual([point.payload for point in points], [{"cv_id": 5}] * 3)
+
+        params = qdrant_service.search_params()
+        self.assertEqual((params.quantization.rescore, params.quantization.oversampling),
+                         (qdrant_service.QDRANT_RESCORE, qdrant_service.QDRANT_OVERSAMPLING))
+        with mock.patch.object(qdrant_service, 'QDRANT_QUANTIZATION', 'binary'):
+            self.assertIsInstance(qdrant_service.quantization_config(), qdrant_models.BinaryQuantization)
+        with mock.patch.object(qdrant_service, 'QDRANT_QUANTIZATION', 'int4'), self.assertRaises(ValueError):
+            qdrant_service.quantization_config()
+
+    def test_search_fills_in_texts_with_one_query(self):
+        only = self.rows()
+        points = self.store.search(self.cv, np.eye(3, 384)[1].tolist(), limit=2)
+        self.assertEqual(points[0].payload, {"text": "Chunk 1 of the CV", "chunk_index": 1, "cv_id": 5})
+        self.assertEqual(len(points), 2)
+        self.assertEqual(only.return_value.in_bulk.call_count, 1)
+        self.assertEqual(only.return_value.in_bulk.call_args.kwargs, {"field_name": "qdrant_point_id"})
+
+    def test_points_whose_row_is_gone_are_dropped(self):
+        only = self.rows(missing=(0,))
+        results = self.store.search_batch(self.cv, [row.tolist() for row in np.eye(3, 384)[:2]], limit=3)
+        self.assertEqual(only.return_value.in_bulk.call_count, 1)
+        # Chunk 0, the best match of the first vector, has no row any more
+        self.assertEqual([sorted(point.payload["chunk_index"] for point in points) for points in results],
+                         [[1, 2], [1, 2]])
+        self.assertEqual(results[1][0].payload["chunk_index"], 1)
+
+    def test_async_search_fills_in_texts(self):
+        self.rows()
+
+        async def search(**kwargs):
+            # The local in-memory async client is a separate store
+            return qdrant_service.search_points(**kwargs)
+
+        self.enterContext(mock.patch.object(vector_store, 'async_search_points', side_effect=search))
+        points = asyncio.run(self.store.asearch(self.cv, np.eye(3, 384)[2].tolist(), limit=1))
+        self.assertEqual(points[0].payload["text"], "Chunk 2 of the CV")
+
+    def test_full_payloads_need_no_query(self):
+        only = self.rows()
+        points = [scored_point("00000000-0000-0000-0000-000000000000", "Stored text")]
+        self.assertIs(vector_store.hydrate_payloads(points), points)
+        self.assertFalse(only.called)
+
+
+class EndToEndBenchmarkTests(SimpleTestCase):
+    """The end-to-end benchmark summarizes each level and flags regressions against a baseline"""
+
+    def result(self, phase='chat', concurrency=4, throughput=100.0, p50=10.0, p95=20.0, p99=30.0, errors=0):
+        return {"phase": phase, "concurrency": concurrency, "throughput_rps": throughput, "errors": errors,
+                "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+
+    def compare(self, results, baseline, threshold=0.1):
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as out:
+            regressions = end_to_end.compare({"results": results}, {"results": baseline}, threshold)
+        return regressions, out.getvalue()
+
+    def test_summarize_reports_throughput_and_percentiles(self):
+        latencies = [i / 1000 for i in range(1, 101)]
+        summary = end_to_end.summarize('chat', 4, latencies, errors=2, elapsed=2.0)
+        self.assertEqual((summary["requests"], summary["errors"]), (102, 2))
+        # Failed requests do not count towards throughput
+        self.assertEqual(summary["throughput_rps"], 50.0)
+        self.assertEqual((summary["p50_ms"], summary["p95_ms"], summary["p99_ms"]), (50.0, 95.0, 99.0))
+        self.assertEqual(summary["mean_ms"], 50.5)
+
+        empty = end_to_end.summarize('ingest', 1, [], errors=3, elapsed=0)
+        self.assertEqual((empty["throughput_rps"], empty["p99_ms"], empty["requests"]), (0.0, 0.0, 3))
+
+    def test_run_level_counts_failed_calls_as_errors(self):
+        latencies, errors, elapsed = end_to_end.run_level(lambda i: i % 3 != 0, 9, concurrency=3)
+        self.assertEqual((len(latencies), errors), (6, 3))
+        self.assertGreaterEqual(elapsed, max(latencies))
+
+    def test_changes_beyond_the_threshold_are_regressions(self):
+        baseline = [self.result(), self.result(phase='ingest', concurrency=1)]
+        regressions, output = self.compare(
+            [self.result(throughput=85.0, p50=10.5, p99=40.0), self.result(phase='ingest', concurrency=1, errors=1)],
+            baseline,
+        )
+        self.assertEqual(regressions, [('chat', 4, 'throughput_rps', 100.0, 85.0), ('chat', 4, 'p99_ms', 30.0, 40.0),
+                                       ('ingest', 1, 'errors', 0, 1)])
+        self.assertIn("p50 +5.0%,", output)
+
+        # Faster, or slower within the threshold
+        regressions, _ = self.compare([self.result(throughput=120.0, p95=21.0, p99=25.0)], baseline)
+        self.assertEqual(regressions, [])
+
+    def test_levels_missing_from_the_baseline_are_skipped(self):
+        regressions, output = self.compare([self.result(concurrency=16, p99=300.0)], [self.result()])
+        self.assertEqual(regressions, [])
+        self.assertIn("c=16   not in baseline", output)
+
+    def test_compare_mode_exits_with_status_1_on_regression(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        paths = {}
+        for name, result in [('run', self.result(p95=30.0)), ('baseline', self.result())]:
+            paths[name] = os.path.join(directory, f'{name}.json')
+            with open(paths[name], 'w') as f:
+                json.dump({"results": [result]}, f)
+        argv = ['end_to_end', '--compare', paths['run'], '--baseline', paths['baseline']]
+        with mock.patch('sys.argv', argv), mock.patch('sys.stdout', new_callable=io.StringIO), \
+                self.assertRaises(SystemExit) as exit_:
+            end_to_end.main()
+        self.assertEqual(exit_.exception.code, 1)
+
+        with mock.patch('sys.argv', argv + ['--threshold', '0.6']), \
+                mock.patch('sys.stdout', new_callable=io.StringIO) as out:
+            end_to_end.main()
+        self.assertIn("No regression", out.getvalue())
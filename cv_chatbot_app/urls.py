@@ -9,5 +9,19 @@ router.register(r'conversations', views.ConversationViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('chat/', views.chat_with_cv, name='chat_with_cv'),
+    path('chat/batch/', views.chat_batch, name='chat_batch'),
+    path('chat/async/', views.chat_with_cv_async, name='chat_with_cv_async'),
+    path('chat/stream/', views.chat_stream, name='chat_stream'),
+    path('chat/context/stats/', views.chat_context_stats, name='chat_context_stats'),
+    path('chat/stream/stats/', views.chat_stream_stats, name='chat_stream_stats'),
+    path('candidates/rank/', views.rank_cv_candidates, name='rank_cv_candidates'),
+    path('qdrant/stats/', views.qdrant_stats, name='qdrant_stats'),
+    path('llm/stats/', views.llm_stats, name='llm_stats'),
+    path('traces/', views.recent_traces, name='recent_traces'),
+    path('startup/stats/', views.startup_stats, name='startup_stats'),
+    path('search/exact/stats/', views.exact_search_stats, name='exact_search_stats'),
+    path('embedding/cache/stats/', views.embedding_cache_stats, name='embedding_cache_stats'),
+    path('ingestion/jobs/<int:job_id>/', views.ingestion_job_status, name='ingestion_job_status'),
+    path('ingestion/stats/', views.ingestion_stats, name='ingestion_stats'),
     path('cvs/upload_cv/', views.CVViewSet.as_view({'post': 'upload_cv'}), name='upload_cv'),
 ]
\ No newline at end of file
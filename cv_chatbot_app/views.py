@@ -1,26 +1,37 @@
-import os
+import json
+import time
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, action, parser_classes
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.http import JsonResponse
-from .models import CV, Conversation
-from .serializers import CVSerializer, ConversationSerializer
-from .services.cv_upload import store_cv_chunks, process_and_store_cv
-from .services.cv_search import search_cv
-from .services.ai_service import generate_response
-from .services.qdrant_service import delete_collection
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from .models import CV, Conversation, IngestionJob
+from .serializers import CVSerializer, ConversationSerializer, IngestionJobSerializer
+from .services.cv_upload import store_cv_chunks, process_and_store_cv, update_cv
+from .services.cv_search import search_cv, asearch_cv, SEARCH_MODES
+from .services.ai_service import generate_answer, agenerate_answer, stream_response, get_llm_stats
+from .services.llm_gateway import LLMError
+from .services.metrics import get_histogram
+from .services.context_builder import build_context, CONTEXT_CANDIDATES
+from .services.batch_chat import answer_questions, BATCH_CHAT_MAX_QUESTIONS
+from .services.qdrant_service import get_client_stats
+from .services.vector_store import get_vector_store
+from .services.exact_search import invalidate_cv_matrix, get_exact_search_stats
+from .services.lexical_index import remove_cv_from_index
+from .services.startup import get_startup_report
+from .services.metrics import render_prometheus
+from .services.tracing import span, get_recent_traces
+from .services.ingestion_queue import enqueue_cv, use_ingestion_queue, queue_stats, remove_cv_uploads
+from .services.embedding import get_query_cache_stats
+from .services.candidate_ranking import rank_candidates, RANKING_TOP_N
+from .services.answer_cache import (
+    answer_cache_key, get_cached_answer, aget_cached_answer, invalidate_cv_answers,
+)
 import uuid
-import groq
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Initialize Groq client for generating responses
-GROQ_API_KEY = os.getenv('GROQ_API_KEY')
-groq_client = groq.Client(api_key=GROQ_API_KEY)
 
 class CVViewSet(viewsets.ModelViewSet):
     queryset = CV.objects.all()
@@ -35,6 +46,16 @@ class CVViewSet(viewsets.ModelViewSet):
             return Response({"error": "Both file and name are required"}, 
                             status=status.HTTP_400_BAD_REQUEST)
         
+        queued = str(request.data.get('async', use_ingestion_queue())).lower() in ('1', 'true')
+        if queued:
+            try:
+                cv, job = enqueue_cv(name, file_obj)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            print(f"Queued CV {cv.id} as ingestion job {job.id}")
+            return Response({"job_id": job.id, "cv": CVSerializer(cv).data},
+                            status=status.HTTP_202_ACCEPTED)
+
         try:
             # Add detailed logging
             print(f"Starting CV upload process for {name}")
@@ -52,10 +73,40 @@ class CVViewSet(viewsets.ModelViewSet):
             return Response({"error": f"Error processing CV: {str(e)}"}, 
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    @action(detail=True, methods=['post', 'put'], parser_classes=[MultiPartParser, FormParser])
+    def update_cv(self, request, pk=None):
+        """Re-ingests a new version of the CV file, embedding only changed chunks"""
+        cv = self.get_object()
+        file_obj = request.FILES.get('file')
+        if not file_obj:
+            return Response({"error": "file is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if cv.status != CV.STATUS_READY:
+            return Response({"error": f"CV is not ready (status: {cv.status})"},
+                            status=status.HTTP_409_CONFLICT)
+
+        try:
+            result = update_cv(cv, file_obj)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            import traceback
+            print(f"Error updating CV {cv.id}: {str(e)}")
+            print(traceback.format_exc())
+            return Response({"error": f"Error updating CV: {str(e)}"},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        print(f"Updated CV {cv.id}: embedded {result['embedded']}, "
+              f"skipped {result['embeddings_skipped']} embedding(s)")
+        return Response({"cv": CVSerializer(cv).data, **result})
+
     def destroy(self, request, *args, **kwargs):
         cv = self.get_object()
-        # Delete the collection from Qdrant
-        delete_collection(cv.qdrant_collection_name)
+        invalidate_cv_answers(cv)
+        invalidate_cv_matrix(cv.id)
+        remove_cv_from_index(cv)
+        # Delete the CV's vectors (its points, or its whole Qdrant collection)
+        get_vector_store(cv).delete_cv(cv)
+        # and the uploads still spooled for its ingestion jobs
+        remove_cv_uploads(cv)
         # Then proceed with the default delete behavior
         return super().destroy(request, *args, **kwargs)
 
@@ -63,35 +114,343 @@ class ConversationViewSet(viewsets.ModelViewSet):
     queryset = Conversation.objects.all()
     serializer_class = ConversationSerializer
 
+_TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+_prompt_tokens_histogram = get_histogram(
+    'chat_prompt_tokens', 'Tokens of the chat prompt sent to the LLM', _TOKEN_BUCKETS
+)
+_candidate_tokens_histogram = get_histogram(
+    'chat_candidate_tokens', 'Tokens of the retrieved chunks before context packing', _TOKEN_BUCKETS
+)
+
+def _observe_context(context, question):
+    """Records the token counts of a prompt and returns them for the response"""
+    context_stats = context.stats(question)
+    _prompt_tokens_histogram.observe(context_stats["prompt_tokens"])
+    _candidate_tokens_histogram.observe(context_stats["candidate_tokens"])
+    return context_stats
+
 @api_view(['POST'])
 def chat_with_cv(request):
     cv_id = request.data.get('cv_id')
     question = request.data.get('question')
+    search_mode = request.data.get('search_mode')
     
     if not cv_id or not question:
         return JsonResponse({"error": "Both cv_id and question are required"}, status=400)
+
+    if search_mode and search_mode not in SEARCH_MODES:
+        return JsonResponse({"error": f"search_mode must be one of {', '.join(SEARCH_MODES)}"}, status=400)
     
     try:
-        cv = CV.objects.get(id=cv_id)
+        with span('db_read'):
+            cv = CV.objects.get(id=cv_id)
     except CV.DoesNotExist:
         return JsonResponse({"error": "CV not found"}, status=404)
+
+    if cv.status != CV.STATUS_READY:
+        return JsonResponse({"error": f"CV is not ready (status: {cv.status})"}, status=409)
     
-    # Search for relevant chunks in Qdrant
-    search_results = search_cv(cv.qdrant_collection_name, question, limit=3)
+    # Search for relevant chunks, over-fetching for the context builder
+    search_results = search_cv(cv, question, limit=CONTEXT_CANDIDATES, mode=search_mode)
+    context = build_context(search_results)
     
-    # Prepare context from search results
-    context = "\n\n".join([result.payload["text"] for result in search_results])
+    # Serve a previous answer for the same question and retrieved chunks
+    cache_key = answer_cache_key(cv.id, question, context.results)
+    cached_response = get_cached_answer(cache_key)
+    if cached_response is not None:
+        with span('db_write'):
+            Conversation.objects.create(
+                question=question,
+                response=cached_response,
+                related_cv=cv
+            )
+        return JsonResponse({
+            "response": cached_response,
+            "cached": True
+        })
     
     # Generate response using AI service
-    response_text = generate_response(context, question)
+    try:
+        answer = generate_answer(context.text, question)
+    except LLMError as e:
+        return JsonResponse({"error": str(e)}, status=e.status_code)
+    context_stats = _observe_context(context, question)
     
-    # Save the conversation
-    conversation = Conversation.objects.create(
-        question=question,
-        response=response_text,
-        related_cv=cv
-    )
+    # Save the conversation; fallback answers are not served from cache
+    with span('db_write'):
+        conversation = Conversation.objects.create(
+            question=question,
+            response=answer.text,
+            related_cv=cv,
+            cache_key=cache_key if answer.cacheable else ""
+        )
     
     return JsonResponse({
-        "response": response_text
+        "response": answer.text,
+        "cached": False,
+        "provider": answer.provider,
+        **context_stats
+    })
+
+
+@api_view(['POST'])
+def chat_batch(request):
+    """Answers a list of questions about one CV in a single request"""
+    cv_id = request.data.get('cv_id')
+    questions = request.data.get('questions')
+    search_mode = request.data.get('search_mode')
+
+    if not cv_id or not questions:
+        return JsonResponse({"error": "Both cv_id and questions are required"}, status=400)
+    if not isinstance(questions, list) or not all(isinstance(q, str) and q.strip() for q in questions):
+        return JsonResponse({"error": "questions must be a list of non-empty strings"}, status=400)
+    if len(questions) > BATCH_CHAT_MAX_QUESTIONS:
+        return JsonResponse({"error": f"At most {BATCH_CHAT_MAX_QUESTIONS} questions per request"}, status=400)
+    if search_mode and search_mode not in SEARCH_MODES:
+        return JsonResponse({"error": f"search_mode must be one of {', '.join(SEARCH_MODES)}"}, status=400)
+
+    try:
+        with span('db_read'):
+            cv = CV.objects.get(id=cv_id)
+    except CV.DoesNotExist:
+        return JsonResponse({"error": "CV not found"}, status=404)
+
+    if cv.status != CV.STATUS_READY:
+        return JsonResponse({"error": f"CV is not ready (status: {cv.status})"}, status=409)
+
+    results = answer_questions(cv, questions, mode=search_mode)
+    for result in results:
+        # Failed questions have no answer, so no prompt to measure
+        if not result["cached"] and "error" not in result:
+            _prompt_tokens_histogram.observe(result["prompt_tokens"])
+            _candidate_tokens_histogram.observe(result["candidate_tokens"])
+    return JsonResponse({"cv_id": cv.id, "results": results})
+
+
+@api_view(['GET'])
+def qdrant_stats(request):
+    """Reports Qdrant client reuse counters for this worker process"""
+    return JsonResponse(get_client_stats())
+
+@api_view(['GET'])
+def llm_stats(request):
+    """Reports LLM routing decisions, per-provider latency and gateway counters for this worker"""
+    return JsonResponse(get_llm_stats())
+
+@api_view(['GET'])
+def startup_stats(request):
+    """Reports the import/initialization phases of this worker's startup"""
+    return JsonResponse(get_startup_report())
+
+@api_view(['GET'])
+def recent_traces(request):
+    """Reports the stage breakdown of recent slow and profiled requests in this worker"""
+    return JsonResponse(get_recent_traces())
+
+def metrics(request):
+    """Exposes this worker's histograms and counters in the Prometheus text format"""
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@api_view(['GET'])
+def exact_search_stats(request):
+    """Reports the in-process exact search matrix cache counters for this worker"""
+    return JsonResponse(get_exact_search_stats())
+
+@api_view(['GET'])
+def embedding_cache_stats(request):
+    """Reports query embedding cache hit/miss/eviction counters for this worker"""
+    return JsonResponse(get_query_cache_stats())
+
+@api_view(['GET'])
+def ingestion_job_status(request, job_id):
+    """Returns the status and per-stage timings of an ingestion job"""
+    job = get_object_or_404(IngestionJob.objects.select_related('cv'), id=job_id)
+    return Response(IngestionJobSerializer(job).data)
+
+@api_view(['GET'])
+def ingestion_stats(request):
+    """Reports ingestion queue depth and average per-stage timings"""
+    return JsonResponse(queue_stats())
+
+@api_view(['POST'])
+def rank_cv_candidates(request):
+    """Ranks every CV against a query or job description, one page at a time"""
+    query = request.data.get('job_description') or request.data.get('query')
+    if not query:
+        return JsonResponse({"error": "Either query or job_description is required"}, status=400)
+
+    try:
+        ranking = rank_candidates(
+            query,
+            aggregation=request.data.get('aggregation', 'max'),
+            top_n=int(request.data.get('top_n', RANKING_TOP_N)),
+            page=int(request.data.get('page', 1)),
+            page_size=int(request.data.get('page_size', 20))
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(ranking)
+
+@csrf_exempt
+@require_POST
+async def chat_with_cv_async(request):
+    """
+    Non-blocking variant of chat_with_cv for ASGI: uses the async ORM, the
+    async Qdrant and Groq clients, and runs the embedding in a thread pool.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    cv_id = data.get('cv_id')
+    question = data.get('question')
+    search_mode = data.get('search_mode')
+    if not cv_id or not question:
+        return JsonResponse({"error": "Both cv_id and question are required"}, status=400)
+    if search_mode and search_mode not in SEARCH_MODES:
+        return JsonResponse({"error": f"search_mode must be one of {', '.join(SEARCH_MODES)}"}, status=400)
+
+    try:
+        with span('db_read'):
+            cv = await CV.objects.aget(id=cv_id)
+    except CV.DoesNotExist:
+        return JsonResponse({"error": "CV not found"}, status=404)
+
+    if cv.status != CV.STATUS_READY:
+        return JsonResponse({"error": f"CV is not ready (status: {cv.status})"}, status=409)
+
+    search_results = await asearch_cv(cv, question, limit=CONTEXT_CANDIDATES, mode=search_mode)
+    context = await sync_to_async(build_context, thread_sensitive=False)(search_results)
+
+    cache_key = answer_cache_key(cv.id, question, context.results)
+    cached_response = await aget_cached_answer(cache_key)
+    if cached_response is not None:
+        with span('db_write'):
+            await Conversation.objects.acreate(
+                question=question, response=cached_response, related_cv=cv
+            )
+        return JsonResponse({"response": cached_response, "cached": True})
+
+    try:
+        answer = await agenerate_answer(context.text, question)
+    except LLMError as e:
+        return JsonResponse({"error": str(e)}, status=e.status_code)
+    context_stats = await sync_to_async(_observe_context, thread_sensitive=False)(context, question)
+
+    with span('db_write'):
+        await Conversation.objects.acreate(
+            question=question,
+            response=answer.text,
+            related_cv=cv,
+            cache_key=cache_key if answer.cacheable else ""
+        )
+    return JsonResponse({"response": answer.text, "cached": False, "provider": answer.provider, **context_stats})
+
+def _sse(data, event=None):
+    """Formats one server-sent event"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+_ttft_histogram = get_histogram(
+    'chat_stream_ttft_seconds', 'Time from request to the first streamed token'
+)
+_stream_duration_histogram = get_histogram(
+    'chat_stream_duration_seconds', 'Time from request to the end of the stream'
+)
+
+@csrf_exempt
+@require_POST
+async def chat_stream(request):
+    """
+    Streaming variant of chat_with_cv: sends the answer as server-sent events
+    ("token" events, then a final "done" event) and saves the Conversation
+    once the stream has finished. Needs the ASGI application (the Procfile
+    runs it with uvicorn workers): under WSGI the events are buffered.
+    """
+    started = time.perf_counter()
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    cv_id = data.get('cv_id')
+    question = data.get('question')
+    search_mode = data.get('search_mode')
+    if not cv_id or not question:
+        return JsonResponse({"error": "Both cv_id and question are required"}, status=400)
+    if search_mode and search_mode not in SEARCH_MODES:
+        return JsonResponse({"error": f"search_mode must be one of {', '.join(SEARCH_MODES)}"}, status=400)
+
+    try:
+        with span('db_read'):
+            cv = await CV.objects.aget(id=cv_id)
+    except CV.DoesNotExist:
+        return JsonResponse({"error": "CV not found"}, status=404)
+
+    if cv.status != CV.STATUS_READY:
+        return JsonResponse({"error": f"CV is not ready (status: {cv.status})"}, status=409)
+
+    search_results = await asearch_cv(cv, question, limit=CONTEXT_CANDIDATES, mode=search_mode)
+    context = await sync_to_async(build_context, thread_sensitive=False)(search_results)
+    cache_key = answer_cache_key(cv.id, question, context.results)
+    cached_response = await aget_cached_answer(cache_key)
+
+    async def events():
+        if cached_response is not None:
+            _ttft_histogram.observe(time.perf_counter() - started)
+            yield _sse({"token": cached_response})
+            await Conversation.objects.acreate(
+                question=question, response=cached_response, related_cv=cv
+            )
+            _stream_duration_histogram.observe(time.perf_counter() - started)
+            yield _sse({"response": cached_response, "cached": True}, event="done")
+            return
+
+        context_stats = await sync_to_async(_observe_context, thread_sensitive=False)(context, question)
+        tokens = stream_response(context.text, question)
+        next_token = sync_to_async(next, thread_sensitive=False)
+        parts = []
+        try:
+            while True:
+                token = await next_token(tokens, None)
+                if token is None:
+                    break
+                if not parts:
+                    _ttft_histogram.observe(time.perf_counter() - started)
+                parts.append(token)
+                yield _sse({"token": token})
+        except Exception as e:
+            print(f"Error streaming response: {str(e)}")
+            yield _sse({"error": "Error generating response"}, event="error")
+            return
+
+        response_text = "".join(parts).strip()
+        await Conversation.objects.acreate(
+            question=question, response=response_text, related_cv=cv,
+            cache_key=cache_key if tokens.cacheable else ""
+        )
+        _stream_duration_histogram.observe(time.perf_counter() - started)
+        yield _sse({"response": response_text, "cached": False, "provider": tokens.provider,
+                    **context_stats}, event="done")
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@api_view(['GET'])
+def chat_stream_stats(request):
+    """Reports time-to-first-token and stream duration histograms for this worker"""
+    return JsonResponse({
+        "ttft": _ttft_histogram.summary(),
+        "duration": _stream_duration_histogram.summary(),
+    })
+
+@api_view(['GET'])
+def chat_context_stats(request):
+    """Reports prompt and retrieved-chunk token histograms for this worker"""
+    return JsonResponse({
+        "prompt_tokens": _prompt_tokens_histogram.summary(),
+        "candidate_tokens": _candidate_tokens_histogram.summary(),
     })
@@ -0,0 +1,61 @@
+"""
+Gunicorn settings (Procfile: gunicorn -c gunicorn.conf.py chatbot_project.asgi:application).
+Workers come from WEB_CONCURRENCY and the port from PORT, as gunicorn reads
+them by default.
+"""
+import os
+import glob
+import tempfile
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Import the application and load the embedding model once in the master;
+# the forked workers share those pages copy-on-write instead of each loading
+# its own copy, and start serving as soon as they are forked
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+# Uvicorn workers serve the ASGI application, so the streaming chat endpoint
+# sends its events as they are produced; 'sync' serves chatbot_project.wsgi,
+# which buffers streamed responses
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+
+# Workers share their metrics through files in this directory, so /metrics
+# reports the whole server (see cv_chatbot_app.services.metrics). Files left
+# by a previous run would be added to this run's totals, so they are removed
+# here, before the preloaded application records anything.
+os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), f'cv_chatbot_metrics_{os.getpid()}'))
+os.makedirs(os.environ['METRICS_MULTIPROC_DIR'], exist_ok=True)
+for _path in glob.glob(os.path.join(os.environ['METRICS_MULTIPROC_DIR'], 'metrics_*.json*')):
+    os.remove(_path)
+
+_warmup = os.getenv('EMBEDDING_WARMUP', 'true').lower()
+
+def when_ready(server):
+    # Master, with the application imported and before any worker is forked.
+    # The master only loads the weights: running the model there would start
+    # runtime thread pools that do not survive fork. Each worker then runs
+    # the first inference itself (post_fork).
+    if preload_app:
+        from cv_chatbot_app.services.startup import prepare_application
+        prepare_application(warmup='load' if _warmup == 'true' else _warmup)
+
+def post_fork(server, worker):
+    if preload_app and _warmup == 'true':
+        from cv_chatbot_app.services.embedding import warmup_embedding_model
+        from cv_chatbot_app.services.startup import startup_phase
+        try:
+            with startup_phase('warmup_embedding_model'):
+                warmup_embedding_model()
+        except Exception as e:
+            print(f"Error warming up embedding model: {str(e)}")
+
+def post_worker_init(worker):
+    from cv_chatbot_app.services.startup import get_startup_report, prepare_application
+    if not preload_app:
+        # Each worker imported the application itself
+        prepare_application(warmup=_warmup)
+    report = get_startup_report()
+    print(f"Worker {report['pid']} ready: {report['total_seconds']:.2f}s of startup phases, "
+          f"RSS {report['rss_mb']:.0f} MiB", flush=True)